@@ -0,0 +1,238 @@
+import numpy as np
+import pandas as pd
+
+# Performance and risk metrics of a backtest, computed on arrays:
+#   - every symbol's closed trades are turned into a per-bar P&L column and a
+#     held-value column with a difference array and one cumulative sum, on
+#     the union of all dates (bars x symbols matrices)
+#   - the portfolio is one more column: the sum of the symbol columns
+#   - every metric is then a column-wise reduction over those matrices, so all
+#     symbols and the portfolio are scored together, and the rolling variants
+#     use cumulative sums instead of per-window loops
+# The primitives take an axis, so batches of resampled paths (robustness.py)
+# are scored the same way.
+
+METRIC_COLUMNS = ["Return (%)", "CAGR (%)", "Volatility (%)", "Sharpe", "Sortino",
+                  "Max Drawdown (%)", "Max Drawdown Bars", "Calmar", "Exposure (%)",
+                  "Time in Market (%)", "Turnover", "Trades", "Win Rate (%)", "Profit Factor",
+                  "Average Win", "Average Loss"]
+
+
+def equity_curve(pnl, capital, axis=0):
+    return capital + np.cumsum(pnl, axis=axis)
+
+
+def period_returns(pnl, capital, axis=0):
+    # P&L of every bar as a fraction of the equity before it
+    previous = np.roll(equity_curve(pnl, capital, axis), 1, axis=axis)
+    first = [slice(None)] * previous.ndim
+    first[axis] = 0
+    previous[tuple(first)] = capital
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return pnl / previous
+
+
+def drawdown(equity, capital, axis=0):
+    # Fraction below the running peak (the starting capital counts as a peak)
+    peak = np.maximum.accumulate(np.maximum(equity, capital), axis=axis)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return 1 - equity / peak
+
+
+def max_drawdown_bars(equity, capital, axis=0):
+    # Longest stretch of bars spent below the running peak
+    peak = np.maximum.accumulate(np.maximum(equity, capital), axis=axis)
+    shape = [1] * equity.ndim
+    shape[axis] = equity.shape[axis]
+    position = np.arange(equity.shape[axis]).reshape(shape)
+    last_peak = np.maximum.accumulate(np.where(equity >= peak, position, -1), axis=axis)
+    return (position - last_peak).max(axis=axis, initial=0)
+
+
+def sharpe_ratio(returns, periods_per_year, axis=0):
+    with np.errstate(invalid="ignore", divide="ignore"):
+        std = returns.std(axis=axis)
+        return np.where(std > 0, returns.mean(axis=axis) / std * np.sqrt(periods_per_year), np.nan)
+
+
+def sortino_ratio(returns, periods_per_year, axis=0):
+    # Mean return over the downside deviation (root mean square of the losses)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        downside = np.sqrt((np.minimum(returns, 0) ** 2).mean(axis=axis))
+        return np.where(downside > 0, returns.mean(axis=axis) / downside * np.sqrt(periods_per_year), np.nan)
+
+
+def periods_per_year(dates):
+    # Bars per year observed in a DatetimeIndex
+    dates = pd.DatetimeIndex(dates)
+    if len(dates) < 2:
+        return 252.0
+    years = (dates[-1] - dates[0]) / pd.Timedelta(days=365.25)
+    return len(dates) / years if years > 0 else 252.0
+
+
+def symbol_arrays(close, trades):
+    # Per-bar P&L and held value of one symbol's closed trades. A trade holds
+    # its shares from the close of its entry bar to the close of its exit bar
+    close = np.asarray(close, dtype=float)
+    n_closed = trades["sell_count"]
+    held = np.zeros(len(close) + 1)
+    np.add.at(held, trades["entry_index"][:n_closed] + 1, trades["shares"][:n_closed])
+    np.add.at(held, trades["exit_index"][:n_closed] + 1, -trades["shares"][:n_closed])
+    shares = np.cumsum(held)[:len(close)]
+    pnl = np.zeros(len(close))
+    pnl[1:] = shares[1:] * np.diff(close)
+    # Value invested at each bar's close, including entries made on that bar
+    entered = np.zeros(len(close) + 1)
+    np.add.at(entered, trades["entry_index"][:n_closed], trades["shares"][:n_closed])
+    np.add.at(entered, trades["exit_index"][:n_closed], -trades["shares"][:n_closed])
+    return pnl, np.cumsum(entered)[:len(close)] * close
+
+
+def result_matrices(result):
+    # Union of dates, bars x symbols P&L and held value matrices, and the
+    # closed trades' earnings, traded value and symbol column
+    symbols = [symbol for symbol in result.symbols if symbol in result.trades]
+    indexes = [pd.DatetimeIndex(result.signals[symbol].index) for symbol in symbols]
+    # Dates as int64 nanoseconds (UTC for tz-aware indexes)
+    stamps = np.unique(_concatenate([index.asi8 for index in indexes], np.int64))
+    tz = indexes[0].tz if indexes else None
+    dates = pd.DatetimeIndex(stamps) if tz is None else \
+        pd.DatetimeIndex(stamps).tz_localize("UTC").tz_convert(tz)
+    pnl = np.zeros((len(dates), len(symbols)))
+    invested = np.zeros((len(dates), len(symbols)))
+    earnings, traded, column = [], [], []
+    for j, symbol in enumerate(symbols):
+        frame, trades = result.signals[symbol], result.trades[symbol]
+        rows = np.searchsorted(stamps, indexes[j].asi8)
+        pnl[rows, j], invested[rows, j] = symbol_arrays(frame['Close'].to_numpy(), trades)
+        n_closed = trades["sell_count"]
+        earnings.append(trades["earnings"][:n_closed])
+        traded.append(trades["entry_amount"][:n_closed] + trades["exit_amount"][:n_closed])
+        column.append(np.full(n_closed, j))
+    return (symbols, dates, pnl, invested,
+            _concatenate(earnings, float), _concatenate(traded, float), _concatenate(column, int))
+
+
+def _concatenate(parts, dtype):
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=dtype)
+
+
+def trade_statistics(earnings, column, n_columns):
+    # Trade count, win rate, profit factor and average win and loss per
+    # column, with bincount instead of a group-by
+    wins = earnings > 0
+    losses = earnings < 0
+    count = np.bincount(column, minlength=n_columns).astype(float)
+    n_wins = np.bincount(column, weights=wins, minlength=n_columns)
+    n_losses = np.bincount(column, weights=losses, minlength=n_columns)
+    gross_win = np.bincount(column, weights=np.where(wins, earnings, 0), minlength=n_columns)
+    gross_loss = -np.bincount(column, weights=np.where(losses, earnings, 0), minlength=n_columns)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {"Trades": count,
+                "Win Rate (%)": np.where(count > 0, n_wins / count * 100, np.nan),
+                "Profit Factor": np.where(gross_loss > 0, gross_win / gross_loss, np.nan),
+                "Average Win": np.where(n_wins > 0, gross_win / n_wins, np.nan),
+                "Average Loss": np.where(n_losses > 0, -gross_loss / n_losses, np.nan)}
+
+
+def performance_metrics(pnl, capital, bars_per_year, invested=None, traded=None):
+    # Column-wise metrics of a bars x columns P&L matrix; capital is a scalar
+    # or one value per column. invested (held value per bar) and traded
+    # (total traded value per column) add exposure and turnover
+    pnl = np.asarray(pnl, dtype=float)
+    capital = np.broadcast_to(np.asarray(capital, dtype=float), pnl.shape[1:])
+    equity = equity_curve(pnl, capital)
+    returns = period_returns(pnl, capital)
+    years = len(pnl) / bars_per_year
+    final = equity[-1] if len(pnl) else capital
+    with np.errstate(invalid="ignore", divide="ignore"):
+        growth = final / capital
+        cagr = np.where(growth > 0, growth ** (1 / years) - 1, -1.0) if years > 0 else np.zeros_like(growth)
+        deepest = drawdown(equity, capital).max(axis=0, initial=0)
+        metrics = {
+            "Return (%)": (growth - 1) * 100,
+            "CAGR (%)": cagr * 100,
+            "Volatility (%)": returns.std(axis=0) * np.sqrt(bars_per_year) * 100,
+            "Sharpe": sharpe_ratio(returns, bars_per_year),
+            "Sortino": sortino_ratio(returns, bars_per_year),
+            "Max Drawdown (%)": deepest * 100,
+            "Max Drawdown Bars": max_drawdown_bars(equity, capital),
+            "Calmar": np.where(deepest > 0, cagr / deepest, np.nan),
+        }
+        if invested is not None:
+            metrics["Exposure (%)"] = (invested / equity).mean(axis=0) * 100
+            metrics["Time in Market (%)"] = (invested > 0).mean(axis=0) * 100
+        if traded is not None:
+            # Traded value per year over the average equity
+            metrics["Turnover"] = traded / equity.mean(axis=0) / years if years > 0 else np.nan
+    return metrics
+
+
+def rolling_sums(values, window):
+    # Sum of the last window values of every column; NaN for the first bars
+    padded = np.vstack((np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)))
+    sums = np.full(values.shape, np.nan)
+    sums[window - 1:] = padded[window:] - padded[:-window]
+    return sums
+
+
+def rolling_metrics(pnl, capital, bars_per_year, window=63):
+    # Rolling Sharpe, Sortino, volatility (%) and drawdown from the rolling
+    # peak (%) of every column, over the last window bars
+    pnl = np.asarray(pnl, dtype=float)
+    returns = np.nan_to_num(period_returns(pnl, capital))
+    mean = rolling_sums(returns, window) / window
+    variance = np.maximum(rolling_sums(returns ** 2, window) / window - mean ** 2, 0)
+    downside = np.sqrt(rolling_sums(np.minimum(returns, 0) ** 2, window) / window)
+    equity = equity_curve(pnl, capital)
+    peak = pd.DataFrame(equity).rolling(window, min_periods=1).max().to_numpy()
+    annual = np.sqrt(bars_per_year)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return {"Rolling Sharpe": np.where(variance > 0, mean / np.sqrt(variance) * annual, np.nan),
+                "Rolling Sortino": np.where(downside > 0, mean / downside * annual, np.nan),
+                "Rolling Volatility (%)": np.sqrt(variance) * annual * 100,
+                "Rolling Drawdown (%)": (1 - equity / peak) * 100}
+
+
+class AnalyticsResult:
+    def __init__(self, metrics, equity, rolling):
+        # One row per symbol plus a Portfolio row
+        self.metrics = metrics
+        # Portfolio Equity and Drawdown (%) on every bar
+        self.equity = equity
+        # Rolling metrics of the portfolio on every bar
+        self.rolling = rolling
+
+    def portfolio(self):
+        return self.metrics.set_index("Symbol").loc["Portfolio"]
+
+
+def analyze(result, window=63):
+    # Metrics of every symbol and of the portfolio of a daily BacktestResult
+    symbols, dates, pnl, invested, earnings, traded, column = result_matrices(result)
+    investment = result.capital / len(result.symbols) if result.symbols else 0.0
+    bars_per_year = periods_per_year(dates)
+    # The portfolio is the last column
+    pnl = np.column_stack((pnl, pnl.sum(axis=1)))
+    invested = np.column_stack((invested, invested.sum(axis=1)))
+    capital = np.append(np.full(len(symbols), investment), result.capital)
+    traded_value = np.append(np.bincount(column, weights=traded, minlength=len(symbols)), traded.sum())
+
+    metrics = performance_metrics(pnl, capital, bars_per_year, invested, traded_value)
+    trade_stats = trade_statistics(np.concatenate((earnings, earnings)),
+                                   np.concatenate((column, np.full(len(column), len(symbols)))),
+                                   len(symbols) + 1)
+    table = pd.DataFrame(dict(metrics, **trade_stats), columns=METRIC_COLUMNS)
+    table.insert(0, "Symbol", symbols + ["Portfolio"])
+    table["Trades"] = table["Trades"].astype(int)
+    table["Max Drawdown Bars"] = table["Max Drawdown Bars"].astype(int)
+
+    portfolio_equity = equity_curve(pnl[:, -1], result.capital)
+    equity = pd.DataFrame({"Equity": portfolio_equity,
+                           "Drawdown (%)": drawdown(portfolio_equity, result.capital) * 100},
+                          index=dates)
+    rolling = pd.DataFrame({name: values[:, -1] for name, values in
+                            rolling_metrics(pnl[:, -1:], result.capital, bars_per_year, window).items()},
+                           index=dates)
+    return AnalyticsResult(table, equity, rolling)
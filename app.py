@@ -1,14 +1,30 @@
 import streamlit as st  # Import the streamlit library
-import yfinance as yf
 import pandas as pd
-import ta  # Import the technical analysis library
 import plotly.express as px
 from datetime import datetime
 from datetime import timedelta
-from strategies import moving_average_strategy, momentum_strategy, bollinger_bands_strategy
-import statsmodels.api as sm
-from collections import OrderedDict
+from strategies import STRATEGY_REGISTRY
+from price_store import INTERVALS, PriceStore, parse_symbols
+from fetcher import PriceFetcher
+from market_data import load_universe
+from chunked import long_closes
+from jobs import DONE, FAILED, JobQueue, job_key, run_backtest_job
+from result_cache import LRUCache
+from results_store import ResultsStore
+from feature_store import DEFAULT_FEATURE_DIR, feature_store
+from charting import equity_figure, price_figure, rolling_figure, treasury_figure
+from analytics import analyze
+from portfolio import SIZING_RULES, simulate_portfolio
+from robustness import METHODS as ROBUSTNESS_METHODS, robustness
+from cross_sectional import CROSS_SECTIONAL_STRATEGIES, REBALANCE_FREQUENCIES, WEIGHTINGS, rank_backtest
+from sweep import run_sweep, value_range, returns_heatmap
+from walk_forward import walk_forward
+from profiling import Profiler, span
+import json
 import re  # Import the regular expression library
+import os
+import time
+from functools import partial
 
 st.set_page_config(page_title="Technical Analysis Backtester",
                    page_icon="📈",
@@ -28,11 +44,35 @@ st.markdown(
 )
 
 
-INVESTMENT_STRATEGIES = OrderedDict([
-    ("Moving Average Crossover", moving_average_strategy),
-    ("Momentum", momentum_strategy),
-    ("Bollinger Bands", bollinger_bands_strategy),
-])
+# Share one bounded cache of per-symbol strategy results between reruns and sessions
+@st.cache_resource
+def get_result_cache():
+    return LRUCache(max_entries=512, max_bytes=256 * 1024 * 1024)
+
+
+# Indicator columns shared by every session (and, on disk, by the worker
+# processes); set FEATURE_STORE_DIR to an empty string to keep them in memory
+def get_feature_store():
+    return feature_store(os.environ.get("FEATURE_STORE_DIR", DEFAULT_FEATURE_DIR) or None)
+
+
+# One fetcher per concurrency setting, so its HTTP connections are reused across reruns
+@st.cache_resource
+def get_fetcher(max_concurrency):
+    return PriceFetcher(max_concurrency=max_concurrency)
+
+
+# Finished backtests and sweeps, kept on disk across reruns and restarts
+@st.cache_resource
+def get_results_store():
+    return ResultsStore()
+
+
+# Backtests run on this queue instead of the script thread; identical
+# backtests started by several sessions share one job
+@st.cache_resource
+def get_job_queue():
+    return JobQueue(workers=2)
 
 
 # Set the default answer status to False
@@ -45,6 +85,52 @@ def is_valid_stock_symbol(symbol):
     return re.match(r"^[A-Za-z0-9\.\-\^]+$", symbol) is not None
 
 
+# Define a From/To/Step input for the parameter sweep
+def sweep_range_input(label, start, stop, step, min_value):
+    st.markdown(label)
+    col_from, col_to, col_step = st.columns(3)
+    with col_from:
+        low = st.number_input("From", min_value=min_value,
+                              value=start, step=step, key=label + "_from")
+    with col_to:
+        high = st.number_input("To", min_value=min_value,
+                               value=stop, step=step, key=label + "_to")
+    with col_step:
+        increment = st.number_input("Step", min_value=step,
+                                    value=step, step=step, key=label + "_step")
+    return value_range(low, high, increment)
+
+
+# Show the time (and optionally memory and slowest functions) of every span
+# of a profiler in the Performance panel
+def show_profile(profiler, title, key):
+    st.subheader(title)
+    st.write("Took {:,.0f} ms".format(profiler.duration * 1000)
+             + ("" if profiler.peak_bytes is None else
+                ", peak memory {:,.1f} MB".format(profiler.peak_bytes / 1024 ** 2)))
+    stage_totals = profiler.totals()
+    if len(stage_totals):
+        st.plotly_chart(px.bar(stage_totals, x='Seconds', y='Stage', orientation='h',
+                               title='Time per Stage'),
+                        use_container_width=True)
+    st.dataframe(profiler.spans_frame(), use_container_width=True)
+    if profiler.profile is not None:
+        st.subheader("Slowest Functions")
+        st.dataframe(profiler.function_stats(), use_container_width=True)
+    col_json, col_trace = st.columns(2)
+    with col_json:
+        st.download_button("Download profile (JSON)",
+                           json.dumps(profiler.to_json(), default=str),
+                           file_name="profile.json", mime="application/json",
+                           key=f"{key}_json")
+    with col_trace:
+        st.download_button("Download Chrome trace",
+                           json.dumps(profiler.to_chrome_trace(), default=str),
+                           file_name="trace.json", mime="application/json",
+                           help="Open in chrome://tracing or ui.perfetto.dev.",
+                           key=f"{key}_trace")
+
+
 # Time variables
 now = datetime.now()
 current_time = now.strftime("%H:%M:%S")
@@ -81,72 +167,208 @@ with st.sidebar:
                                value=pd.to_datetime(time_ago))
     end_date = st.date_input("End date for backtesting:",
                              value=pd.to_datetime(today))
-    # Set the min RSI value
-    rsi_min = st.number_input(
-        "Enter the minimum RSI value:",
-        min_value=0.0,
-        value=30.0,
-        step=0.1,
-        help="The RSI is a measure of the change in price over a period of time. A normal minimum value for a stock is 30 or less. For ETFs and index, use a value of 45 or 35."
-    )
-    # Set the max RSI value
-    rsi_max = st.number_input(
-        "Enter the maximum RSI value:",
-        min_value=0.0,
-        value=70.0,
-        step=0.1,
-        help="The RSI is a measure of the change in price over a period of time. A normal maximum value for a stock is 70 or more. For ETFs and index, use a value of 55 or 60."
-    )
-
+    # Set the bar interval
+    bar_interval = st.selectbox(
+        "Bar interval:",
+        INTERVALS,
+        help="Intraday bars are streamed through the backtest in chunks, so long histories fit in memory. Yahoo Finance only serves 1-minute bars for the last 30 days and other intraday bars for the last 60 days; older bars are kept in the local price cache.")
     strategy_name = st.selectbox("Select an investment strategy:",
-                                 list(INVESTMENT_STRATEGIES.keys()))
-    strategy_function = INVESTMENT_STRATEGIES[strategy_name]
-
-    # Strategy specific inputs
-    if strategy_name == "Moving Average Crossover":
-        short_window = st.sidebar.number_input(
-            "Short moving average window:",
-            min_value=1,
-            value=50,
-            step=1,
-            help="The number of days to calculate the short moving average."
-        )
-        long_window = st.sidebar.number_input(
-            "Long moving average window:",
-            min_value=1,
-            value=200,
+                                 list(STRATEGY_REGISTRY.keys()))
+    strategy = STRATEGY_REGISTRY[strategy_name]
+
+    # Strategy specific inputs, rendered from the strategy's parameter schema
+    strategy_params = {}
+    for param_name, parameter in strategy.parameters.items():
+        strategy_params[param_name] = st.sidebar.number_input(
+            parameter.label or param_name,
+            min_value=parameter.minimum,
+            value=parameter.default,
+            step=parameter.step,
+            help=parameter.help,
+            key="param_" + strategy_name + "_" + param_name)
+
+    # Optionally sweep a grid of strategy parameters instead of a single backtest
+    sweep_mode = st.checkbox(
+        "Parameter sweep",
+        value=False,
+        help="Backtest every combination of the parameter ranges below on every ticker and rank them by mean return.")
+    if sweep_mode:
+        sweep_ranges = {
+            param_name: sweep_range_input((parameter.label or param_name).rstrip(":"),
+                                          *parameter.sweep, parameter.minimum)
+            for param_name, parameter in strategy.parameters.items()
+        }
+        walk_forward_folds = st.number_input(
+            "Walk-forward folds:",
+            min_value=0,
+            value=0,
             step=1,
-            help="The number of days to calculate the long moving average."
-        )
-        strategy_inputs = (short_window, long_window)
-    elif strategy_name == "Momentum":
-        momentum_window = st.sidebar.number_input(
-            "Momentum window:",
-            min_value=1,
-            value=14,
-            step=1,
-            help="The number of days to calculate the momentum."
-        )
-        strategy_inputs = (momentum_window,)
-    elif strategy_name == "Bollinger Bands":
-        bollinger_window = st.sidebar.number_input(
-            "Bollinger Bands window:",
-            min_value=1,
-            value=20,
-            step=1,
-            help="The number of days to calculate the Bollinger Bands."
-        )
-        bollinger_n_std = st.sidebar.number_input(
-            "Bollinger Bands n standard deviations:",
-            min_value=1.0,
-            value=2.0,
+            help="Optimize the parameters on a rolling train window and score them on the following test window, fold after fold. Use 0 for a single sweep over the whole date range.")
+
+    # Optionally trade all tickers from one shared cash ledger
+    portfolio_mode = st.checkbox(
+        "Shared cash portfolio",
+        value=False,
+        help="Also simulate all tickers on one timeline with a single cash balance, position sizing, commissions and slippage.")
+    if portfolio_mode:
+        portfolio_sizing = st.selectbox(
+            "Position sizing:",
+            SIZING_RULES,
+            format_func=lambda rule: {"equal_split": "Equal split of the capital",
+                                      "percent_of_equity": "Percent of equity",
+                                      "percent_of_cash": "Percent of cash"}[rule])
+        portfolio_fraction = st.number_input(
+            "Percent per position:",
+            min_value=0.1,
+            max_value=100.0,
+            value=round(100.0 / max(len(parse_symbols(symbol)), 1), 1),
             step=0.1,
-            help="The number of standard deviations for the Bollinger Bands."
-        )
-        strategy_inputs = (bollinger_window, bollinger_n_std)
-
-    # Fetch historical data using yfinance
-    data = yf.download(symbol, start=start_date, end=end_date, interval="1d")
+            help="Used by the percent of equity and percent of cash sizing rules.") / 100
+        portfolio_commission = st.number_input(
+            "Commission (% of traded value):", min_value=0.0, value=0.1, step=0.01) / 100
+        portfolio_fixed_commission = st.number_input(
+            "Commission per order:", min_value=0.0, value=0.0, step=0.5)
+        portfolio_slippage = st.number_input(
+            "Slippage (% of price):", min_value=0.0, value=0.05, step=0.01) / 100
+
+    # Optionally rank the tickers against each other and hold the best ones
+    ranking_mode = st.checkbox(
+        "Cross-sectional ranking",
+        value=False,
+        help="Also rank all tickers on every rebalance date and hold the top ones, from one price matrix of the whole universe.")
+    if ranking_mode:
+        ranking_name = st.selectbox("Ranking strategy:", list(CROSS_SECTIONAL_STRATEGIES))
+        ranking_strategy = CROSS_SECTIONAL_STRATEGIES[ranking_name]
+        ranking_params = {}
+        for param_name, parameter in ranking_strategy.parameters.items():
+            ranking_params[param_name] = st.number_input(
+                parameter.label or param_name,
+                min_value=parameter.minimum,
+                value=parameter.default,
+                step=parameter.step,
+                help=parameter.help,
+                key="ranking_" + ranking_name + "_" + param_name)
+        ranking_top = st.number_input("Tickers held:", min_value=1, value=5, step=1)
+        ranking_frequency = st.selectbox("Rebalance:", list(REBALANCE_FREQUENCIES), index=1)
+        ranking_weighting = st.selectbox(
+            "Weighting:", WEIGHTINGS,
+            format_func=lambda weighting: {"equal": "Equal weights", "rank": "By rank"}[weighting])
+        ranking_commission = st.number_input(
+            "Rebalance commission (% of traded value):", min_value=0.0, value=0.1, step=0.01) / 100
+
+    # Optionally resample the backtest to see how much of it is luck
+    robustness_mode = st.checkbox(
+        "Robustness analysis",
+        value=False,
+        help="Resample the backtest thousands of times and show the spread of its return, drawdown and Sharpe ratio.")
+    if robustness_mode:
+        robustness_method = st.selectbox(
+            "Resampling:", ROBUSTNESS_METHODS,
+            format_func=lambda method: {"block_bootstrap": "Block bootstrap of daily P&L",
+                                        "trade_bootstrap": "Bootstrap of trades",
+                                        "trade_shuffle": "Shuffled trade order",
+                                        "entry_delay": "Random entry delays"}[method])
+        robustness_resamples = st.number_input("Resamples:", min_value=100, value=10000, step=1000)
+        robustness_block = st.number_input(
+            "Block length (bars):", min_value=1, value=20, step=1,
+            help="Consecutive bars kept together by the block bootstrap.")
+        robustness_delay = st.number_input(
+            "Maximum entry delay (bars):", min_value=0, value=5, step=1,
+            help="Entries are filled up to this many bars late.")
+
+    # Evaluate the symbols in parallel
+    backtest_workers = st.number_input(
+        "Parallel workers:",
+        min_value=1,
+        value=os.cpu_count() or 1,
+        step=1,
+        help="Number of tickers backtested at the same time. Use 1 to run them one after another.")
+
+    # Limit how many points each chart line sends to the browser
+    chart_points = st.number_input(
+        "Chart points per line:",
+        min_value=100,
+        value=1500,
+        step=100,
+        help="Long price and treasury lines are downsampled to this many points before plotting.")
+    chart_method = st.selectbox(
+        "Chart downsampling:",
+        ["lttb", "minmax"],
+        format_func=lambda method: {"lttb": "Largest-Triangle-Three-Buckets", "minmax": "Min/Max per bucket"}[method])
+
+    # Window of the rolling risk metrics
+    rolling_window = st.number_input(
+        "Rolling metrics window (bars):",
+        min_value=5,
+        value=63,
+        step=1,
+        help="Bars in the rolling Sharpe, Sortino, volatility and drawdown charts.")
+
+    # Only use prices that are already cached on disk
+    offline_mode = st.checkbox(
+        "Offline mode",
+        value=False,
+        help="Use only the prices already stored in the local price cache, without downloading anything.")
+    max_downloads = st.number_input(
+        "Concurrent downloads:",
+        min_value=1,
+        max_value=32,
+        value=8,
+        help="Tickers downloaded at the same time. Failed requests are retried with backoff.")
+
+    # Browse and compare the runs kept in the results store
+    stored_runs_mode = st.checkbox(
+        "Stored runs",
+        value=False,
+        help="Show the backtests and sweeps saved in the local results store, the best stored parameters per ticker and a comparison of two runs, without backtesting again.")
+
+    # Optional profiling of the run, shown in the Performance panel
+    profile_functions = st.checkbox(
+        "Profile functions",
+        value=False,
+        help="Capture a cProfile of the run and list the slowest functions in the Performance panel.")
+    profile_memory = st.checkbox(
+        "Trace memory",
+        value=False,
+        help="Record the peak memory of every stage of the page with tracemalloc. Slows the run down. Backtest jobs are timed only, since the trace is shared by the whole server.")
+    profiler = Profiler(cprofile=profile_functions, memory=profile_memory)
+    profiler.start()
+
+    # Historical data comes through the local price store, which only
+    # downloads the dates that are not cached yet
+    symbols_list = parse_symbols(symbol)
+    price_store = PriceStore(offline=offline_mode, fetcher=get_fetcher(max_downloads))
+    download_bar = st.empty()
+
+    def load_prices():
+        # Load the prices in the script thread (the sweep); backtests load
+        # them in their job
+        download_errors = {}
+
+        def on_download(done_symbol, error):
+            # Tickers arrive in completion order
+            if error is not None:
+                download_errors[done_symbol] = error
+            on_download.done += 1
+            download_bar.progress(min(on_download.done / len(symbols_list), 1.0),
+                                  text=f"Downloaded {done_symbol}")
+        on_download.done = 0
+
+        with span("load prices", symbols=len(symbols_list), interval=bar_interval):
+            if bar_interval == "1d":
+                price_data = load_universe(symbols_list, start_date, end_date,
+                                           store=price_store, progress=on_download)
+            else:
+                # Intraday histories can be millions of bars, so only fill the
+                # cache here and stream the bars from it during the backtest
+                if not offline_mode:
+                    price_store.update_many(symbols_list, start_date, end_date, bar_interval,
+                                            on_download)
+                price_data = None
+        download_bar.empty()
+        for failed_symbol, error in download_errors.items():
+            st.warning(f"Could not download {failed_symbol}: {error}")
+        return price_data
 
     # Create a "Backtest" button
     start_bot_button = st.button("Backtest")
@@ -161,8 +383,30 @@ with st.sidebar:
         This bot was designed and built by [João Montenegro](%s), and you can find the source code on [GitHub](%s).
         ''' % (url[0], url[5], url[4]))
 
+# Backtests run as background jobs: the button submits one and every rerun
+# of this script polls it. Only settings that change the result go into the
+# job's key, so sessions asking for the same backtest share its job
+job_queue = get_job_queue()
+job_config = {"symbols": symbols_list, "start": start_date, "end": end_date,
+              "interval": bar_interval, "strategy": strategy_name, "params": strategy_params,
+              "capital": total_investment, "offline": offline_mode, "chart_points": chart_points}
+if start_bot_button and not sweep_mode:
+    # tracemalloc is process-wide, so a job traced next to page reruns and
+    # other jobs would report their peaks: jobs are only timed
+    submitted = job_queue.submit(job_config, partial(
+        run_backtest_job, store=price_store, symbols=symbols_list, start=start_date,
+        end=end_date, interval=bar_interval, strategy=strategy_name, params=strategy_params,
+        capital=total_investment, workers=backtest_workers, cache=get_result_cache(),
+        features=get_feature_store(), max_points=chart_points, results=get_results_store()),
+        symbols_list, profiler=Profiler(cprofile=profile_functions))
+    st.session_state["backtest_job"] = submitted.id
+backtest_job = job_queue.get(st.session_state.get("backtest_job"))
+# Results are only shown for the settings currently in the sidebar
+if backtest_job is not None and (sweep_mode or backtest_job.key != job_key(job_config)):
+    backtest_job = None
+
 # Main backtesting section
-if not start_bot_button:
+if not start_bot_button and backtest_job is None:
 
     # Show a warning message if the bot is not running
     warning = st.warning(
@@ -289,26 +533,104 @@ if not start_bot_button:
                 "Bollinger Bands are a technical trading tool created by John Bollinger in the early 1980s. They are volatility bands placed above and below a moving average and are used to measure price volatility. Bollinger Bands can be used to identify high and low points in the market, as well as to identify overbought and oversold conditions. More about Moving Average Crossover here: [Investopedia](%s)" % url[1])
 
 
-# Execute the following code only when the button is pressed
-if start_bot_button:
+# Run the parameter sweep when the button is pressed in sweep mode
+price_data = load_prices() if start_bot_button and sweep_mode else None
+if start_bot_button and sweep_mode and price_data is None:
+    st.warning("The parameter sweep is only available for daily bars.")
+elif start_bot_button and sweep_mode:
+    closes = {symbol: price_data[symbol]['Close'].values
+              for symbol in price_data.non_empty()}
+    if not closes:
+        st.write(
+            "No data available for the provided stock symbols and date range.")
+    elif walk_forward_folds:
+        try:
+            with st.spinner("Running walk-forward folds..."), span("walk-forward"):
+                folds = walk_forward(price_data, strategy_name, sweep_ranges,
+                                     total_investment / len(symbols_list),
+                                     n_folds=walk_forward_folds, workers=backtest_workers,
+                                     features=get_feature_store())
+        except ValueError as e:
+            st.error(str(e))
+        else:
+            # Out-of-sample returns of the parameters picked on each train window
+            st.subheader("Walk-forward Folds")
+            col_in, col_out = st.columns(2)
+            with col_in:
+                st.metric("Mean In-sample Return", f"{folds['Train Returns'].mean():.2f} %")
+            with col_out:
+                st.metric("Mean Out-of-sample Return", f"{folds['Test Returns'].mean():.2f} %")
+            with span("figure: walk-forward folds"):
+                fig_folds = px.bar(folds, x='Test Start', y=['Train Returns', 'Test Returns'],
+                                   barmode='group', title='In-sample and Out-of-sample Returns per Fold')
+                st.plotly_chart(fig_folds, use_container_width=True)
+            st.dataframe(folds, use_container_width=True)
+    else:
+        with st.spinner("Sweeping parameters..."), span("sweep"):
+            sweep_results, sweep_ranking = run_sweep(
+                closes, strategy_name, sweep_ranges, total_investment / len(symbols_list),
+                workers=backtest_workers, features=get_feature_store())
+            # Every combination becomes a stored run, for the best parameters per ticker
+            get_results_store().save_sweep(sweep_results, strategy_name,
+                                           total_investment / len(symbols_list), list(price_data),
+                                           start_date, end_date)
+
+        # Display the parameter combinations ranked by mean return
+        st.subheader("Parameter Sweep Ranking")
+        st.dataframe(sweep_ranking, use_container_width=True)
+
+        # Plot the mean return of the first two swept parameters as a heatmap
+        param_names = list(sweep_ranges)
+        st.subheader("Mean Returns (%) by Parameters")
+        with span("figure: sweep heatmap"):
+            fig_heatmap = px.imshow(returns_heatmap(sweep_ranking, param_names[0], param_names[-1]),
+                                    labels=dict(x=param_names[0], y=param_names[-1], color="Returns"),
+                                    aspect="auto",
+                                    title="Mean Returns by Parameters")
+            st.plotly_chart(fig_heatmap, use_container_width=True)
+
+        # Display the returns of every combination on every ticker
+        st.subheader("Returns per Ticker and Parameters")
+        st.dataframe(sweep_results, use_container_width=True)
+
+# Show the tickers of a running backtest as they finish
+if backtest_job is not None and backtest_job.active:
+    st.progress(backtest_job.progress(),
+                text="Backtesting: {} of {} tickers done".format(
+                    backtest_job.finished_symbols(), len(backtest_job.symbols)))
+    partial_summary = backtest_job.partial_summary(total_investment / max(len(backtest_job.symbols), 1))
+    finished = partial_summary.dropna(subset=['Returns'])
+    if len(finished):
+        with span("figure: partial performance"):
+            st.plotly_chart(px.bar(finished, x='Symbol', y='Returns',
+                                   title='Performance of the finished Tickers'),
+                            use_container_width=True)
+    st.dataframe(partial_summary, use_container_width=True)
+elif backtest_job is not None and backtest_job.status == FAILED:
+    st.error(f"The backtest failed: {backtest_job.error}")
+
+# Execute the following code once the backtest job is done
+if backtest_job is not None and backtest_job.status == DONE:
     warning = st.empty()
-    # Split the input symbols into a list
-    symbols_list = symbol.split(',')
-
-    # Initialize an empty DataFrame to store historical data
-    data = pd.DataFrame()
-
-    # Fetch historical data for each symbol and concatenate them into one DataFrame
-    for symbol in symbols_list:
-        symbol_data = yf.download(symbol,
-                                  start=start_date,
-                                  end=end_date,
-                                  interval="1d")
-        symbol_data['Symbol'] = symbol
-        data = pd.concat([data, symbol_data])
+    result_cache = get_result_cache()
+
+    # The job ran the headless backtest core; intraday bars were streamed
+    # from the price store in bounded chunks
+    price_data, result = backtest_job.result
+    if price_data is None:
+        closes = long_closes(result.closes)
+    elif not price_data.empty:
+        closes = price_data.long(['Close'])
+    else:
+        closes = long_closes({})
+    for failed_symbol, error in backtest_job.errors.items():
+        if result is None or error != result.errors.get(failed_symbol):
+            st.warning(f"Could not download {failed_symbol}: {error}")
+    if result is not None:
+        st.caption(f"Stored as run {result.run_id}; compare it with other runs under \"Stored runs\".")
 
     # Check if data is available
-    if data.empty:
+    if closes.empty:
         st.write(
             "No data available for the provided stock symbols and date range.")
     else:
@@ -318,121 +640,35 @@ if start_bot_button:
         # Create an interactive line plot of the closing prices for each symbol using Plotly
         st.subheader(
             "Closing prices of selected stocks, ETFs and/or indexes (USD)")
-        fig = px.line(data,
-                      x=data.index,
-                      y='Close',
-                      color='Symbol',
-                      title='Closing Prices')
-        st.plotly_chart(fig, use_container_width=True)
-
-        # Calculate RSI for each symbol
-        data['RSI'] = data.groupby('Symbol')['Close'].transform(
-            lambda x: ta.momentum.RSIIndicator(x).rsi())
-
-        total_earnings = 0
-        buy_sell_signals = []
-        summary_data = []
-
-        buy_sell_counts = {}
-
-        # Calculate earnings and buy/sell signals for each symbol
-        for symbol in symbols_list:
-            symbol_data = data[data['Symbol'] == symbol].copy()
-
-            # Apply the selected investment strategy
-            try:
-                strategy_function(symbol_data)
-            except Exception as e:
-                st.error(
-                    f"Error applying strategy '{strategy_name}' to symbol '{symbol}': {e}")
-                continue
-
-            # Create Buy and Sell signals
-            # symbol_data['Buy'] = (symbol_data['RSI'] < rsi_min)
-            # symbol_data['Sell'] = (symbol_data['RSI'] > rsi_max)
-
-            in_position = False
-            buy_price = 0
-            earnings = 0
-            num_shares = 0
-
-            buy_count = 0
-            sell_count = 0
-
-            # Initialize investment value for each ticker
-            symbol_investment = total_investment / len(symbols_list)
-
-            # on buy and sell signals
-            for index, row in symbol_data.iterrows():
-                if row['Buy'] and not in_position:
-                    in_position = True
-                    buy_price = row['Close']
-                    # Calculate the number of shares to buy
-                    num_shares = symbol_investment // buy_price
-                    buy_amount = num_shares * buy_price
-                    buy_sell_signals.append({
-                        "Symbol": symbol,
-                        "Signal": "Buy",
-                        "Timestamp": index,
-                        "Price": buy_price,
-                        "Amount": buy_amount
-                    })
-                    buy_count += 1
-                elif row['Sell'] and in_position:
-                    in_position = False
-                    sell_price = row['Close']
-                    earnings += num_shares * (
-                        sell_price - buy_price
-                    )  # Calculate earnings based on the number of shares
-                    sell_amount = num_shares * sell_price
-                    buy_sell_signals.append({
-                        "Symbol": symbol,
-                        "Signal": "Sell",
-                        "Timestamp": index,
-                        "Price": sell_price,
-                        "Amount": sell_amount,
-                        "Earnings": (sell_amount - buy_amount)
-                    })
-                    sell_count += 1
-
-            # Store the number of buy and sell signals for each ticker
-            buy_sell_counts[symbol] = {'Buy': buy_count, 'Sell': sell_count}
-
-            # Update total earnings with the earnings from the current symbol
-            total_earnings += earnings
-
-            # Store the performance data of each ticker in summary_data list
-            summary_data.append({
-                "Symbol": symbol,
-                "Earnings": earnings,
-                "Investment": symbol_investment
-            })
-
-        # Calculate total returns based on the invested amount
-        total_returns = total_investment + total_earnings
+        with span("figure: closing prices"):
+            fig = price_figure(closes, chart_points, chart_method)
+            st.plotly_chart(fig, use_container_width=True)
+
+        for symbol, error in result.errors.items():
+            st.error(
+                f"Error applying strategy '{strategy_name}' to symbol '{symbol}': {error}")
+
+        total_earnings = result.total_earnings
+        total_returns = result.total_returns
 
         # Create a bar chart for the number of buy and sell signals for each ticker
         st.subheader("Number of Buy and Sell Signals")
-        buy_sell_counts_df = pd.DataFrame(buy_sell_counts).T.reset_index().rename(
-            columns={'index': 'Symbol'})
-        fig2 = px.bar(buy_sell_counts_df,
-                      x='Symbol',
-                      y=['Buy', 'Sell'],
-                      barmode='group',
-                      title='Number of Buy and Sell Signals')
-        st.plotly_chart(fig2, use_container_width=True)
+        with span("figure: signal counts"):
+            fig2 = px.bar(result.counts,
+                          x='Symbol',
+                          y=['Buy', 'Sell'],
+                          barmode='group',
+                          title='Number of Buy and Sell Signals')
+            st.plotly_chart(fig2, use_container_width=True)
 
         # Create a bar chart showing the performance of each ticker
         st.subheader("Ticker Performance")
-        performance_data = pd.DataFrame(summary_data).set_index('Symbol')
-        performance_data['Investment'] = performance_data['Investment'].astype(
-            float)
-        performance_data['Returns'] = performance_data[
-            'Earnings'] / performance_data['Investment'] * 100
-        fig4 = px.bar(performance_data,
-                      y='Returns',
-                      title='Performance of each Ticker')
-        st.plotly_chart(fig4, use_container_width=True)
+        performance_data = result.summary.set_index('Symbol')
+        with span("figure: ticker performance"):
+            fig4 = px.bar(performance_data,
+                          y='Returns',
+                          title='Performance of each Ticker')
+            st.plotly_chart(fig4, use_container_width=True)
 
         # Display earnings and total returns in Streamlit metrics
         with col1:
@@ -448,104 +684,199 @@ if start_bot_button:
         with cola1:
             # Display a summary of all tickers' performance
             st.subheader("Summary of Performance")
-            summary_df = pd.DataFrame(summary_data)
-            summary_df['Investment'] = summary_df['Investment'].astype(float)
-            summary_df[
-                'Returns'] = summary_df['Earnings'] / summary_df['Investment'] * 100
-            st.dataframe(summary_df, use_container_width=True)
-
-            signals_df = pd.DataFrame(buy_sell_signals)
+            st.dataframe(result.summary, use_container_width=True)
 
         with cola2:
             # Display a table with the number of buys and sells for each ticker
             st.subheader("Buy and Sell Counts")
-            buy_sell_counts_df = pd.DataFrame(
-                buy_sell_counts).T.reset_index().rename(columns={'index': 'Symbol'})
-            st.dataframe(buy_sell_counts_df, use_container_width=True)
+            st.dataframe(result.counts, use_container_width=True)
+
+        # Risk and performance metrics of every ticker and of the whole portfolio
+        if result.signals:
+            with span("analytics"):
+                analytics = analyze(result, window=rolling_window)
+            st.subheader("Risk and Performance Metrics")
+            colm1, colm2, colm3, colm4 = st.columns(4)
+            portfolio_metrics = analytics.portfolio()
+            with colm1:
+                st.metric("Sharpe Ratio", f"{portfolio_metrics['Sharpe']:.2f}")
+            with colm2:
+                st.metric("Sortino Ratio", f"{portfolio_metrics['Sortino']:.2f}")
+            with colm3:
+                st.metric("Max Drawdown", f"{portfolio_metrics['Max Drawdown (%)']:.2f} %")
+            with colm4:
+                st.metric("Win Rate", f"{portfolio_metrics['Win Rate (%)']:.1f} %")
+            st.dataframe(analytics.metrics, use_container_width=True)
+            with span("figure: rolling metrics"):
+                colg1, colg2 = st.columns(2)
+                with colg1:
+                    st.plotly_chart(rolling_figure(analytics.rolling, ["Rolling Sharpe", "Rolling Sortino"],
+                                                   f"Rolling {rolling_window}-bar Sharpe and Sortino",
+                                                   chart_points, chart_method),
+                                    use_container_width=True)
+                with colg2:
+                    st.plotly_chart(rolling_figure(analytics.rolling,
+                                                   ["Rolling Volatility (%)", "Rolling Drawdown (%)"],
+                                                   f"Rolling {rolling_window}-bar Volatility and Drawdown",
+                                                   chart_points, chart_method),
+                                    use_container_width=True)
 
         # Display a table with the list of buys and sells for each ticker
         st.subheader("List of Buy and Sell Orders")
-        orders_data = []
-        for symbol in symbols_list:
-            symbol_orders = signals_df[signals_df['Symbol'] == symbol].copy()
-            symbol_orders['Amount'] = symbol_orders['Amount'].astype(float)
-            symbol_orders['Earnings'] = symbol_orders['Earnings'].astype(float)
-            symbol_orders['Cumulative Amount'] = symbol_orders['Amount'].cumsum()
-            symbol_orders['Cumulative Earnings'] = symbol_orders['Earnings'].cumsum()
-            orders_data.append(symbol_orders)
-        orders_df = pd.concat(orders_data)
-        st.dataframe(orders_df, use_container_width=True)
-
-        # Initialize the starting treasury
-        treasury = total_investment
-
-        # Create a copy of the buy_sell_signals list
-        buy_sell_list = buy_sell_signals.copy()
-
-        # Insert a new dictionary at the beginning of the list to represent the starting treasury
-        buy_sell_list.insert(
-            0, {'Symbol': 'Treasury', 'Signal': 'Buy', 'Timestamp': start_date, 'Amount': treasury})
-
-        # Sort the list by timestamp
-        buy_sell_list_sorted = sorted(
-            buy_sell_list, key=lambda x: x['Timestamp'])
-
-        # Calculate the change in treasury for each timestamp
-        for i in range(1, len(buy_sell_list_sorted)):
-            signal = buy_sell_list_sorted[i]['Signal']
-            amount = buy_sell_list_sorted[i]['Amount']
-            if signal == 'Buy':
-                treasury -= amount
-            elif signal == 'Sell':
-                treasury += amount
-            buy_sell_list_sorted[i]['Amount'] = treasury
-
-        # Convert the buy_sell_list_sorted to a Pandas DataFrame
-        buy_sell_df = pd.DataFrame(buy_sell_list_sorted)
+        st.dataframe(result.orders, use_container_width=True)
 
         # Plot the cumulative treasury using Plotly
         st.subheader("Cumulative treasury over time")
-        fig_cumulative_treasury = px.scatter(buy_sell_df,
-                                             x=buy_sell_df['Timestamp'],
-                                             y=buy_sell_df['Amount'],
-                                             title="Cumulative treasury over time",
-                                             trendline="ols",
-                                             trendline_scope="overall",
-                                             trendline_color_override="red")
-        st.plotly_chart(fig_cumulative_treasury.update_traces(
-            mode='lines'), use_container_width=True)
+        with span("figure: treasury"):
+            fig_cumulative_treasury = treasury_figure(
+                result.treasury, chart_points, chart_method)
+            st.plotly_chart(fig_cumulative_treasury, use_container_width=True)
+
+        # Replay the same signals on one shared cash ledger
+        if portfolio_mode and result.signals:
+            with span("portfolio"):
+                portfolio = simulate_portfolio(result.signals, total_investment,
+                                               sizing=portfolio_sizing,
+                                               fraction=portfolio_fraction,
+                                               commission=portfolio_commission,
+                                               fixed_commission=portfolio_fixed_commission,
+                                               slippage=portfolio_slippage)
+            st.subheader("Shared cash portfolio")
+            colp1, colp2, colp3 = st.columns(3)
+            with colp1:
+                st.metric("Final Equity", "${:,.2f}".format(portfolio.final_equity),
+                          delta=f"{portfolio.total_return:.2f} %")
+            with colp2:
+                st.metric("Commissions Paid", "${:,.2f}".format(portfolio.fills['Commission'].sum()))
+            with colp3:
+                st.metric("Entries Skipped (no cash)", portfolio.skipped)
+            with span("figure: portfolio equity"):
+                st.plotly_chart(equity_figure(portfolio.equity, chart_points, chart_method),
+                                use_container_width=True)
+            st.dataframe(portfolio.fills, use_container_width=True)
+        elif portfolio_mode:
+            st.info("The shared cash portfolio is only available for daily bars.")
+
+        # Rank the whole universe on every rebalance date
+        if ranking_mode and price_data is not None:
+            with span("ranking"):
+                ranking = rank_backtest(price_data, ranking_name, ranking_params, total_investment,
+                                        top=ranking_top, frequency=ranking_frequency,
+                                        weighting=ranking_weighting, commission=ranking_commission)
+            st.subheader(f"Cross-sectional ranking: {ranking_name}")
+            colr1, colr2 = st.columns(2)
+            with colr1:
+                st.metric("Final Equity", "${:,.2f}".format(ranking.final_equity),
+                          delta=f"{ranking.total_return:.2f} %")
+            with colr2:
+                st.metric("Mean Turnover per Rebalance", f"{ranking.turnover.mean() * 100:.1f} %")
+            with span("figure: ranking equity"):
+                st.plotly_chart(equity_figure(ranking.equity, chart_points, chart_method),
+                                use_container_width=True)
+            st.dataframe(ranking.holdings(), use_container_width=True)
+        elif ranking_mode:
+            st.info("Cross-sectional ranking is only available for daily bars.")
+
+        # Spread of the results over resampled histories
+        if robustness_mode and result.signals and result.trades:
+            with st.spinner("Resampling..."), span("robustness", resamples=robustness_resamples):
+                spread = robustness(result, robustness_method, robustness_resamples,
+                                    block_length=robustness_block, max_delay=robustness_delay,
+                                    workers=backtest_workers)
+            st.subheader("Robustness")
+            st.metric("Probability of a Loss", f"{spread.probability_of_loss:.1%}")
+            st.dataframe(spread.summary(), use_container_width=True)
+            with span("figure: robustness"):
+                metric_columns = st.columns(3)
+                for metric_column, metric in zip(metric_columns, spread.samples.columns):
+                    fig_spread = px.histogram(spread.samples, x=metric, nbins=60, title=metric)
+                    fig_spread.add_vline(x=spread.actual[metric], line_dash="dash",
+                                         annotation_text="Backtest")
+                    with metric_column:
+                        st.plotly_chart(fig_spread, use_container_width=True)
+        elif robustness_mode:
+            st.info("The robustness analysis needs daily bars and at least one trade.")
 
         # Add a line graph showing buy and sell orders in time (timeframe)
         st.subheader("Buy and Sell Orders in Time")
-        orders_data_graph = []
-        for symbol in symbols_list:
-            symbol_orders = signals_df[signals_df['Symbol'] == symbol].copy()
-            symbol_orders['Amount'] = symbol_orders['Amount'].astype(float)
-            orders_data_graph.append(symbol_orders)
-        fig6 = px.line(pd.concat(orders_data_graph), x='Timestamp', y='Amount',
-                       color='Symbol', title='Buy and Sell Orders in Time', markers=True)
-        st.plotly_chart(fig6, use_container_width=True)
+        with span("figure: orders in time"):
+            fig6 = px.line(result.orders, x='Timestamp', y='Amount',
+                           color='Symbol', title='Buy and Sell Orders in Time', markers=True)
+            st.plotly_chart(fig6, use_container_width=True)
 
         coli1, coli2 = st.columns(2, gap="large")
         with coli1:
             # Create a pie chart showing the distribution of earnings among the tickers
             st.subheader("Earnings Distribution")
-            earnings_data = pd.DataFrame(data=summary_data).set_index('Symbol')
-            fig3 = px.pie(earnings_data,
-                          values='Earnings',
-                          names=earnings_data.index,
-                          title='Earnings Distribution')
-            st.plotly_chart(fig3, use_container_width=True)
+            with span("figure: earnings distribution"):
+                fig3 = px.pie(performance_data,
+                              values='Earnings',
+                              names=performance_data.index,
+                              title='Earnings Distribution')
+                st.plotly_chart(fig3, use_container_width=True)
 
         with coli2:
             # Display the investment amount for each ticker
             st.subheader("Investment Allocation")
-            investment_data = pd.DataFrame(
-                data=summary_data).set_index('Symbol')
-            investment_data['Investment'] = investment_data['Investment'].astype(
-                float)
-            fig5 = px.pie(investment_data,
-                          values='Investment',
-                          names=investment_data.index,
-                          title='Investment Allocation')
-            st.plotly_chart(fig5, use_container_width=True)
+            with span("figure: investment allocation"):
+                fig5 = px.pie(performance_data,
+                              values='Investment',
+                              names=performance_data.index,
+                              title='Investment Allocation')
+                st.plotly_chart(fig5, use_container_width=True)
+
+        # Show how often strategy results were reused from the cache
+        with st.expander("Result cache"):
+            cache_stats = result_cache.stats()
+            st.write("{hits} hits, {misses} misses ({hit_rate:.0%} hit rate), {entries} entries using {megabytes:,.1f} MB, {evictions} evictions".format(
+                megabytes=cache_stats["bytes"] / 1024 ** 2, **cache_stats))
+        # And how often indicator columns were shared instead of recomputed
+        with st.expander("Feature store"):
+            feature_stats = get_feature_store().stats()
+            st.write("{hits} hits, {disk_hits} read from disk, {misses} computed; {columns} indicator columns of {symbols} tickers using {megabytes:,.1f} MB".format(
+                megabytes=feature_stats["bytes"] / 1024 ** 2, **feature_stats))
+
+# Runs served from the results store, without backtesting anything again
+if stored_runs_mode:
+    results_store = get_results_store()
+    with span("stored runs"):
+        stored_runs = results_store.runs()
+    st.subheader("Stored Runs")
+    if stored_runs.empty:
+        st.info("No runs stored yet. Every backtest and parameter sweep is added to the store.")
+    else:
+        st.dataframe(stored_runs, use_container_width=True)
+
+        st.subheader(f"Best Stored Parameters per Ticker: {strategy_name}")
+        st.dataframe(results_store.best_params(strategy_name), use_container_width=True)
+
+        # Compare two runs ticker by ticker
+        run_labels = {row.Run: f"{row.Strategy} {row.Params} ({row.Start} to {row.End}, {row.Interval})"
+                      for row in stored_runs.itertuples()}
+        colc1, colc2 = st.columns(2)
+        with colc1:
+            run_a = st.selectbox("Run A:", list(run_labels), format_func=run_labels.get)
+        with colc2:
+            run_b = st.selectbox("Run B:", list(run_labels), index=min(1, len(run_labels) - 1),
+                                 format_func=run_labels.get)
+        comparison = results_store.compare(run_a, run_b)
+        with span("figure: run comparison"):
+            st.plotly_chart(px.bar(comparison, x='Symbol', y=['Returns (A)', 'Returns (B)'],
+                                   barmode='group', title='Returns of Run A and Run B'),
+                            use_container_width=True)
+        st.dataframe(comparison, use_container_width=True)
+
+# Show where the time of this run went: the backtest ran in its job under the
+# job's profiler, the charts of its results in this script run
+profiler.stop()
+job_done = backtest_job is not None and backtest_job.status == DONE
+if job_done or (start_bot_button and sweep_mode):
+    with st.expander("Performance"):
+        if job_done and backtest_job.profiler is not None:
+            show_profile(backtest_job.profiler, "Backtest", "job_profile")
+        show_profile(profiler, "Charts and tables" if job_done else "Sweep", "page_profile")
+
+# Poll a running backtest job again shortly
+if backtest_job is not None and backtest_job.active:
+    time.sleep(0.5)
+    st.experimental_rerun()
@@ -0,0 +1,250 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from compact import TradeLog
+from profiling import span
+from result_cache import result_key
+from strategies import INVESTMENT_STRATEGIES, STRATEGY_REGISTRY
+from trade_engine import simulate_trades
+
+# Headless backtest core. Nothing in here imports streamlit or plotly, so the
+# same code drives the Streamlit page, the command line and batch jobs.
+
+ORDER_COLUMNS = ['Symbol', 'Signal', 'Timestamp', 'Price', 'Amount', 'Earnings']
+
+
+class BacktestResult:
+    def __init__(self, strategy, params, capital, symbols):
+        self.strategy = strategy
+        self.params = params
+        self.capital = capital
+        self.symbols = symbols
+        # Per-symbol outputs, in the order the symbols were requested
+        self.signals = {}
+        self.trades = {}
+        self.errors = {}
+        self.summary = None
+        self.counts = None
+        self.orders = None
+        self.treasury = None
+
+    @property
+    def total_earnings(self):
+        return float(self.summary['Earnings'].sum()) if len(self.summary) else 0.0
+
+    @property
+    def total_returns(self):
+        return self.capital + self.total_earnings
+
+    def config(self):
+        return {"strategy": self.strategy, "params": self.params,
+                "capital": self.capital, "symbols": self.symbols}
+
+    def save(self, directory, fmt="parquet"):
+        # Write every result table plus a JSON file with the run totals
+        os.makedirs(directory, exist_ok=True)
+        tables = {"summary": self.summary, "counts": self.counts,
+                  "orders": self.orders, "treasury": self.treasury}
+        for name, table in tables.items():
+            path = os.path.join(directory, f"{name}.{fmt}")
+            if fmt == "parquet":
+                table.to_parquet(path, index=False)
+            else:
+                table.to_json(path, orient="records", date_format="iso", indent=2)
+        with open(os.path.join(directory, "result.json"), "w") as f:
+            json.dump(dict(self.config(),
+                           total_earnings=self.total_earnings,
+                           total_returns=self.total_returns,
+                           errors=self.errors), f, indent=2, default=str)
+
+
+def resolve_strategy(strategy):
+    # Accept a strategy name from INVESTMENT_STRATEGIES or a strategy function
+    if callable(strategy):
+        return strategy.__name__, strategy
+    if strategy not in INVESTMENT_STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}'. Available strategies: "
+                         + ", ".join(INVESTMENT_STRATEGIES))
+    return strategy, INVESTMENT_STRATEGIES[strategy]
+
+
+def treasury_over_time(orders, capital, start=None):
+    # Cash left after every order, starting from the whole capital
+    start = pd.Timestamp(start) if start is not None else (
+        orders['Timestamp'].min() if len(orders) else pd.NaT)
+    # Intraday bars are tz-aware: the first row takes the orders' timezone so
+    # the column keeps a single datetime dtype
+    tz = getattr(orders['Timestamp'].dtype, 'tz', None)
+    if start is not pd.NaT and start.tzinfo is None and tz is not None:
+        start = start.tz_localize(tz)
+    elif start is not pd.NaT and start.tzinfo is not None:
+        start = start.tz_convert(tz)
+    orders = orders.sort_values('Timestamp', kind='mergesort')
+    change = np.where(orders['Signal'] == 'Buy', -orders['Amount'], orders['Amount'])
+    first = pd.DataFrame([{'Symbol': 'Treasury', 'Signal': 'Buy',
+                           'Timestamp': start, 'Amount': capital}])
+    treasury = orders[['Symbol', 'Signal', 'Timestamp', 'Price']].assign(
+        Amount=capital + np.cumsum(change))
+    return pd.concat([first, treasury], ignore_index=True)
+
+
+def evaluate_symbol(symbol_data, strategy_function, params, investment, signals=None,
+                    features=None):
+    # Per-symbol pipeline: indicators and signals, then the trade simulation.
+    # Runs in a worker thread or process, so it only uses its arguments
+    if signals is None:
+        with span("signals"):
+            # Shallow copy: the strategy adds its columns without touching the prices
+            signals = symbol_data.copy(deep=False)
+            if features is None:
+                strategy_function(signals, **params)
+            else:
+                strategy_function(signals, features=features, **params)
+    # Simulate the buy and sell orders for the whole history at once
+    with span("trades"):
+        trades = simulate_trades(signals['Close'].values,
+                                 signals['Buy'].values,
+                                 signals['Sell'].values,
+                                 investment)
+    return signals, trades
+
+
+def map_symbols(function, tasks, workers=1, executor="process", progress=None):
+    # Run function(*args) for every {symbol: args} task, on a pool when there
+    # is more than one worker. Returns {symbol: (value, error message)};
+    # progress(symbol, value, error) is called as each symbol finishes
+    outcomes = {}
+    if workers <= 1 or len(tasks) <= 1:
+        for symbol, args in tasks.items():
+            try:
+                outcomes[symbol] = (function(*args), None)
+            except Exception as e:
+                outcomes[symbol] = (None, str(e))
+            if progress is not None:
+                progress(symbol, *outcomes[symbol])
+        return outcomes
+
+    pool_class = ThreadPoolExecutor if executor == "thread" else ProcessPoolExecutor
+    with pool_class(max_workers=min(workers, len(tasks))) as pool:
+        futures = {pool.submit(function, *args): symbol for symbol, args in tasks.items()}
+        for future in as_completed(futures):
+            symbol = futures[future]
+            try:
+                outcomes[symbol] = (future.result(), None)
+            except Exception as e:
+                outcomes[symbol] = (None, str(e))
+            if progress is not None:
+                progress(symbol, *outcomes[symbol])
+    return outcomes
+
+
+def collect_results(result, evaluated, symbol_investment, start=None):
+    # Aggregate per-symbol (signals, trades) outcomes into the result tables
+    trade_log = TradeLog()
+    summary_data = []
+    buy_sell_counts = []
+    for symbol in result.symbols:
+        value, error = evaluated[symbol]
+        if error is not None:
+            result.errors[symbol] = error
+            continue
+        symbol_data, trades = value
+        result.signals[symbol] = symbol_data
+        result.trades[symbol] = trades
+        trade_log.append_trades(symbol, symbol_data.index, trades)
+        buy_sell_counts.append({'Symbol': symbol,
+                                'Buy': trades['buy_count'],
+                                'Sell': trades['sell_count']})
+        summary_data.append({'Symbol': symbol,
+                             'Earnings': trades['total_earnings'],
+                             'Investment': float(symbol_investment)})
+
+    return build_tables(result, trade_log, summary_data, buy_sell_counts, start)
+
+
+def build_tables(result, trade_log, summary_data, buy_sell_counts, start=None):
+    # Turn the trade log (compact.TradeLog), summary and count records into
+    # the result tables
+    result.summary = pd.DataFrame(summary_data, columns=['Symbol', 'Earnings', 'Investment'])
+    result.summary['Returns'] = result.summary['Earnings'] / result.summary['Investment'] * 100
+    result.counts = pd.DataFrame(buy_sell_counts, columns=['Symbol', 'Buy', 'Sell'])
+
+    # Orders are recorded symbol by symbol, so each symbol's rows are contiguous
+    orders = trade_log.to_frame()[ORDER_COLUMNS]
+    symbol_orders = orders.groupby('Symbol', sort=False)
+    orders['Cumulative Amount'] = symbol_orders['Amount'].cumsum()
+    orders['Cumulative Earnings'] = symbol_orders['Earnings'].cumsum()
+    result.orders = orders
+
+    result.treasury = treasury_over_time(orders, result.capital, start)
+    return result
+
+
+def backtest(data, strategy, params=None, capital=10000.0, start=None, cache=None,
+             workers=1, executor="process", features=None, progress=None):
+    # data: Universe or {symbol: OHLCV DataFrame}
+    # Capital is split evenly between all requested symbols. With a cache
+    # (result_cache.LRUCache), signal frames and trades of symbol/strategy
+    # pairs whose prices and parameters did not change are reused. With a
+    # feature store (feature_store.FeatureStore), registered strategies take
+    # their indicators from it. Symbols are independent, so with workers > 1
+    # they are evaluated on a thread or process pool and merged back in the
+    # requested order. progress(symbol, earnings, error) follows every symbol
+    # as it finishes
+    name, strategy_function = resolve_strategy(strategy)
+    params = dict(params or {})
+    if name in STRATEGY_REGISTRY:
+        # Fill in the defaults and check the values against the schema
+        params = STRATEGY_REGISTRY[name].validate(params)
+        if features is not None:
+            strategy_function = STRATEGY_REGISTRY[name].apply
+    else:
+        features = None
+    symbols = list(data)
+    result = BacktestResult(name, params, capital, symbols)
+    symbol_investment = capital / len(symbols) if symbols else 0.0
+
+    # Look up cached results first and only send the misses to the pool
+    keys = {}
+    evaluated = {}
+    tasks = {}
+    with span("cache lookup", symbols=len(symbols)):
+        for symbol in symbols:
+            symbol_data = data[symbol]
+            if symbol_data.empty:
+                evaluated[symbol] = (None, "No price data available")
+                continue
+            signals = trades = None
+            if cache is not None:
+                keys[symbol] = result_key(symbol, symbol_data, name, params)
+                signals = cache.get(("signals",) + keys[symbol])
+                trades = cache.get(("trades", symbol_investment) + keys[symbol])
+            if signals is not None and trades is not None:
+                evaluated[symbol] = ((signals, trades), None)
+            else:
+                view = None if features is None else features.view(symbol, symbol_data['Close'].values)
+                tasks[symbol] = (symbol_data, strategy_function, params, symbol_investment, signals, view)
+
+    def report(symbol, value, error):
+        if progress is not None:
+            progress(symbol, None if value is None else value[1]["total_earnings"], error)
+
+    # Empty and cached symbols are already done
+    for symbol, (value, error) in evaluated.items():
+        report(symbol, value, error)
+    with span("evaluate symbols", symbols=len(tasks), workers=workers):
+        evaluated.update(map_symbols(evaluate_symbol, tasks, workers, executor, report))
+
+    if cache is not None:
+        for symbol in tasks:
+            value, error = evaluated[symbol]
+            if error is None:
+                cache.put(("signals",) + keys[symbol], value[0])
+                cache.put(("trades", symbol_investment) + keys[symbol], value[1])
+
+    with span("aggregate"):
+        return collect_results(result, evaluated, symbol_investment, start)
@@ -0,0 +1,181 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from backtest import BacktestResult, collect_results
+from compact import memory_per_million_bars
+from signal_dsl import IndicatorCache, evaluate, walk
+from strategies import STRATEGY_REGISTRY
+from synthetic_data import synthetic_ohlcv
+from trade_engine import simulate_trades
+
+# Times every stage of the backtest pipeline on synthetic data and appends the
+# results to a JSON lines file, so runs can be compared over time:
+#   python benchmark.py --tickers 50 --years 10 --freq 1d
+
+STAGES = ["indicators", "signals", "trades", "aggregation", "figures"]
+
+# Nodes of the signal graph that are indicators rather than comparisons
+INDICATOR_NODES = {"sma", "std", "rsi", "highest", "lowest"}
+
+
+def run_stages(data, strategy, capital=10000.0):
+    # Run the pipeline stage by stage; yields (stage name, callable) pairs so
+    # the caller decides how to measure them
+    state = {}
+    symbols = list(data)
+    investment = capital / len(symbols)
+
+    nodes = [node for expression in STRATEGY_REGISTRY[strategy].compile()
+             for node in walk(expression) if node[0] in INDICATOR_NODES]
+
+    def indicators():
+        state["caches"] = {}
+        for symbol in symbols:
+            cache = IndicatorCache(data[symbol]["Close"].values, data[symbol])
+            for node in nodes:
+                evaluate(node, cache)
+            state["caches"][symbol] = cache
+
+    def signals():
+        state["signals"] = {symbol: STRATEGY_REGISTRY[strategy].signals(cache)
+                            for symbol, cache in state["caches"].items()}
+
+    def trades():
+        state["trades"] = {symbol: simulate_trades(data[symbol]["Close"].values, buy, sell, investment)
+                           for symbol, (buy, sell) in state["signals"].items()}
+
+    def aggregation():
+        evaluated = {symbol: ((data[symbol], state["trades"][symbol]), None) for symbol in symbols}
+        result = BacktestResult(strategy, {}, capital, symbols)
+        state["result"] = collect_results(result, evaluated, investment)
+
+    def figures():
+        from charting import price_figure, treasury_figure
+        price_figure(data.long(["Close"]))
+        treasury_figure(state["result"].treasury)
+
+    return [("indicators", indicators), ("signals", signals), ("trades", trades),
+            ("aggregation", aggregation), ("figures", figures)]
+
+
+def _figures_available():
+    try:
+        import plotly  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def benchmark(tickers=10, years=5, freq="1d", strategy="Bollinger Bands", repeat=3, seed=0):
+    data = synthetic_ohlcv(tickers, years, freq, seed=seed)
+    bars = sum(len(frame) for _, frame in data.items())
+    skip = set() if _figures_available() else {"figures"}
+
+    # Timing: best of several runs, without tracemalloc slowing things down
+    seconds = {stage: float("inf") for stage in STAGES if stage not in skip}
+    for _ in range(repeat):
+        for stage, run in run_stages(data, strategy):
+            if stage in skip:
+                continue
+            started = time.perf_counter()
+            run()
+            seconds[stage] = min(seconds[stage], time.perf_counter() - started)
+
+    # Peak memory of every stage, in a separate traced run
+    peak_bytes = {}
+    tracemalloc.start()
+    for stage, run in run_stages(data, strategy):
+        if stage in skip:
+            continue
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        run()
+        peak_bytes[stage] = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "config": {"tickers": tickers, "years": years, "freq": freq,
+                   "strategy": strategy, "repeat": repeat, "seed": seed},
+        "bars": bars,
+        "stages": {stage: {"seconds": seconds[stage],
+                           "bars_per_second": bars / seconds[stage] if seconds[stage] else None,
+                           "peak_mb": peak_bytes[stage] / 1024 ** 2}
+                   for stage in seconds},
+        "total_seconds": sum(seconds.values()),
+        "memory": memory_per_million_bars(dict(data.items())),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_run(path, config):
+    # Last stored run with the same configuration, for comparison
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, "r") as f:
+        for line in f:
+            record = json.loads(line)
+            if record["config"] == config:
+                previous = record
+    return previous
+
+
+def report(record, previous=None):
+    lines = [f"{record['bars']:,} bars ({record['config']['tickers']} tickers x "
+             f"{record['config']['years']} years of {record['config']['freq']} bars)",
+             f"{'stage':<12} {'seconds':>10} {'bars/sec':>14} {'peak MB':>10} {'vs last':>9}"]
+    for stage, stats in record["stages"].items():
+        change = ""
+        if previous and stage in previous["stages"] and previous["stages"][stage]["seconds"]:
+            change = f"{stats['seconds'] / previous['stages'][stage]['seconds']:.2f}x"
+        lines.append(f"{stage:<12} {stats['seconds']:>10.4f} {stats['bars_per_second']:>14,.0f} "
+                     f"{stats['peak_mb']:>10.1f} {change:>9}")
+    lines.append(f"{'total':<12} {record['total_seconds']:>10.4f}")
+    memory = record.get("memory")
+    if memory and memory.get("bars"):
+        lines.append(f"memory per million bars: {memory['standard_mb_per_million_bars']:.1f} MB standard, "
+                     f"{memory['compact_mb_per_million_bars']:.1f} MB compact "
+                     f"({memory['ratio']:.1f}x smaller)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backtest pipeline on synthetic data.")
+    parser.add_argument("--tickers", type=int, default=10)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--freq", default="1d", help="Bar frequency, e.g. 1d, 5m or 1m.")
+    parser.add_argument("--strategy", default="Bollinger Bands", choices=list(STRATEGY_REGISTRY))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.jsonl",
+                        help="JSON lines file the results are appended to.")
+    args = parser.parse_args(argv)
+
+    record = benchmark(args.tickers, args.years, args.freq, args.strategy, args.repeat, args.seed)
+    print(report(record, previous_run(args.output, record["config"])))
+    with open(args.output, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
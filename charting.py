@@ -0,0 +1,68 @@
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+from downsampling import DEFAULT_MAX_POINTS, as_float, downsample, ols_trendline
+
+# Figure builders that downsample long series before they are sent to the
+# browser, using the shape-preserving methods in downsampling.py.
+
+
+def price_figure(data, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    # Closing prices per symbol from a long frame with a Symbol column
+    sampled = downsample(data, "index", "Close", max_points, method, group="Symbol")
+    return px.line(sampled,
+                   x=sampled.index,
+                   y='Close',
+                   color='Symbol',
+                   title='Closing Prices')
+
+
+def treasury_figure(treasury, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    # Treasury line with its OLS trendline, fitted on every point
+    treasury = treasury.dropna(subset=['Timestamp', 'Amount'])
+    timestamps = treasury['Timestamp']
+    # A column mixing naive and tz-aware timestamps (results saved before the
+    # treasury start took the bars' timezone) is only comparable in UTC
+    timestamps = pd.to_datetime(timestamps, utc=timestamps.dtype == object)
+    slope, intercept = ols_trendline(timestamps.values, treasury['Amount'].values)
+    sampled = downsample(treasury.assign(Timestamp=timestamps), 'Timestamp', 'Amount',
+                         max_points, method)
+
+    fig = px.line(sampled,
+                  x='Timestamp',
+                  y='Amount',
+                  title="Cumulative treasury over time")
+    if len(timestamps) > 1:
+        ends = timestamps.iloc[[0, -1]]
+        fig.add_trace(go.Scatter(x=ends,
+                                 y=slope * as_float(ends.values) + intercept,
+                                 mode='lines',
+                                 name='OLS trendline',
+                                 line=dict(color='red')))
+    return fig
+
+
+def equity_figure(equity, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    # Mark-to-market equity and cash of a portfolio simulation
+    sampled = pd.concat([downsample(equity, "index", column, max_points, method)[[column]]
+                         .rename(columns={column: "Amount"}).assign(Line=column)
+                         for column in ["Equity", "Cash"]])
+    return px.line(sampled,
+                   x=sampled.index,
+                   y='Amount',
+                   color='Line',
+                   title="Portfolio equity over time")
+
+
+def rolling_figure(rolling, columns, title, max_points=DEFAULT_MAX_POINTS, method="lttb"):
+    # Rolling metrics (analytics.rolling_metrics) as one line per column
+    rolling = rolling[columns].dropna(how="all")
+    sampled = pd.concat([downsample(rolling[[column]].dropna(), "index", column, max_points, method)
+                         .rename(columns={column: "Value"}).assign(Metric=column)
+                         for column in columns])
+    return px.line(sampled,
+                   x=sampled.index,
+                   y='Value',
+                   color='Metric',
+                   title=title)
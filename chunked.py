@@ -0,0 +1,198 @@
+import numpy as np
+import pandas as pd
+
+from backtest import BacktestResult, build_tables, resolve_strategy
+from compact import TradeLog
+from downsampling import DEFAULT_MAX_POINTS, minmax_indices
+from price_store import ROW_GROUP_SIZE
+from profiling import span
+from signal_dsl import IndicatorCache, walk
+from strategies import STRATEGY_REGISTRY
+from trade_engine import simulate_trades
+
+# Streaming backtest for long (e.g. 1-minute) histories. Bars are read from the
+# price store in bounded chunks and pushed through the indicators and the
+# trade simulation with their state carried across chunk boundaries, so memory
+# stays flat no matter how long the history is:
+#   - rolling indicators keep the last bars they still need as a tail
+#   - the Wilder RSI keeps its smoothed gains/losses, since it never forgets
+#   - the trade simulation carries the open position into the next chunk
+
+
+class ChunkedRSI:
+    # ta's RSIIndicator computed chunk by chunk with carried smoothing state
+    def __init__(self, period=14):
+        self.period = period
+        self.previous = None
+        self.avg_gain = None
+        self.avg_loss = None
+        self.count = 0
+
+    def update(self, close):
+        close = np.asarray(close, dtype=float)
+        if len(close) == 0:
+            return close
+        previous = close[0] if self.previous is None else self.previous
+        change = np.diff(close, prepend=previous)
+        gains = pd.Series(np.clip(change, 0, None))
+        losses = pd.Series(np.clip(-change, 0, None))
+        if self.avg_gain is not None:
+            # Seeding the exponential average with the carried value continues
+            # the same recursion as one long series
+            gains = pd.concat([pd.Series([self.avg_gain]), gains], ignore_index=True)
+            losses = pd.concat([pd.Series([self.avg_loss]), losses], ignore_index=True)
+        alpha = 1.0 / self.period
+        avg_gain = gains.ewm(alpha=alpha, adjust=False).mean().to_numpy()[-len(close):]
+        avg_loss = losses.ewm(alpha=alpha, adjust=False).mean().to_numpy()[-len(close):]
+
+        count = self.count + np.arange(1, len(close) + 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rsi = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+        rsi[count < self.period] = np.nan
+
+        self.previous = close[-1]
+        self.avg_gain, self.avg_loss = avg_gain[-1], avg_loss[-1]
+        self.count += len(close)
+        return rsi
+
+
+class ChunkedSignals:
+    # Buy/Sell signals of a strategy for consecutive chunks of closes
+    def __init__(self, strategy_name, params=None):
+        self.strategy = STRATEGY_REGISTRY[strategy_name]
+        self.params = self.strategy.validate(params)
+        nodes = [node for expression in self.strategy.compile(self.params)
+                 for node in walk(expression)]
+        # Rolling windows, shifts and crossovers only look back a fixed
+        # number of bars, which the tail keeps
+        self.tail_size = self.strategy.lookback(self.params) + 1
+        self.tail = np.empty(0)
+        # The RSI never forgets, so its smoothing state is carried instead
+        self.rsi = {}
+        for node in nodes:
+            if node[0] == "rsi":
+                if node[1] != ("column", "close"):
+                    raise ValueError("Only the RSI of the closing price can be streamed in chunks")
+                self.rsi[node[2]] = ChunkedRSI(node[2])
+
+    def update(self, close):
+        close = np.asarray(close, dtype=float)
+        history = np.concatenate((self.tail, close))
+        cache = IndicatorCache(history)
+        for period, state in self.rsi.items():
+            rsi = np.full(len(history), np.nan)
+            rsi[len(self.tail):] = state.update(close)
+            cache.values[("rsi", period)] = rsi
+        buy, sell = self.strategy.signals(cache, **self.params)
+        self.tail = history[-self.tail_size:]
+        return buy[-len(close):], sell[-len(close):]
+
+
+class ChunkedDownsampler:
+    # Keeps the min/max of every bucket of a streamed series for the charts
+    def __init__(self, max_points=DEFAULT_MAX_POINTS):
+        self.max_points = max_points
+        self.index = []
+        self.values = []
+
+    def update(self, index, values):
+        self.index.append(index)
+        self.values.append(values)
+        # Re-reduce once the kept points exceed the budget
+        if sum(len(v) for v in self.values) > 2 * self.max_points:
+            index = np.concatenate(self.index)
+            values = np.concatenate(self.values)
+            keep = minmax_indices(values, self.max_points)
+            self.index, self.values = [index[keep]], [values[keep]]
+
+    def series(self, name="Close"):
+        if not self.values:
+            return pd.Series(dtype=float, name=name)
+        return pd.Series(np.concatenate(self.values), index=np.concatenate(self.index), name=name)
+
+
+def backtest_symbol_chunked(store, symbol, strategy_name, params, investment,
+                            start=None, end=None, interval="1m", chunk_size=ROW_GROUP_SIZE,
+                            max_points=DEFAULT_MAX_POINTS, trade_log=None):
+    # Stream one symbol through signals and trades; appends its orders to
+    # trade_log and returns summary numbers and a downsampled close series
+    signals = ChunkedSignals(strategy_name, params)
+    chart = ChunkedDownsampler(max_points)
+    trade_log = TradeLog() if trade_log is None else trade_log
+    open_trade = None
+    earnings = 0.0
+    buy_count = sell_count = 0
+    bars = 0
+    for chunk in store.iter_chunks(symbol, start, end, interval, chunk_size):
+        close = chunk["Close"].to_numpy(dtype=float)
+        with span("signals", symbol=symbol, bars=len(close)):
+            buy, sell = signals.update(close)
+        with span("trades", symbol=symbol, bars=len(close)):
+            trades = simulate_trades(close, buy, sell, investment, open_trade=open_trade)
+            trade_log.append_trades(symbol, chunk.index, trades)
+        earnings += trades["total_earnings"]
+        buy_count += trades["buy_count"]
+        sell_count += trades["sell_count"]
+        open_trade = trades["open_trade"]
+        chart.update(chunk.index.values, close)
+        bars += len(chunk)
+    return {"earnings": earnings,
+            "buy_count": buy_count,
+            "sell_count": sell_count,
+            "bars": bars,
+            "close": chart.series()}
+
+
+def backtest_chunked(store, symbols, strategy, params=None, capital=10000.0,
+                     start=None, end=None, interval="1m", chunk_size=ROW_GROUP_SIZE,
+                     max_points=DEFAULT_MAX_POINTS, progress=None):
+    # Same result tables as backtest(), computed from streamed chunks. The
+    # per-symbol signal frames are not kept; result.closes holds downsampled
+    # closing prices for the charts instead. progress(symbol, earnings,
+    # error) is called after every symbol
+    name, _ = resolve_strategy(strategy)
+    params = STRATEGY_REGISTRY[name].validate(params)
+    result = BacktestResult(name, params, capital, list(symbols))
+    symbol_investment = capital / len(symbols) if symbols else 0.0
+    result.closes = {}
+
+    trade_log = TradeLog()
+    summary_data = []
+    buy_sell_counts = []
+    for symbol in symbols:
+        logged = len(trade_log)
+        try:
+            with span("symbol", symbol=symbol):
+                outcome = backtest_symbol_chunked(store, symbol, name, params, symbol_investment,
+                                                  start, end, interval, chunk_size, max_points,
+                                                  trade_log)
+        except Exception as e:
+            # Drop whatever the failed symbol logged before the error
+            trade_log.size = logged
+            result.errors[symbol] = str(e)
+        else:
+            if outcome["bars"] == 0:
+                result.errors[symbol] = "No price data available"
+        if progress is not None:
+            progress(symbol, None if symbol in result.errors else outcome["earnings"],
+                     result.errors.get(symbol))
+        if symbol in result.errors:
+            continue
+        result.closes[symbol] = outcome["close"]
+        buy_sell_counts.append({'Symbol': symbol,
+                                'Buy': outcome["buy_count"],
+                                'Sell': outcome["sell_count"]})
+        summary_data.append({'Symbol': symbol,
+                             'Earnings': outcome["earnings"],
+                             'Investment': float(symbol_investment)})
+    with span("aggregate"):
+        return build_tables(result, trade_log, summary_data, buy_sell_counts, start)
+
+
+def long_closes(closes):
+    # {symbol: downsampled close series} -> long frame with a Symbol column
+    frames = [series.to_frame('Close').assign(Symbol=symbol)
+              for symbol, series in closes.items() if len(series)]
+    if not frames:
+        return pd.DataFrame(columns=['Close', 'Symbol'])
+    return pd.concat(frames)
@@ -0,0 +1,148 @@
+import argparse
+import json
+import os
+import sys
+from datetime import datetime, timedelta
+
+from analytics import analyze
+from backtest import backtest
+from chunked import backtest_chunked
+from fetcher import PriceFetcher
+from market_data import load_universe
+from price_store import INTERVALS, PriceStore, parse_symbols
+from profiling import Profiler, span
+from results_store import DEFAULT_RESULTS_DIR, ResultsStore
+from strategies import INVESTMENT_STRATEGIES
+
+# Command-line backtests over ticker files, without starting Streamlit.
+# Example:
+#   python cli.py tickers.txt --strategy "Bollinger Bands" \
+#       --param window=20 --param num_of_std=2 --output results/
+
+
+def read_tickers(path):
+    # Tickers separated by commas and/or new lines; "#" starts a comment
+    with open(path, "r") as f:
+        lines = [line.split("#")[0] for line in f]
+    return parse_symbols(",".join(lines))
+
+
+def parse_param(text):
+    # "window=20" -> ("window", 20)
+    name, _, value = text.partition("=")
+    if not name or not value:
+        raise argparse.ArgumentTypeError(f"Expected NAME=VALUE, got '{text}'")
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return name.strip(), value
+
+
+def report_download(symbol, error):
+    if error is not None:
+        print(f"Download failed for {symbol}: {error}", file=sys.stderr)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Run Technical Analysis Backtester strategies from the command line.")
+    parser.add_argument("ticker_files", nargs="*",
+                        help="Files with tickers separated by commas or new lines.")
+    parser.add_argument("--symbols", default="",
+                        help="Comma separated tickers, in addition to the ticker files.")
+    parser.add_argument("--strategy", default="Moving Average Crossover",
+                        choices=list(INVESTMENT_STRATEGIES))
+    parser.add_argument("--param", action="append", type=parse_param, default=[],
+                        metavar="NAME=VALUE", help="Strategy parameter, can be repeated.")
+    parser.add_argument("--capital", type=float, default=10000.0,
+                        help="Total amount of money to be invested.")
+    parser.add_argument("--start", default=(datetime.now() - timedelta(days=120)).strftime("%Y-%m-%d"))
+    parser.add_argument("--end", default=datetime.now().strftime("%Y-%m-%d"))
+    parser.add_argument("--interval", default="1d", choices=INTERVALS,
+                        help="Bar interval. Intraday bars are streamed through the backtest in chunks.")
+    parser.add_argument("--offline", action="store_true",
+                        help="Use only the prices already in the local price cache.")
+    parser.add_argument("--downloads", type=int, default=8,
+                        help="Concurrent price downloads from the Yahoo Finance chart API "
+                             "(PRICE_SERVER_URL overrides its address). 0 uses a single grouped "
+                             "yfinance download instead.")
+    parser.add_argument("--compact", action="store_true",
+                        help="Hold daily prices as float32 where precision allows, to fit larger universes.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Number of symbols evaluated in parallel.")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process",
+                        help="Run the per-symbol pipeline on a process or a thread pool.")
+    parser.add_argument("--output", default="backtest_results",
+                        help="Directory to write the result tables to.")
+    parser.add_argument("--format", choices=["parquet", "json"], default="parquet")
+    parser.add_argument("--results-store", nargs="?", const=DEFAULT_RESULTS_DIR, metavar="DIRECTORY",
+                        help="Also add the run to the results store (see results_store.py), "
+                             "by default in .results_store/.")
+    parser.add_argument("--profile", metavar="DIRECTORY",
+                        help="Profile the run (timing spans, cProfile and tracemalloc) and write "
+                             "profile.json, a Chrome trace.json and profile.prof to this directory.")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    symbols = parse_symbols(args.symbols)
+    for path in args.ticker_files:
+        symbols += [s for s in read_tickers(path) if s not in symbols]
+    if not symbols:
+        print("No tickers given.", file=sys.stderr)
+        return 2
+
+    profiler = Profiler(cprofile=True, memory=True) if args.profile else None
+    if profiler is not None:
+        profiler.start()
+    fetcher = PriceFetcher(max_concurrency=args.downloads) if args.downloads > 0 else None
+    store = PriceStore(offline=args.offline, fetcher=fetcher)
+    if args.interval == "1d":
+        with span("load prices", symbols=len(symbols)):
+            data = load_universe(symbols, args.start, args.end, args.interval, store=store,
+                                 progress=report_download)
+            if args.compact:
+                data = data.compact()
+        result = backtest(data, args.strategy, dict(args.param), args.capital, start=args.start,
+                          workers=args.workers, executor=args.executor)
+    else:
+        # Long intraday histories are streamed from the price store in chunks
+        if not args.offline:
+            store.update_many(symbols, args.start, args.end, args.interval, report_download)
+        result = backtest_chunked(store, symbols, args.strategy, dict(args.param), args.capital,
+                                  start=args.start, end=args.end, interval=args.interval)
+
+    for symbol, error in result.errors.items():
+        print(f"Error applying strategy '{result.strategy}' to symbol '{symbol}': {error}",
+              file=sys.stderr)
+    with span("save results"):
+        result.save(args.output, args.format)
+        if result.signals:
+            metrics = analyze(result).metrics
+            path = os.path.join(args.output, f"metrics.{args.format}")
+            if args.format == "parquet":
+                metrics.to_parquet(path, index=False)
+            else:
+                metrics.to_json(path, orient="records", indent=2)
+        if args.results_store:
+            run = ResultsStore(args.results_store).save(result, args.start, args.end, args.interval)
+    if profiler is not None:
+        profiler.stop()
+        profiler.save(args.profile)
+        print(profiler.totals().to_string(index=False), file=sys.stderr)
+
+    print(result.summary.to_string(index=False))
+    print(f"Total earnings: {result.total_earnings:,.2f}")
+    print(f"Total returns: {result.total_returns:,.2f}")
+    if result.signals:
+        print(metrics.set_index("Symbol").loc["Portfolio"].to_string())
+    print(f"Results saved to '{os.path.abspath(args.output)}'")
+    if args.results_store:
+        print(f"Stored as run {run} in '{os.path.abspath(args.results_store)}'")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
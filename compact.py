@@ -0,0 +1,164 @@
+import numpy as np
+import pandas as pd
+
+# Compact in-memory layouts for large universes:
+#   - prices as float32 where the round trip keeps enough precision
+#   - integer-coded (categorical) symbols instead of one string per row
+#   - a struct-of-arrays trade log with preallocated, doubling capacity
+
+# Largest relative error accepted when storing a price column as float32
+FLOAT32_TOLERANCE = 1e-6
+
+BUY, SELL = 1, -1
+
+
+def fits_float32(values, tolerance=FLOAT32_TOLERANCE):
+    values = np.asarray(values, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        error = np.abs(values.astype(np.float32).astype(np.float64) - values) / np.abs(values)
+    error = error[np.isfinite(error)]
+    return not len(error) or error.max() <= tolerance
+
+
+def compact_prices(frame, tolerance=FLOAT32_TOLERANCE):
+    # Downcast every float column that survives the float32 round trip;
+    # volumes become integers when they are whole numbers
+    columns = {}
+    for name in frame.columns:
+        values = frame[name].to_numpy()
+        if name == "Volume" and np.issubdtype(values.dtype, np.floating) \
+                and np.all(np.isfinite(values)) and np.all(values == np.round(values)):
+            columns[name] = values.astype(np.int64)
+        elif np.issubdtype(values.dtype, np.floating) and fits_float32(values, tolerance):
+            columns[name] = values.astype(np.float32)
+        else:
+            columns[name] = values
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def compact_long(frames, columns=None):
+    # Long frame of {symbol: frame} with a categorical Symbol column
+    symbols = [symbol for symbol, frame in frames.items() if len(frame)]
+    parts = [frames[s] if columns is None else frames[s][columns] for s in symbols]
+    if not parts:
+        return pd.DataFrame(columns=(columns or []) + ["Symbol"])
+    lengths = [len(part) for part in parts]
+    long = pd.concat(parts)
+    codes = np.repeat(np.arange(len(symbols), dtype=np.int32), lengths)
+    long["Symbol"] = pd.Categorical.from_codes(codes, categories=symbols)
+    return long
+
+
+class TradeLog:
+    # Orders of many symbols as parallel NumPy arrays instead of a list of
+    # dicts. Appends copy whole per-symbol blocks and grow by doubling
+    FIELDS = {"symbol": np.int32, "signal": np.int8, "timestamp": np.int64,
+              "price": np.float64, "amount": np.float64, "earnings": np.float64}
+
+    def __init__(self, capacity=1024):
+        self.size = 0
+        self.symbols = []
+        self.symbol_codes = {}
+        self.tz = None
+        self.arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in self.FIELDS.items()}
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def capacity(self):
+        return len(self.arrays["signal"])
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        if needed <= self.capacity:
+            return
+        capacity = max(self.capacity, 1)
+        while capacity < needed:
+            capacity *= 2
+        for name, array in self.arrays.items():
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.arrays[name] = grown
+
+    def symbol_code(self, symbol):
+        if symbol not in self.symbol_codes:
+            self.symbol_codes[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return self.symbol_codes[symbol]
+
+    def append_trades(self, symbol, index, trades):
+        # Add one symbol's simulate_trades() output, Buy/Sell interleaved in
+        # bar order. A position carried in from an earlier chunk only adds its Sell
+        index = pd.DatetimeIndex(index)
+        if index.tz is not None:
+            self.tz = index.tz
+            index = index.tz_convert("UTC").tz_localize(None)
+        timestamps = index.asi8
+
+        entry_index = trades["entry_index"]
+        n_closed = trades["sell_count"]
+        has_entry = entry_index >= 0
+        trade_number = np.arange(len(entry_index))
+        exit_index = trades["exit_index"][:n_closed]
+
+        # Order key: trade i's Buy sorts as 2i, its Sell as 2i + 1
+        order = np.argsort(np.concatenate((2 * trade_number[has_entry],
+                                           2 * trade_number[:n_closed] + 1)), kind="stable")
+        block = {
+            "signal": np.concatenate((np.full(has_entry.sum(), BUY), np.full(n_closed, SELL))),
+            "timestamp": np.concatenate((timestamps[entry_index[has_entry]], timestamps[exit_index])),
+            "price": np.concatenate((trades["entry_price"][has_entry], trades["exit_price"][:n_closed])),
+            "amount": np.concatenate((trades["entry_amount"][has_entry], trades["exit_amount"][:n_closed])),
+            "earnings": np.concatenate((np.full(has_entry.sum(), np.nan), trades["earnings"][:n_closed])),
+        }
+        n = len(order)
+        self._reserve(n)
+        self.arrays["symbol"][self.size:self.size + n] = self.symbol_code(symbol)
+        for name, values in block.items():
+            self.arrays[name][self.size:self.size + n] = values[order]
+        self.size += n
+
+    def to_frame(self):
+        # Orders table with categorical Symbol and Signal columns
+        a = {name: array[:self.size] for name, array in self.arrays.items()}
+        timestamps = pd.to_datetime(a["timestamp"])
+        if self.tz is not None:
+            timestamps = timestamps.tz_localize("UTC").tz_convert(self.tz)
+        return pd.DataFrame({
+            "Symbol": pd.Categorical.from_codes(a["symbol"], categories=self.symbols or ["_"]),
+            "Signal": pd.Categorical.from_codes((a["signal"] == SELL).astype(np.int8),
+                                                categories=["Buy", "Sell"]),
+            "Timestamp": timestamps,
+            "Price": a["price"],
+            "Amount": a["amount"],
+            "Earnings": a["earnings"],
+        })
+
+
+def memory_per_million_bars(frames):
+    # Bytes per million bars of a {symbol: frame} universe, as stored now and
+    # in the compact layout, including one set of Buy/Sell signals (one byte
+    # per bar each in both layouts, as the strategies produce them)
+    bars = sum(len(frame) for frame in frames.values())
+    if not bars:
+        return {"bars": 0}
+    standard = compact_bytes = 0
+    for frame in frames.values():
+        # Standard layout: frame + object Symbol column + bool Buy/Sell columns
+        standard += int(frame.memory_usage(index=True, deep=True).sum())
+        standard += int(pd.Series(["SYMBOL"] * len(frame)).memory_usage(index=False, deep=True))
+        standard += 2 * len(frame)
+        small = compact_prices(frame)
+        compact_bytes += int(small.memory_usage(index=True, deep=True).sum())
+        compact_bytes += 4 * len(frame)  # int32 symbol code
+        compact_bytes += 2 * len(frame)
+    scale = 1_000_000 / bars
+    return {"bars": bars,
+            "standard_mb_per_million_bars": standard * scale / 1024 ** 2,
+            "compact_mb_per_million_bars": compact_bytes * scale / 1024 ** 2,
+            "ratio": standard / compact_bytes}
@@ -0,0 +1,281 @@
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from strategies import Parameter
+
+# Cross-sectional strategies rank every ticker against the others instead of
+# looking at one ticker's Close in isolation, e.g. "hold the 10 tickers with
+# the best 6 month momentum, rebalanced weekly". Everything runs on one
+# aligned dates x symbols price matrix:
+#   - a strategy turns the matrix into a score matrix of the same shape
+#   - rank, z-score and top-N selection work on whole rows at once
+#   - holdings change only on rebalance bars; in between the portfolio is
+#     bought and held, so each holding period is valued with one gather of
+#     its entry prices and the equity curve needs no loop over the bars
+# Scores use the prices up to the rebalance bar's close and the portfolio is
+# traded at that close, like the signals of the single-ticker backtest.
+
+# Rebalance on the last bar of every period
+REBALANCE_FREQUENCIES = {"daily": None, "weekly": "W", "monthly": "M", "quarterly": "Q"}
+
+WEIGHTINGS = ["equal", "rank"]
+
+
+def price_matrix(data, field="Close"):
+    # data: Universe or {symbol: OHLCV DataFrame} -> dates x symbols frame on
+    # the union of all dates. Gaps are forward filled; dates before a
+    # ticker's first bar stay NaN
+    columns = {symbol: frame[field] for symbol, frame in data.items() if len(frame)}
+    if not columns:
+        return pd.DataFrame()
+    matrix = pd.concat(columns, axis=1).sort_index()
+    return matrix[~matrix.index.duplicated(keep="last")].ffill().astype(float)
+
+
+def _lagged(prices, periods):
+    # prices shifted down by periods rows
+    lagged = np.full_like(prices, np.nan)
+    if periods < len(prices):
+        lagged[periods:] = prices[:len(prices) - periods]
+    return lagged
+
+
+def trailing_return(prices, lookback, skip=0):
+    # Return from lookback bars ago to skip bars ago
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return _lagged(prices, skip) / _lagged(prices, lookback) - 1
+
+
+def trailing_volatility(prices, window):
+    # Standard deviation of the bar returns over the last window bars
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns = prices[1:] / prices[:-1] - 1
+    returns = np.vstack((np.full((1, prices.shape[1]), np.nan), returns))
+    return pd.DataFrame(returns).rolling(window).std().to_numpy()
+
+
+def cross_sectional_rank(scores):
+    # Percentile rank of every score within its row, in (0, 1]; NaN scores
+    # are not ranked. Ties are ranked in column order
+    valid = np.isfinite(scores)
+    order = np.argsort(np.where(valid, scores, np.inf), axis=1, kind="stable")
+    ranks = np.empty(scores.shape)
+    np.put_along_axis(ranks, order, np.arange(1, scores.shape[1] + 1, dtype=float)[None, :], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ranks /= valid.sum(axis=1, keepdims=True)
+    return np.where(valid, ranks, np.nan)
+
+
+def cross_sectional_zscore(scores):
+    # (score - row mean) / row standard deviation, ignoring NaN scores
+    valid = np.isfinite(scores)
+    count = valid.sum(axis=1, keepdims=True)
+    values = np.where(valid, scores, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = values.sum(axis=1, keepdims=True) / count
+        deviation = np.where(valid, scores - mean, 0.0)
+        std = np.sqrt((deviation ** 2).sum(axis=1, keepdims=True) / count)
+        return np.where(valid & (std > 0), deviation / std, np.nan)
+
+
+def top_n(scores, n):
+    # Boolean mask of the n highest scores of every row (fewer when a row has
+    # fewer valid scores)
+    n = max(0, min(int(n), scores.shape[1]))
+    valid = np.isfinite(scores)
+    mask = np.zeros(scores.shape, dtype=bool)
+    if n == 0:
+        return mask
+    best = np.argpartition(np.where(valid, -scores, np.inf), n - 1, axis=1)[:, :n]
+    np.put_along_axis(mask, best, True, axis=1)
+    return mask & valid
+
+
+def target_weights(scores, n, weighting="equal"):
+    # Portfolio weights of the top n tickers of every row; rows with no
+    # valid score stay in cash
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"Unknown weighting '{weighting}', expected one of {', '.join(WEIGHTINGS)}")
+    selected = top_n(scores, n)
+    if weighting == "rank":
+        weights = np.where(selected, cross_sectional_rank(scores), 0.0)
+    else:
+        weights = selected.astype(float)
+    totals = weights.sum(axis=1, keepdims=True)
+    return np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+
+
+def rebalance_bars(index, frequency="weekly"):
+    # Positions of the last bar of every period; the final bar is left out as
+    # nothing could be held after it
+    if frequency not in REBALANCE_FREQUENCIES:
+        raise ValueError(f"Unknown rebalance frequency '{frequency}', expected one of "
+                         + ", ".join(REBALANCE_FREQUENCIES))
+    index = pd.DatetimeIndex(index)
+    if REBALANCE_FREQUENCIES[frequency] is None:
+        return np.arange(len(index) - 1)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    periods = index.to_period(REBALANCE_FREQUENCIES[frequency]).asi8
+    return np.flatnonzero(periods[:-1] != periods[1:])
+
+
+def simulate_rebalancing(prices, weights, rebalance, capital=10000.0, commission=0.0):
+    # prices: bars x symbols (forward filled), weights: one row of target
+    # weights per rebalance bar, rebalance: sorted bar positions. commission
+    # is a fraction of the traded value. Returns (equity, cash) per bar and
+    # the turnover (traded value / equity) of every rebalance
+    n_bars = len(prices)
+    if not len(rebalance):
+        flat = np.full(n_bars, float(capital))
+        return flat, flat.copy(), np.zeros(0)
+    entry = prices[rebalance]
+    # Every holding runs to the next rebalance, the last one to the final bar
+    ends = np.append(rebalance[1:], n_bars - 1)
+    cash_weight = 1 - weights.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        held = np.where(weights > 0, weights * prices[ends] / entry, 0.0)
+    growth = held.sum(axis=1) + cash_weight
+    # Weights just before the next rebalance, after prices moved
+    drifted = np.divide(held, growth[:, None], out=np.zeros_like(held), where=growth[:, None] > 0)
+    previous = np.vstack((np.zeros((1, weights.shape[1])), drifted[:-1]))
+    turnover = np.abs(weights - previous).sum(axis=1)
+    cost = 1 - commission * turnover
+    # Equity right after each rebalance, costs paid
+    start_equity = capital * np.cumprod(cost) * np.concatenate(([1.0], np.cumprod(growth[:-1])))
+
+    # Value of every bar within its holding period
+    period = np.searchsorted(rebalance, np.arange(n_bars), side="right") - 1
+    inside = period >= 0
+    k = period[inside]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        relative = prices[inside] / entry[k]
+    holdings = np.where(weights[k] > 0, weights[k] * relative, 0.0).sum(axis=1)
+    equity = np.full(n_bars, float(capital))
+    cash = equity.copy()
+    equity[inside] = start_equity[k] * (holdings + cash_weight[k])
+    cash[inside] = start_equity[k] * cash_weight[k]
+    return equity, cash, turnover
+
+
+class RankingStrategy:
+    # score(prices, **params) -> score matrix of the same shape, higher is
+    # better; parameters use the schema of strategies.Parameter
+    def __init__(self, name, score, parameters, description=""):
+        self.name = name
+        self.score = score
+        self.parameters = OrderedDict(parameters)
+        self.description = description
+
+    def defaults(self):
+        return {name: parameter.default for name, parameter in self.parameters.items()}
+
+    def validate(self, params=None):
+        params = dict(self.defaults(), **(params or {}))
+        unknown = set(params) - set(self.parameters)
+        if unknown:
+            raise ValueError(f"Unknown parameters for '{self.name}': " + ", ".join(sorted(unknown)))
+        return {name: self.parameters[name].validate(name, value) for name, value in params.items()}
+
+    def scores(self, prices, **params):
+        return self.score(np.asarray(prices, dtype=float), **self.validate(params))
+
+
+CROSS_SECTIONAL_STRATEGIES = OrderedDict()
+
+
+def register_ranking_strategy(strategy):
+    CROSS_SECTIONAL_STRATEGIES[strategy.name] = strategy
+    return strategy
+
+
+register_ranking_strategy(RankingStrategy(
+    "Cross-Sectional Momentum",
+    lambda prices, lookback, skip: trailing_return(prices, lookback, skip),
+    parameters={
+        "lookback": Parameter(int, 126, minimum=2, label="Momentum lookback:",
+                              help="Bars over which the trailing return is measured."),
+        "skip": Parameter(int, 0, minimum=0, label="Skip most recent bars:",
+                          help="Leave out the last bars, e.g. 21 to skip the short-term reversal month."),
+    },
+    description="Hold the tickers with the highest trailing return."))
+
+register_ranking_strategy(RankingStrategy(
+    "Short-Term Reversal",
+    lambda prices, lookback: -trailing_return(prices, lookback),
+    parameters={
+        "lookback": Parameter(int, 5, minimum=1, label="Reversal lookback:",
+                              help="Bars over which the losers are measured."),
+    },
+    description="Hold the tickers that fell the most over the last few bars."))
+
+register_ranking_strategy(RankingStrategy(
+    "Low Volatility",
+    lambda prices, window: -trailing_volatility(prices, window),
+    parameters={
+        "window": Parameter(int, 63, minimum=2, label="Volatility window:",
+                            help="Bars of returns in the volatility estimate."),
+    },
+    description="Hold the tickers with the calmest recent returns."))
+
+register_ranking_strategy(RankingStrategy(
+    "Momentum / Low Volatility",
+    lambda prices, lookback, window: cross_sectional_zscore(trailing_return(prices, lookback))
+    - cross_sectional_zscore(trailing_volatility(prices, window)),
+    parameters={
+        "lookback": Parameter(int, 126, minimum=2, label="Momentum lookback:",
+                              help="Bars over which the trailing return is measured."),
+        "window": Parameter(int, 63, minimum=2, label="Volatility window:",
+                            help="Bars of returns in the volatility estimate."),
+    },
+    description="Z-scored momentum minus z-scored volatility."))
+
+
+class RebalanceResult:
+    def __init__(self, capital, equity, weights, turnover):
+        self.capital = capital
+        # Cash, Holdings and Equity on every bar
+        self.equity = equity
+        # Target weights (rebalance dates x symbols)
+        self.weights = weights
+        # Traded value / equity of every rebalance
+        self.turnover = turnover
+
+    @property
+    def final_equity(self):
+        return float(self.equity['Equity'].iloc[-1]) if len(self.equity) else self.capital
+
+    @property
+    def total_return(self):
+        # In percent of the starting capital
+        return (self.final_equity - self.capital) / self.capital * 100 if self.capital else 0.0
+
+    def holdings(self):
+        # Tickers held after every rebalance, best weight first
+        rows = [", ".join(row[row > 0].sort_values(ascending=False).index)
+                for _, row in self.weights.iterrows()]
+        return pd.DataFrame({"Holdings": rows, "Turnover": self.turnover.to_numpy()},
+                            index=self.weights.index)
+
+
+def rank_backtest(data, strategy_name, params=None, capital=10000.0, top=10, frequency="weekly",
+                  weighting="equal", commission=0.0):
+    # Hold the top tickers of a cross-sectional strategy, rebalanced on the
+    # last bar of every period. data: Universe or {symbol: OHLCV DataFrame}
+    strategy = CROSS_SECTIONAL_STRATEGIES[strategy_name]
+    matrix = price_matrix(data)
+    prices = matrix.to_numpy()
+    rebalance = rebalance_bars(matrix.index, frequency)
+    scores = strategy.scores(prices, **(params or {}))[rebalance]
+    # Only tickers with a price on the rebalance bar can be bought
+    scores[~np.isfinite(prices[rebalance])] = np.nan
+    weights = target_weights(scores, top, weighting)
+    equity, cash, turnover = simulate_rebalancing(prices, weights, rebalance, capital, commission)
+    dates = matrix.index[rebalance]
+    return RebalanceResult(
+        capital,
+        pd.DataFrame({"Cash": cash, "Holdings": equity - cash, "Equity": equity}, index=matrix.index),
+        pd.DataFrame(weights, index=dates, columns=matrix.columns),
+        pd.Series(turnover, index=dates, name="Turnover"))
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+# Shape-preserving downsampling of long series to roughly screen resolution,
+# without any plotting dependency. LTTB (Largest-Triangle-Three-Buckets) keeps
+# the points that span the largest triangles, min/max keeps the extremes of
+# every bucket.
+
+DEFAULT_MAX_POINTS = 1500
+
+
+def as_float(x):
+    x = np.asarray(x)
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(float)
+    return x.astype(float)
+
+
+def lttb_indices(x, y, max_points):
+    # Indices of the points LTTB keeps, always including the first and last
+    x, y = as_float(x), np.asarray(y, dtype=float)
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (max_points - 2)
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(max_points - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        # The next bucket's average is the third corner of the triangle
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+
+def minmax_indices(y, max_points):
+    # Indices of the minimum and maximum of every bucket, in order
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if max_points >= n or max_points < 4:
+        return np.arange(n)
+    buckets = max_points // 2
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    valid = ~np.all(np.isnan(padded), axis=1)
+    offsets = np.arange(buckets)[valid] * size
+    lows = offsets + np.nanargmin(padded[valid], axis=1)
+    highs = offsets + np.nanargmax(padded[valid], axis=1)
+    return np.unique(np.concatenate(([0, n - 1], lows, highs)))
+
+
+def downsample(frame, x, y, max_points=DEFAULT_MAX_POINTS, method="lttb", group=None):
+    # Downsample a long frame per group (e.g. per Symbol); x may be "index"
+    if group is not None:
+        parts = [downsample(part, x, y, max_points, method)
+                 for _, part in frame.groupby(group, sort=False)]
+        return pd.concat(parts) if parts else frame
+    frame = frame[frame[y].notna()]
+    if len(frame) <= max_points:
+        return frame
+    x_values = frame.index.values if x == "index" else frame[x].values
+    if method == "minmax":
+        keep = minmax_indices(frame[y].values, max_points)
+    else:
+        keep = lttb_indices(x_values, frame[y].values, max_points)
+    return frame.iloc[keep]
+
+
+def ols_trendline(x, y):
+    # Closed-form least-squares line; returns (slope, intercept) in x units
+    x, y = as_float(x), np.asarray(y, dtype=float)
+    mask = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[mask], y[mask]
+    if len(x) < 2:
+        return 0.0, (float(y[0]) if len(y) else 0.0)
+    x_mean, y_mean = x.mean(), y.mean()
+    variance = ((x - x_mean) ** 2).sum()
+    slope = ((x - x_mean) * (y - y_mean)).sum() / variance if variance else 0.0
+    return slope, y_mean - slope * x_mean
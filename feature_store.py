@@ -0,0 +1,191 @@
+import hashlib
+import os
+import shutil
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+# Process-wide store of precomputed indicator columns (SMA, rolling standard
+# deviation, RSI), shared by every Streamlit session, backtest and sweep in
+# the server process:
+#   - entries are keyed by (symbol, price fingerprint, indicator key), where
+#     the fingerprint is a hash of the closing prices. New or changed bars
+#     give a new fingerprint, so stale indicators are never served; each
+#     symbol keeps the columns of its latest few price versions
+#   - columns are handed out read-only and without copying
+#   - a column is computed on the first miss only: concurrent requests for
+#     it wait for that computation instead of repeating it
+#   - with a root directory, columns are also written as .npy files and read
+#     back memory-mapped, so worker processes and later server processes
+#     share them through the page cache
+# IndicatorCache(close, features=store.view(symbol, close)) reads through it.
+
+DEFAULT_FEATURE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".feature_cache")
+
+DEFAULT_MAX_BYTES = 512 * 1024 ** 2
+
+
+def close_fingerprint(close):
+    return hashlib.sha1(np.ascontiguousarray(close, dtype=float).tobytes()).hexdigest()[:20]
+
+
+def feature_name(key):
+    # ("sma", 20) -> "sma_20"
+    return "_".join(str(part) for part in key)
+
+
+class FeatureView:
+    # The store as seen by one symbol's price version
+    def __init__(self, store, symbol, fingerprint):
+        self.store = store
+        self.symbol = symbol
+        self.fingerprint = fingerprint
+
+    def get(self, key, compute):
+        return self.store.get(self.symbol, self.fingerprint, key, compute)
+
+
+class FeatureStore:
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES, versions=4):
+        self.root = root
+        self.max_bytes = max_bytes
+        # Price versions kept per symbol
+        self.versions = versions
+        # (symbol, fingerprint) -> {feature name: read-only array}, in LRU order
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._pending = {}
+
+    def __reduce__(self):
+        # Worker processes attach to their own process-wide store
+        return feature_store, (self.root, self.max_bytes, self.versions)
+
+    def view(self, symbol, close):
+        return FeatureView(self, symbol, close_fingerprint(close))
+
+    def get(self, symbol, fingerprint, key, compute):
+        entry = (symbol, fingerprint)
+        name = feature_name(key)
+        while True:
+            with self.lock:
+                columns = self.entries.get(entry)
+                if columns is not None and name in columns:
+                    self.entries.move_to_end(entry)
+                    self.hits += 1
+                    return columns[name]
+                pending = self._pending.get((entry, name))
+                owner = pending is None
+                if owner:
+                    pending = self._pending[(entry, name)] = threading.Event()
+            if not owner:
+                # Someone else is computing it; look again once they are done
+                pending.wait()
+                continue
+            try:
+                value = self._load(entry, name)
+                loaded = value is not None
+                if not loaded:
+                    value = self._save(entry, name, compute())
+                with self.lock:
+                    self.disk_hits += loaded
+                    self._insert(entry, name, value)
+                return value
+            finally:
+                with self.lock:
+                    del self._pending[(entry, name)]
+                pending.set()
+
+    def _directory(self, entry):
+        symbol, fingerprint = entry
+        return os.path.join(self.root, symbol.replace(os.sep, "_"), fingerprint)
+
+    def _load(self, entry, name):
+        if self.root is None:
+            return None
+        path = os.path.join(self._directory(entry), name + ".npy")
+        if not os.path.exists(path):
+            return None
+        return np.load(path, mmap_mode="r")
+
+    def _save(self, entry, name, value):
+        with self.lock:
+            self.misses += 1
+        value = np.array(value, dtype=float)
+        if self.root is None:
+            value.setflags(write=False)
+            return value
+        directory = self._directory(entry)
+        path = os.path.join(directory, name + ".npy")
+        # Unique temporary name, as other processes may write the same column
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, exist_ok=True)
+                self._prune_disk(os.path.dirname(directory))
+            with open(temporary, "wb") as f:
+                np.save(f, value)
+            os.replace(temporary, path)
+            return np.load(path, mmap_mode="r")
+        except OSError:
+            # Another process pruned the directory or the disk is full: keep
+            # the column in memory only
+            value.setflags(write=False)
+            return value
+
+    def _prune_disk(self, symbol_directory):
+        # Drop the oldest price versions of a symbol beyond self.versions
+        versions = sorted((os.path.join(symbol_directory, name) for name in os.listdir(symbol_directory)),
+                          key=os.path.getmtime)
+        for directory in versions[:-self.versions]:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def _insert(self, entry, name, value):
+        # Caller holds the lock
+        columns = self.entries.setdefault(entry, {})
+        if name not in columns:
+            columns[name] = value
+            self.bytes += value.nbytes
+        self.entries.move_to_end(entry)
+        versions = [key for key in self.entries if key[0] == entry[0]]
+        for key in versions[:-self.versions]:
+            self._drop(key)
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            self._drop(next(iter(self.entries)))
+
+    def _drop(self, entry):
+        columns = self.entries.pop(entry)
+        self.bytes -= sum(value.nbytes for value in columns.values())
+
+    def invalidate(self, symbol=None):
+        # Forget the columns of one symbol, or of every symbol
+        with self.lock:
+            for entry in [key for key in self.entries if symbol is None or key[0] == symbol]:
+                self._drop(entry)
+        if self.root is not None:
+            target = self.root if symbol is None else os.path.join(self.root, symbol.replace(os.sep, "_"))
+            shutil.rmtree(target, ignore_errors=True)
+
+    def stats(self):
+        with self.lock:
+            return {"symbols": len({symbol for symbol, _ in self.entries}),
+                    "columns": sum(len(columns) for columns in self.entries.values()),
+                    "bytes": self.bytes, "hits": self.hits, "disk_hits": self.disk_hits,
+                    "misses": self.misses}
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def feature_store(root=None, max_bytes=DEFAULT_MAX_BYTES, versions=4):
+    # The process-wide store of a directory (None keeps it in memory only)
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = FeatureStore(root, max_bytes, versions)
+        return _stores[root]
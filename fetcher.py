@@ -0,0 +1,290 @@
+import argparse
+import json
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from tenacity import Retrying, retry_if_exception_type, stop_after_attempt, wait_exponential, wait_random
+
+from price_store import PRICE_COLUMNS
+
+# Concurrent price downloads from the Yahoo Finance chart API:
+#   - symbols (and date windows) are fetched on a thread pool whose size is
+#     the concurrency limit, and handed back as soon as each one completes,
+#     so one slow or failing ticker doesn't hold up the others
+#   - one requests.Session with a connection pool of the same size keeps the
+#     HTTP connections open between requests
+#   - timeouts, connection errors, HTTP 429 and 5xx answers are retried with
+#     exponential backoff (tenacity); other errors fail that symbol only
+# StubPriceServer answers the same requests with synthetic bars, for offline
+# testing:  python fetcher.py --serve --port 8765  and then point the fetcher
+# at it with PRICE_SERVER_URL=http://127.0.0.1:8765/v8/finance/chart/
+
+YAHOO_CHART_URL = "https://query2.finance.yahoo.com/v8/finance/chart/"
+USER_AGENT = "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/112.0 Safari/537.36"
+EXCHANGE_TIMEZONE = "America/New_York"
+
+
+class FetchError(Exception):
+    pass
+
+
+class TransientFetchError(FetchError):
+    # Worth retrying: timeouts, dropped connections, throttling, server errors
+    pass
+
+
+def _epoch(value):
+    return int(pd.Timestamp(value).timestamp())
+
+
+def parse_chart(result, interval="1d"):
+    # One "result" entry of a chart response -> OHLCV frame like yfinance's:
+    # tz-naive dates for daily bars, exchange-time timestamps for intraday bars
+    timestamps = result.get("timestamp") or []
+    quote_ = (result.get("indicators", {}).get("quote") or [{}])[0]
+    if not timestamps:
+        return pd.DataFrame(columns=PRICE_COLUMNS, dtype=float)
+    timezone = result.get("meta", {}).get("exchangeTimezoneName", EXCHANGE_TIMEZONE)
+    index = pd.to_datetime(timestamps, unit="s", utc=True).tz_convert(timezone)
+    if interval == "1d":
+        index = index.tz_localize(None).normalize().rename("Date")
+    else:
+        index = index.rename("Datetime")
+    columns = {name.capitalize(): quote_.get(name) for name in ["open", "high", "low", "close", "volume"]}
+    adjclose = result.get("indicators", {}).get("adjclose")
+    columns["Adj Close"] = adjclose[0]["adjclose"] if adjclose else columns["Close"]
+    frame = pd.DataFrame({name: np.asarray([np.nan if v is None else v for v in values or []], dtype=float)
+                          for name, values in columns.items()}, index=index)[PRICE_COLUMNS]
+    # Yahoo sends null rows for bars without trades
+    frame = frame.dropna(how="all")
+    return frame[~frame.index.duplicated(keep="last")]
+
+
+class PriceFetcher:
+    def __init__(self, base_url=None, max_concurrency=8, timeout=10.0, attempts=4, backoff=0.5,
+                 session=None):
+        self.base_url = base_url or os.environ.get("PRICE_SERVER_URL", YAHOO_CHART_URL)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.timeout = timeout
+        self.attempts = attempts
+        self.backoff = backoff
+        # Latest error per symbol, for reporting
+        self.errors = {}
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = USER_AGENT
+        self.session = session
+
+    def close(self):
+        self.session.close()
+
+    def _get_once(self, symbol, start, end, interval):
+        params = {"period1": _epoch(start), "period2": _epoch(end), "interval": interval,
+                  "includePrePost": "false", "events": "div,splits",
+                  "includeAdjustedClose": "true"}
+        try:
+            response = self.session.get(self.base_url + quote(symbol, safe=""), params=params,
+                                        timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise TransientFetchError(f"{symbol}: {e}") from None
+        if response.status_code == 429 or response.status_code >= 500:
+            raise TransientFetchError(f"{symbol}: HTTP {response.status_code}")
+        try:
+            chart = response.json()["chart"]
+        except (ValueError, KeyError):
+            raise FetchError(f"{symbol}: HTTP {response.status_code}, unexpected response") from None
+        if chart.get("error"):
+            raise FetchError(f"{symbol}: {chart['error'].get('description') or chart['error']}")
+        if response.status_code != 200 or not chart.get("result"):
+            raise FetchError(f"{symbol}: HTTP {response.status_code}, no data")
+        return parse_chart(chart["result"][0], interval)
+
+    def fetch(self, symbol, start, end, interval="1d"):
+        # Bars of one symbol in [start, end), retried with exponential backoff
+        retrying = Retrying(stop=stop_after_attempt(self.attempts),
+                            wait=wait_exponential(multiplier=self.backoff, max=30)
+                            + wait_random(0, self.backoff),
+                            retry=retry_if_exception_type(TransientFetchError),
+                            reraise=True)
+        return retrying(self._get_once, symbol, start, end, interval)
+
+    def iter_requests(self, requests_):
+        # requests_: [(key, symbol, start, end, interval)]. Yields
+        # (key, frame, error message) in completion order
+        if not requests_:
+            return
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(requests_))) as pool:
+            futures = {pool.submit(self.fetch, symbol, start, end, interval): (key, symbol)
+                       for key, symbol, start, end, interval in requests_}
+            for future in as_completed(futures):
+                key, symbol = futures[future]
+                try:
+                    yield key, future.result(), None
+                except Exception as e:
+                    self.errors[symbol] = str(e)
+                    yield key, None, str(e)
+
+    def iter_fetch(self, symbols, start, end, interval="1d"):
+        # (symbol, frame, error message) as each symbol completes
+        return self.iter_requests([(symbol, symbol, start, end, interval) for symbol in symbols])
+
+    def download(self, symbols, start, end, interval="1d"):
+        # Same contract as price_store.download_prices: failed symbols are
+        # left out, so the price store retries them on the next lookup
+        return {symbol: frame for symbol, frame, error in self.iter_fetch(symbols, start, end, interval)
+                if error is None}
+
+
+# Synthetic bars served by the stub, generated once per symbol
+_STUB_HISTORY_START = "2000-01-03"
+_STUB_HISTORY_YEARS = 35
+
+
+def _stub_bars(symbol, start, end, interval):
+    from synthetic_data import synthetic_ohlcv
+    seed = zlib.crc32(symbol.encode())
+    if interval == "1d":
+        bars = _stub_daily.get(symbol)
+        if bars is None:
+            bars = synthetic_ohlcv(1, _STUB_HISTORY_YEARS, "1d", _STUB_HISTORY_START, seed=seed)["SYN000"]
+            # Daily bars are stamped at the 09:30 open, like Yahoo's
+            bars.index = (bars.index + pd.Timedelta("9h30min")).tz_localize(EXCHANGE_TIMEZONE)
+            _stub_daily[symbol] = bars
+    else:
+        first = pd.Timestamp(start, unit="s", tz="UTC").tz_convert(EXCHANGE_TIMEZONE).normalize()
+        days = max(1, len(pd.bdate_range(first.tz_localize(None), periods=None,
+                                         end=pd.Timestamp(end, unit="s"))))
+        bars = synthetic_ohlcv(1, days / 252, interval, first.tz_localize(None),
+                               seed=seed ^ int(first.timestamp()))["SYN000"]
+        bars.index = bars.index.tz_localize(EXCHANGE_TIMEZONE)
+    epochs = bars.index.asi8 // 10 ** 9
+    return bars[(epochs >= start) & (epochs < end)]
+
+
+_stub_daily = {}
+
+
+def chart_payload(symbol, bars, interval):
+    # Chart API response body for a frame of bars
+    return {"chart": {"result": [{
+        "meta": {"symbol": symbol, "exchangeTimezoneName": EXCHANGE_TIMEZONE,
+                 "dataGranularity": interval, "currency": "USD"},
+        "timestamp": (bars.index.asi8 // 10 ** 9).tolist(),
+        "indicators": {
+            "quote": [{name.lower(): bars[name].round(6).tolist()
+                       for name in ["Open", "High", "Low", "Close", "Volume"]}],
+            "adjclose": [{"adjclose": bars["Adj Close"].round(6).tolist()}],
+        }}], "error": None}}
+
+
+class StubPriceServer:
+    # Local HTTP server speaking the chart API with synthetic bars.
+    #   delay     seconds to wait before every answer
+    #   failures  {symbol: n} answers HTTP 503 to the first n requests
+    #   unknown   symbols answered with 404 "No data found"
+    def __init__(self, host="127.0.0.1", port=0, delay=0.0, failures=None, unknown=()):
+        self.delay = delay
+        self.failures = dict(failures or {})
+        self.unknown = set(unknown)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v8/finance/chart/"
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                symbol = unquote(url.path.rsplit("/", 1)[-1])
+                query = {k: v[0] for k, v in parse_qs(url.query).items()}
+                with stub._lock:
+                    stub.requests += 1
+                    failing = stub.failures.get(symbol, 0) > 0
+                    if failing:
+                        stub.failures[symbol] -= 1
+                if stub.delay:
+                    time.sleep(stub.delay)
+                if failing:
+                    return self._send(503, {"chart": {"result": None, "error": {
+                        "code": "Service Unavailable", "description": "Try again later"}}})
+                if symbol in stub.unknown:
+                    return self._send(404, {"chart": {"result": None, "error": {
+                        "code": "Not Found", "description": "No data found, symbol may be delisted"}}})
+                interval = query.get("interval", "1d")
+                bars = _stub_bars(symbol, int(query["period1"]), int(query["period2"]), interval)
+                self._send(200, chart_payload(symbol, bars, interval))
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local stub of the Yahoo Finance chart API.")
+    parser.add_argument("--serve", action="store_true", help="Start the stub price server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds to wait before every answer.")
+    args = parser.parse_args(argv)
+    if not args.serve:
+        parser.print_help()
+        return 0
+    stub = StubPriceServer(args.host, args.port, delay=args.delay)
+    print(f"Serving synthetic prices on {stub.url} (PRICE_SERVER_URL), Ctrl-C to stop")
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
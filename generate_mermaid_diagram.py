@@ -1,62 +1,424 @@
+import argparse
+import ast
+import hashlib
+import json
 import os
 import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 
-def generate_mermaid_diagram(root_dir):
-    mermaid_diagram = "graph TD\n"
-    ignore_dirs = ["venv", "__pycache__", ".vscode", ".git"]
-    subgraphs = {}
+# Mermaid graph of a Python tree: one subgraph per module with its classes
+# (methods and attributes) and module-level functions, call edges between
+# them and dotted import edges between the modules.
+#   - every file is parsed with the ast module, so nothing is guessed from
+#     indentation or regular expressions
+#   - the facts of every file (definitions, raw call names, imports) are
+#     cached in a JSON file keyed by mtime and size, with a content hash as
+#     a fallback, so only changed files are parsed again
+#   - files that do need parsing are spread over a process pool
+#   - names are resolved to definitions when the graph is assembled, since
+#     that depends on the other modules, which is cheap compared to parsing
+#   - the assembled diagram is kept next to the cache with a signature of
+#     every file's mtime and size, so an unchanged tree is only scanned
+# Example:
+#   python generate_mermaid_diagram.py . --output mermaid_diagram.mmd
+
+IGNORE_DIRS = {"venv", "__pycache__", "node_modules", "build", "dist"}
+
+CACHE_FILE = ".mermaid_cache.json"
+
+# Bumped whenever the cached facts change shape
+CACHE_VERSION = 1
+
+# Below this many files to parse, a process pool costs more than it saves
+POOL_THRESHOLD = 32
+
+
+def _dotted(node):
+    # "a.b.c" for Name/Attribute chains, None for anything else (calls on
+    # call results, subscripts...)
+    parts = []
+    while isinstance(node, ast.Attribute):
+        parts.append(node.attr)
+        node = node.value
+    if not isinstance(node, ast.Name):
+        return None
+    parts.append(node.id)
+    return ".".join(reversed(parts))
+
+
+def _calls(body):
+    # Sorted dotted names called anywhere in these statements, including
+    # nested functions and lambdas
+    names = set()
+    for statement in body:
+        for node in ast.walk(statement):
+            if isinstance(node, ast.Call):
+                name = _dotted(node.func)
+                if name is not None:
+                    names.add(name)
+    return sorted(names)
+
+
+def _imports(tree, module, is_package):
+    # Local name -> ["module", target] or ["name", module, name] for every
+    # import of the file, relative imports resolved against its package
+    package = module.split(".") if is_package else module.split(".")[:-1]
+    imports = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    imports[alias.asname] = ["module", alias.name]
+                else:
+                    # "import a.b" binds a
+                    top = alias.name.split(".")[0]
+                    imports[top] = ["module", top]
+                    imports[alias.name] = ["module", alias.name]
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                parent = package[:len(package) - node.level + 1] if node.level > 1 else package
+                base = ".".join(parent + ([base] if base else []))
+            for alias in node.names:
+                if alias.name != "*":
+                    imports[alias.asname or alias.name] = ["name", base, alias.name]
+    return imports
+
+
+def _attributes(body):
+    # Names assigned as self.<name> in the methods of a class
+    names = set()
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for child in ast.walk(node):
+                targets = []
+                if isinstance(child, ast.Assign):
+                    targets = child.targets
+                elif isinstance(child, (ast.AugAssign, ast.AnnAssign)):
+                    targets = [child.target]
+                for target in targets:
+                    for item in ast.walk(target):
+                        if isinstance(item, ast.Attribute) and isinstance(item.value, ast.Name) \
+                                and item.value.id == "self":
+                            names.add(item.attr)
+    return sorted(names)
+
+
+def analyze_source(source, module, is_package=False):
+    # Facts of one module: module-level functions and classes with the
+    # names they call, class methods and attributes, and imports
+    tree = ast.parse(source)
+    functions, classes = {}, {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            functions[node.name] = {"calls": _calls(node.body)}
+        elif isinstance(node, ast.ClassDef):
+            methods = {item.name: {"calls": _calls(item.body)} for item in node.body
+                       if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef))}
+            classes[node.name] = {"bases": [name for name in map(_dotted, node.bases) if name],
+                                  "methods": methods,
+                                  "attributes": _attributes(node.body)}
+    return {"module": module, "functions": functions, "classes": classes,
+            "imports": _imports(tree, module, is_package)}
+
+
+def module_name(path, root_dir):
+    # "pkg/sub/mod.py" -> "pkg.sub.mod", "pkg/__init__.py" -> "pkg"
+    relative = os.path.splitext(os.path.relpath(path, root_dir))[0]
+    parts = relative.split(os.sep)
+    if parts[-1] == "__init__" and len(parts) > 1:
+        parts = parts[:-1]
+    return ".".join(parts)
+
+
+def _analyze(task):
+    # Worker: (path, module, cached hash) -> (path, mtime, size, hash, facts),
+    # facts is None when the content matches the cached hash
+    path, module, cached_hash = task
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        source = f.read()
+    digest = hashlib.sha1(source).hexdigest()
+    if digest == cached_hash:
+        return path, stat.st_mtime_ns, stat.st_size, digest, None
+    try:
+        facts = analyze_source(source, module, os.path.basename(path) == "__init__.py")
+    except (SyntaxError, ValueError) as e:
+        facts = {"module": module, "error": str(e)}
+    return path, stat.st_mtime_ns, stat.st_size, digest, facts
+
+
+def python_files(root_dir):
+    # (path, mtime_ns, size) of every .py file, skipping hidden and ignored
+    # directories without descending into them
+    found = []
+    stack = [root_dir]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if not entry.name.startswith(".") and entry.name not in IGNORE_DIRS:
+                    stack.append(entry.path)
+            elif entry.name.endswith(".py") and entry.is_file():
+                stat = entry.stat()
+                found.append((entry.path, stat.st_mtime_ns, stat.st_size))
+    return sorted(found)
+
+
+def _load_cache(path):
+    try:
+        with open(path, "r") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return cache.get("files", {}) if cache.get("version") == CACHE_VERSION else {}
+
+
+def _save_cache(path, content):
+    # The facts of every file as JSON, or text as is
+    try:
+        with open(path + ".tmp", "w") as f:
+            if isinstance(content, str):
+                f.write(content)
+            else:
+                json.dump({"version": CACHE_VERSION, "files": content}, f)
+        os.replace(path + ".tmp", path)
+    except OSError:
+        # A read-only tree still gets its diagram
+        pass
+
+
+def analyze_tree(root_dir, cache_path=None, workers=None, found=None):
+    # {relative path: facts} of every module under root_dir, parsing only
+    # the files that changed since the cache was written. cache_path=False
+    # disables the cache; found is python_files(root_dir) if already scanned
+    root_dir = os.path.abspath(root_dir)
+    if cache_path is None:
+        cache_path = os.path.join(root_dir, CACHE_FILE)
+    cached = _load_cache(cache_path) if cache_path else {}
+    files = {}
+    tasks = []
+    for path, mtime, size in found if found is not None else python_files(root_dir):
+        relative = os.path.relpath(path, root_dir)
+        entry = cached.get(relative)
+        if entry is not None and entry["mtime"] == mtime and entry["size"] == size:
+            files[relative] = entry
+        else:
+            tasks.append((path, module_name(path, root_dir), entry["hash"] if entry else None))
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) >= POOL_THRESHOLD:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            analyzed = list(executor.map(_analyze, tasks, chunksize=max(1, len(tasks) // (4 * workers))))
+    else:
+        analyzed = [_analyze(task) for task in tasks]
+    for path, mtime, size, digest, facts in analyzed:
+        relative = os.path.relpath(path, root_dir)
+        if facts is None:
+            # Touched but unchanged: keep the cached facts
+            facts = cached[relative]["facts"]
+        files[relative] = {"mtime": mtime, "size": size, "hash": digest, "facts": facts}
+
+    if cache_path and (tasks or set(cached) != set(files)):
+        _save_cache(cache_path, files)
+    return {relative: entry["facts"] for relative, entry in sorted(files.items())}
+
+
+_UNSAFE_ID = re.compile(r"\W")
+
+
+@lru_cache(maxsize=None)
+def _node_id(*parts):
+    # Mermaid ids may only hold letters, digits and underscores
+    return "__".join(_UNSAFE_ID.sub("_", part) for part in parts)
+
+
+class _Resolver:
+    # Call names -> node ids of the definitions they refer to
+    def __init__(self, modules):
+        self.modules = modules
+
+    def definition(self, module, name, depth=0):
+        # Node id of a top-level function or class of a module
+        facts = self.modules.get(module)
+        if facts is None:
+            return None
+        if name in facts["functions"] or name in facts["classes"]:
+            return _node_id(module, name)
+        # Re-exported by an import of that module (bounded, imports can be circular)
+        target = facts["imports"].get(name)
+        if target is not None and target[0] == "name" and depth < 8:
+            return self.definition(target[1], target[2], depth + 1)
+        return None
+
+    def method(self, module, class_name, name):
+        facts = self.modules.get(module)
+        if facts is None or class_name not in facts["classes"]:
+            return None
+        if name in facts["classes"][class_name]["methods"]:
+            return _node_id(module, class_name, name)
+        return None
+
+    def _scope(self, module, name):
+        # What a bare name refers to: ("def", module, name), ("module", name) or None
+        facts = self.modules[module]
+        if name in facts["functions"] or name in facts["classes"]:
+            return "def", module, name
+        target = facts["imports"].get(name)
+        if target is None:
+            return None
+        if target[0] == "module":
+            return "module", target[1]
+        # "from pkg import module" imports a module
+        submodule = f"{target[1]}.{target[2]}" if target[1] else target[2]
+        if submodule in self.modules:
+            return "module", submodule
+        return "def", target[1], target[2]
+
+    def resolve(self, module, call, class_name=None):
+        parts = call.split(".")
+        if parts[0] == "self" and class_name is not None and len(parts) == 2:
+            return self.method(module, class_name, parts[1])
+        scope = self._scope(module, parts[0])
+        if scope is None:
+            return None
+        if scope[0] == "def":
+            if len(parts) == 1:
+                return self.definition(scope[1], scope[2])
+            if len(parts) == 2:
+                # Class.method(...)
+                return self.method(scope[1], scope[2], parts[1])
+            return None
+        # module.function(...), also through dotted module names
+        target = scope[1]
+        for i in range(len(parts) - 1, 0, -1):
+            candidate = ".".join([target] + parts[1:i])
+            if candidate in self.modules:
+                rest = parts[i:]
+                if len(rest) == 1:
+                    return self.definition(candidate, rest[0])
+                if len(rest) == 2:
+                    return self.method(candidate, rest[0], rest[1])
+                return None
+        return None
+
+
+def mermaid_graph(modules):
+    # modules: {module name: facts} -> Mermaid flowchart text
+    resolver = _Resolver(modules)
+    lines = ["graph TD"]
     edges = set()
-    for subdir, dirs, files in os.walk(root_dir):
-        if any(ignore_dir in subdir for ignore_dir in ignore_dirs):
+    import_edges = set()
+    for module, facts in modules.items():
+        module_id = _node_id(module)
+        lines.append(f"    subgraph {module_id}[\"{module}\"]")
+        for name, function in facts["functions"].items():
+            node = _node_id(module, name)
+            lines.append(f"        {node}([\"{name}()\"])")
+            for call in function["calls"]:
+                target = resolver.resolve(module, call)
+                if target is not None and target != node:
+                    edges.add((node, target))
+        for class_name, info in facts["classes"].items():
+            class_node = _node_id(module, class_name)
+            lines.append(f"        {class_node}[[\"{class_name}\"]]")
+            for method, details in info["methods"].items():
+                method_node = _node_id(module, class_name, method)
+                lines.append(f"        {method_node}(\"{method}()\")")
+                lines.append(f"        {class_node} --- {method_node}")
+                for call in details["calls"]:
+                    target = resolver.resolve(module, call, class_name)
+                    if target is not None and target != method_node:
+                        edges.add((method_node, target))
+            for attribute in info["attributes"]:
+                attribute_node = _node_id(module, class_name, "attr", attribute)
+                lines.append(f"        {attribute_node}[\"{attribute}\"]")
+                lines.append(f"        {class_node} --- {attribute_node}")
+            for base in info["bases"]:
+                target = resolver.resolve(module, base)
+                if target is not None:
+                    edges.add((class_node, target))
+        lines.append("    end")
+        for target in facts["imports"].values():
+            imported = target[1] if target[0] == "module" else \
+                next((m for m in (f"{target[1]}.{target[2]}", target[1]) if m in modules), None)
+            if imported in modules and imported != module:
+                import_edges.add((module_id, _node_id(imported)))
+    lines += [f"    {source} --> {target}" for source, target in sorted(edges)]
+    lines += [f"    {source} -.-> {target}" for source, target in sorted(import_edges)]
+    return "\n".join(lines) + "\n"
+
+
+def _tree_signature(root_dir, found):
+    # Mermaid comment line identifying the scanned state of the tree
+    digest = hashlib.sha1(str(CACHE_VERSION).encode())
+    for path, mtime, size in found:
+        digest.update(f"{os.path.relpath(path, root_dir)}\0{mtime}\0{size}\n".encode())
+    return f"%% {digest.hexdigest()}\n"
+
+
+def _load_diagram(path, signature):
+    try:
+        with open(path, "r") as f:
+            if f.readline() == signature:
+                return f.read()
+    except OSError:
+        pass
+    return None
+
+
+def generate_mermaid_diagram(root_dir, cache_path=None, workers=None):
+    # Mermaid text of every module under root_dir; see analyze_tree for the cache
+    root_dir = os.path.abspath(root_dir)
+    if cache_path is None:
+        cache_path = os.path.join(root_dir, CACHE_FILE)
+    found = python_files(root_dir)
+    signature = _tree_signature(root_dir, found)
+    if cache_path:
+        diagram = _load_diagram(cache_path + ".mmd", signature)
+        if diagram is not None:
+            return diagram
+
+    files = analyze_tree(root_dir, cache_path, workers, found)
+    modules = {}
+    for relative, facts in files.items():
+        if "error" in facts:
+            print(f"Skipping {relative}: {facts['error']}", file=sys.stderr)
             continue
-        for file in files:
-            if file.endswith(".py"):
-                file_path = os.path.join(subdir, file)
-                file_name = os.path.splitext(file)[0]
-                subgraphs[file_name] = {"classes": set(), "methods": {}, "attributes": {}}
-                with open(file_path, "r") as f:
-                    lines = f.readlines()
-                    class_name = None
-                    for line in lines:
-                        if line.startswith("class "):
-                            class_name = line.split(" ")[1].split("(")[0]
-                            subgraphs[file_name]["classes"].add(class_name)
-                            subgraphs[file_name]["methods"][class_name] = set()
-                            subgraphs[file_name]["attributes"][class_name] = set()
-                        elif class_name:
-                            if line.startswith("    def "):
-                                method_name = line.split(" ")[2].split("(")[0]
-                                subgraphs[file_name]["methods"][class_name].add(method_name)
-                            elif re.match(r"\s+self\.\w+\s*=", line):
-                                attribute_name = re.search(r"\s+self\.(\w+)\s*=", line).group(1)
-                                subgraphs[file_name]["attributes"][class_name].add(attribute_name)
-                            elif re.search(r"\b[A-Z]\w+\(", line):
-                                dependency_name = re.search(r"\b([A-Z]\w+)\(", line).group(1)
-                                edges.add((class_name, dependency_name))
-
-    for file_name, file_info in subgraphs.items():
-        mermaid_diagram += f"    subgraph {file_name}\n"
-        for class_name in file_info["classes"]:
-            mermaid_diagram += f"        {class_name}\n"
-            for method in file_info["methods"][class_name]:
-                method_node_id = f"{class_name}_{method}"
-                mermaid_diagram += f"        {method_node_id}({method})\n"
-                mermaid_diagram += f"        {class_name} --> {method_node_id}\n"
-            for attribute in file_info["attributes"][class_name]:
-                attribute_node_id = f"{class_name}_{attribute}"
-                mermaid_diagram += f"        {attribute_node_id}[{attribute}]\n"
-                mermaid_diagram += f"        {class_name} --> {attribute_node_id}\n"
-        mermaid_diagram += "    end\n"
-
-    for edge in edges:
-        mermaid_diagram += f"    {edge[0]} --> {edge[1]}\n"
-
-    return mermaid_diagram
-
-root_dir = os.getcwd()
-mermaid_diagram = generate_mermaid_diagram(root_dir)
-
-with open(os.path.join(root_dir, "mermaid_diagram.mmd"), "w") as f:
-    f.write(mermaid_diagram)
-
-print("Mermaid diagram saved to 'mermaid_diagram.mmd'")
\ No newline at end of file
+        modules[facts["module"]] = facts
+    diagram = mermaid_graph(modules)
+    if cache_path:
+        _save_cache(cache_path + ".mmd", signature + diagram)
+    return diagram
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a Mermaid graph of the Python modules of a tree.")
+    parser.add_argument("root_dir", nargs="?", default=os.getcwd())
+    parser.add_argument("--output", default=None,
+                        help="Mermaid file to write, mermaid_diagram.mmd in the tree by default.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Processes parsing changed files; all cores by default.")
+    parser.add_argument("--no-cache", action="store_true",
+                        help=f"Parse every file instead of reusing {CACHE_FILE}.")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    mermaid_diagram = generate_mermaid_diagram(args.root_dir, False if args.no_cache else None,
+                                               args.workers)
+    output = args.output or os.path.join(args.root_dir, "mermaid_diagram.mmd")
+    with open(output, "w") as f:
+        f.write(mermaid_diagram)
+    print(f"Mermaid diagram saved to '{output}' in {time.perf_counter() - started:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,197 @@
+import json
+import math
+import os
+from collections import deque
+
+# Stateful indicators that update in O(1) per new bar, for jobs that append
+# bars to an existing history instead of recomputing it. Each one matches the
+# full-history computation used in strategies.py (pandas rolling windows and
+# the ta library) to floating-point tolerance, and can be checkpointed to a
+# plain dict so its state survives restarts.
+
+
+class SMA:
+    kind = "sma"
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()
+        self.total = 0.0
+        # NaN values in the window; like pandas, the mean is NaN until they leave
+        self.missing = 0
+        self.updates = 0
+
+    def update(self, value):
+        value = float(value)
+        self.values.append(value)
+        if value == value:
+            self.total += value
+        else:
+            self.missing += 1
+        if len(self.values) > self.window:
+            old = self.values.popleft()
+            if old == old:
+                self.total -= old
+            else:
+                self.missing -= 1
+        # Re-sum once per window so rounding errors never accumulate
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self.total = math.fsum(v for v in self.values if v == v)
+        return self.value
+
+    @property
+    def value(self):
+        if len(self.values) < self.window or self.missing:
+            return math.nan
+        return self.total / self.window
+
+    def state(self):
+        return {"kind": self.kind, "window": self.window,
+                "values": list(self.values), "updates": self.updates}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state["window"])
+        indicator.values = deque(state["values"])
+        indicator.total = math.fsum(v for v in indicator.values if v == v)
+        indicator.missing = sum(v != v for v in indicator.values)
+        indicator.updates = state["updates"]
+        return indicator
+
+
+class BollingerBands:
+    # Rolling mean and population standard deviation, like ta's BollingerBands
+    kind = "bollinger"
+
+    def __init__(self, window=20, num_of_std=2):
+        self.window = window
+        self.num_of_std = num_of_std
+        self.values = deque()
+        self.mean = 0.0
+        self.m2 = 0.0
+        # NaN values in the window: the moments are rebuilt once they leave
+        self.missing = 0
+        self.updates = 0
+
+    def _resync(self):
+        values = [v for v in self.values if v == v]
+        self.missing = len(self.values) - len(values)
+        self.mean = math.fsum(values) / len(values) if values else 0.0
+        self.m2 = math.fsum((v - self.mean) ** 2 for v in values)
+
+    def update(self, value):
+        value = float(value)
+        self.values.append(value)
+        old = self.values.popleft() if len(self.values) > self.window else None
+        if value != value or old != old or self.missing:
+            # Rare (warm-up of a derived series): rebuild from the window
+            self._resync()
+        elif old is not None:
+            # Sliding-window Welford update: replace the oldest value
+            old_mean = self.mean
+            self.mean += (value - old) / self.window
+            self.m2 += (value - old) * (value - self.mean + old - old_mean)
+        else:
+            delta = value - self.mean
+            self.mean += delta / len(self.values)
+            self.m2 += delta * (value - self.mean)
+        self.updates += 1
+        if self.updates % self.window == 0:
+            self._resync()
+        return self.value
+
+    @property
+    def std(self):
+        if len(self.values) < self.window or self.missing:
+            return math.nan
+        return math.sqrt(max(self.m2, 0.0) / self.window)
+
+    @property
+    def value(self):
+        # (middle, upper, lower) band
+        if len(self.values) < self.window or self.missing:
+            return math.nan, math.nan, math.nan
+        deviation = self.num_of_std * self.std
+        return self.mean, self.mean + deviation, self.mean - deviation
+
+    def state(self):
+        return {"kind": self.kind, "window": self.window, "num_of_std": self.num_of_std,
+                "values": list(self.values), "updates": self.updates}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state["window"], state["num_of_std"])
+        indicator.values = deque(state["values"])
+        indicator.updates = state["updates"]
+        indicator._resync()
+        return indicator
+
+
+class WilderRSI:
+    # Same smoothing as ta's RSIIndicator: an exponential average with
+    # alpha = 1 / period over gains and losses, where the first bar counts as
+    # a zero change
+    kind = "rsi"
+
+    def __init__(self, period=14):
+        self.period = period
+        self.alpha = 1.0 / period
+        self.previous = None
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+        self.count = 0
+
+    def update(self, value):
+        value = float(value)
+        change = 0.0 if self.previous is None else value - self.previous
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        if self.count == 0:
+            self.avg_gain, self.avg_loss = gain, loss
+        else:
+            self.avg_gain += self.alpha * (gain - self.avg_gain)
+            self.avg_loss += self.alpha * (loss - self.avg_loss)
+        self.previous = value
+        self.count += 1
+        return self.value
+
+    @property
+    def value(self):
+        if self.count < self.period:
+            return math.nan
+        if self.avg_loss == 0:
+            return 100.0
+        return 100.0 - 100.0 / (1.0 + self.avg_gain / self.avg_loss)
+
+    def state(self):
+        return {"kind": self.kind, "period": self.period, "previous": self.previous,
+                "avg_gain": self.avg_gain, "avg_loss": self.avg_loss, "count": self.count}
+
+    @classmethod
+    def from_state(cls, state):
+        indicator = cls(state["period"])
+        indicator.previous = state["previous"]
+        indicator.avg_gain = state["avg_gain"]
+        indicator.avg_loss = state["avg_loss"]
+        indicator.count = state["count"]
+        return indicator
+
+
+INDICATORS = {cls.kind: cls for cls in (SMA, BollingerBands, WilderRSI)}
+
+
+def restore(state):
+    return INDICATORS[state["kind"]].from_state(state)
+
+
+def save_checkpoint(indicators, path):
+    # indicators: {name: indicator}, e.g. one entry per (symbol, indicator)
+    with open(path + ".tmp", "w") as f:
+        json.dump({name: indicator.state() for name, indicator in indicators.items()}, f)
+    # Swap the file in atomically so a crash keeps the previous checkpoint
+    os.replace(path + ".tmp", path)
+
+
+def load_checkpoint(path):
+    with open(path, "r") as f:
+        return {name: restore(state) for name, state in json.load(f).items()}
@@ -0,0 +1,174 @@
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from backtest import backtest
+from chunked import backtest_chunked
+from market_data import load_universe
+from price_store import parse_symbols
+
+# Background jobs for the Streamlit app, so a long backtest never runs in the
+# script thread of a session:
+#   - submit() puts a job on a local thread pool (the per-symbol work inside a
+#     job still goes to backtest()'s process pool) and returns at once
+#   - a job reports every symbol as it is downloaded and as it finishes, with
+#     its earnings, so the page can poll the job and show partial results
+#   - jobs are identified by a hash of their inputs: submitting a job that is
+#     already queued or running, from any session, returns the running job
+#   - finished jobs are kept for a while so every session can fetch them
+#   - a job can run under its own profiling.Profiler, since the spans of the
+#     submitting page are not visible from the pool's threads
+# Nothing here imports streamlit; the page does the polling.
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+# Per-symbol states
+PENDING, DOWNLOADED, FINISHED, ERROR = "pending", "downloaded", "finished", "error"
+
+
+def job_key(config):
+    # Stable hash of a job's inputs
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Job:
+    def __init__(self, key, symbols):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.symbols = list(symbols)
+        self.status = QUEUED
+        self.states = {symbol: PENDING for symbol in self.symbols}
+        self.earnings = {}
+        self.errors = {}
+        self.result = None
+        self.error = None
+        self.profiler = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.lock = threading.Lock()
+
+    @property
+    def active(self):
+        return self.status in (QUEUED, RUNNING)
+
+    def update(self, symbol, state, earnings=None, error=None):
+        with self.lock:
+            self.states[symbol] = state
+            if earnings is not None:
+                self.earnings[symbol] = earnings
+            # The first error is the cause (a failed download is later
+            # reported again as missing prices)
+            if error is not None:
+                self.errors.setdefault(symbol, error)
+
+    def finished_symbols(self):
+        with self.lock:
+            return sum(state in (FINISHED, ERROR) for state in self.states.values())
+
+    def progress(self):
+        # Fraction of the symbols finished (or failed)
+        return self.finished_symbols() / len(self.symbols) if self.symbols else 1.0
+
+    def partial_summary(self, investment):
+        # One row per symbol with its state and, once finished, its returns
+        with self.lock:
+            rows = [{"Symbol": symbol, "State": state,
+                     "Earnings": self.earnings.get(symbol),
+                     "Returns": (self.earnings[symbol] / investment * 100
+                                 if symbol in self.earnings and investment else None),
+                     "Error": self.errors.get(symbol)}
+                    for symbol, state in self.states.items()]
+        return pd.DataFrame(rows, columns=["Symbol", "State", "Earnings", "Returns", "Error"])
+
+
+class JobQueue:
+    def __init__(self, workers=2, keep=32):
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backtest-job")
+        # Finished jobs kept for polling sessions, oldest first
+        self.keep = keep
+        self.jobs = OrderedDict()
+        self.active = {}
+        self.lock = threading.Lock()
+
+    def submit(self, config, function, symbols, profiler=None):
+        # Queue function(job) unless the same config is already in flight.
+        # With a profiling.Profiler the job runs under it, kept in job.profiler
+        key = job_key(config)
+        with self.lock:
+            job = self.active.get(key)
+            if job is not None:
+                return job
+            job = Job(key, symbols)
+            job.profiler = profiler
+            self.jobs[job.id] = job
+            self.active[key] = job
+            self._trim()
+        self.pool.submit(self._run, job, function)
+        return job
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def _run(self, job, function):
+        job.status = RUNNING
+        job.started = time.time()
+        try:
+            if job.profiler is not None:
+                with job.profiler:
+                    job.result = function(job)
+            else:
+                job.result = function(job)
+            job.status = DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+        job.finished = time.time()
+        with self.lock:
+            self.active.pop(job.key, None)
+            self._trim()
+
+    def _trim(self):
+        # Caller holds the lock; only finished jobs are dropped
+        finished = [job_id for job_id, job in self.jobs.items() if not job.active]
+        for job_id in finished[:max(0, len(finished) - self.keep)]:
+            del self.jobs[job_id]
+
+
+def run_backtest_job(job, store, symbols, start, end, interval, strategy, params, capital,
+                     workers=1, cache=None, features=None, max_points=None, results=None):
+    # Download (or read) the prices and backtest them, reporting every symbol
+    # to the job. Returns (Universe or None for intraday bars, BacktestResult).
+    # With a results_store.ResultsStore the result is saved and its run id
+    # kept in result.run_id
+    symbols = parse_symbols(symbols)
+
+    def downloaded(symbol, error):
+        job.update(symbol, ERROR if error is not None else DOWNLOADED, error=error)
+
+    def finished(symbol, earnings, error):
+        job.update(symbol, ERROR if error is not None else FINISHED, earnings, error)
+
+    if interval == "1d":
+        data = load_universe(symbols, start, end, interval, store=store, progress=downloaded)
+        if data.empty:
+            return data, None
+        result = backtest(data, strategy, params, capital, start=start, cache=cache,
+                          workers=workers, features=features, progress=finished)
+    else:
+        if not store.offline:
+            store.update_many(symbols, start, end, interval, downloaded)
+        options = {} if max_points is None else {"max_points": max_points}
+        result = backtest_chunked(store, symbols, strategy, params, capital, start=start, end=end,
+                                  interval=interval, progress=finished, **options)
+        data = None
+    if results is not None:
+        result.run_id = results.save(result, start, end, interval)
+    return data, result
@@ -0,0 +1,76 @@
+import pandas as pd
+
+from compact import compact_prices
+from price_store import PriceStore, parse_symbols
+
+# Per-symbol layout for a universe of tickers. Each symbol keeps its own frame
+# so the signal, order and chart stages can look it up in O(1) instead of
+# filtering one long frame by its Symbol column over and over.
+
+
+class Universe:
+    def __init__(self, frames):
+        # frames: {symbol: OHLCV DataFrame}, in display order
+        self.frames = dict(frames)
+        self._wide = None
+
+    @property
+    def symbols(self):
+        return list(self.frames)
+
+    def __getitem__(self, symbol):
+        return self.frames[symbol]
+
+    def __contains__(self, symbol):
+        return symbol in self.frames
+
+    def __iter__(self):
+        return iter(self.frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def items(self):
+        return self.frames.items()
+
+    @property
+    def empty(self):
+        return all(frame.empty for frame in self.frames.values())
+
+    def non_empty(self):
+        return [symbol for symbol, frame in self.frames.items() if not frame.empty]
+
+    def wide(self):
+        # Dates x (Symbol, field) frame, built once in a single concat
+        if self._wide is None:
+            symbols = self.non_empty()
+            self._wide = pd.concat([self.frames[s] for s in symbols], axis=1,
+                                   keys=symbols, names=["Symbol", "Field"])
+        return self._wide
+
+    def long(self, columns=None):
+        # Stacked frame with a Symbol column, as expected by Plotly Express
+        symbols = self.non_empty()
+        if not symbols:
+            return pd.DataFrame(columns=(columns or []) + ["Symbol"])
+        frames = [self.frames[s] if columns is None else self.frames[s][columns]
+                  for s in symbols]
+        index_name = frames[0].index.name
+        stacked = pd.concat(frames, keys=symbols, names=["Symbol", index_name])
+        return stacked.reset_index(level="Symbol")
+
+    def compact(self):
+        # Same universe with float32 prices and integer volumes where the
+        # values survive the conversion (see compact.py)
+        return Universe({symbol: compact_prices(frame) for symbol, frame in self.frames.items()})
+
+    def field(self, name):
+        # Dates x symbols matrix of a single field, e.g. Close
+        return self.wide().xs(name, axis=1, level="Field")
+
+
+def load_universe(symbols, start, end, interval="1d", store=None, progress=None):
+    # Fetch every missing ticker in one grouped download and load the rest
+    # from the local price store; progress(symbol, error) follows downloads
+    store = store or PriceStore()
+    return Universe(store.get_many(parse_symbols(symbols), start, end, interval, progress))
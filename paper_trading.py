@@ -0,0 +1,443 @@
+import argparse
+import heapq
+import math
+import sys
+import time
+from collections import deque, namedtuple
+from itertools import repeat
+from operator import attrgetter
+
+import numpy as np
+import pandas as pd
+
+from backtest import ORDER_COLUMNS
+from incremental import SMA, BollingerBands, WilderRSI
+from price_store import INTERVALS, ROW_GROUP_SIZE, PriceStore, parse_symbols
+from signal_dsl import COLUMNS, walk
+from strategies import STRATEGY_REGISTRY
+
+# Paper trading: the registered strategies applied to bars as they arrive
+# instead of to a finished DataFrame.
+#   - a feed is any iterable of Bars in time order: ReplayFeed plays stored
+#     history back from the price store (as fast as possible, or paced),
+#     FrameFeed plays in-memory frames and PollingFeed follows the chart API
+#   - StreamingSignals compiles a strategy's Buy and Sell expressions into
+#     one stateful step per unique node (the O(1) indicators of
+#     incremental.py, ring buffers for shifts and extremes), so each bar
+#     costs the same however long the history is
+#   - PaperTrader keeps the in_position state of every symbol with the same
+#     rules as trade_engine.simulate_trades and emits an order whenever it
+#     changes, timing every bar from its arrival to its orders
+# Replaying a feed of stored bars gives the same signals and orders as the
+# backtest of that history.
+
+# timestamp is in nanoseconds since the epoch (UTC for tz-aware bars)
+Bar = namedtuple("Bar", ["symbol", "timestamp", "open", "high", "low", "close", "volume"])
+
+BAR_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+# Bar field of every price column name of the signal language
+_FIELDS = {name: Bar._fields.index(name) for name in COLUMNS}
+
+
+def frame_bars(symbol, frame):
+    # Bars of one symbol's OHLCV frame; missing columns are NaN
+    timestamps = pd.DatetimeIndex(frame.index).asi8.tolist()
+    columns = [frame[column].to_numpy(dtype=float).tolist() if column in frame
+               else [math.nan] * len(frame) for column in BAR_COLUMNS]
+    return map(Bar, repeat(symbol), timestamps, *columns)
+
+
+def merge_bars(streams):
+    # One time-ordered stream of several symbols' bars; ties keep stream order
+    streams = list(streams)
+    if len(streams) == 1:
+        return iter(streams[0])
+    return heapq.merge(*streams, key=attrgetter("timestamp"))
+
+
+def paced(bars, speed):
+    # Hold every bar back until its time comes, speed times faster than the market
+    started = time.monotonic()
+    first = None
+    for bar in bars:
+        if first is None:
+            first = bar.timestamp
+        wait = (bar.timestamp - first) / 1e9 / speed - (time.monotonic() - started)
+        if wait > 0:
+            time.sleep(wait)
+        yield bar
+
+
+class FrameFeed:
+    # Bars of in-memory frames, e.g. a Universe. speed=None replays as fast
+    # as possible
+    def __init__(self, data, speed=None):
+        self.data = data
+        self.speed = speed
+        self.tz = next((frame.index.tz for _, frame in data.items()
+                        if isinstance(frame.index, pd.DatetimeIndex)), None)
+
+    def __iter__(self):
+        bars = merge_bars(frame_bars(symbol, frame) for symbol, frame in self.data.items())
+        return bars if self.speed is None else paced(bars, self.speed)
+
+
+class ReplayFeed:
+    # Stored bars played back from the price store, read chunk by chunk so
+    # a long history never has to fit in memory
+    def __init__(self, store, symbols, start=None, end=None, interval="1m", speed=None,
+                 chunk_size=ROW_GROUP_SIZE):
+        self.store = store
+        self.symbols = parse_symbols(symbols)
+        self.start = start
+        self.end = end
+        self.interval = interval
+        self.speed = speed
+        self.chunk_size = chunk_size
+        self.tz = None
+
+    def _bars(self, symbol):
+        for chunk in self.store.iter_chunks(symbol, self.start, self.end, self.interval,
+                                            self.chunk_size):
+            self.tz = chunk.index.tz or self.tz
+            yield from frame_bars(symbol, chunk)
+
+    def __iter__(self):
+        bars = merge_bars(self._bars(symbol) for symbol in self.symbols)
+        return bars if self.speed is None else paced(bars, self.speed)
+
+
+class PollingFeed:
+    # Live bars from the chart API (a fetcher.PriceFetcher): every poll asks
+    # for the recent bars of every symbol and yields the closed ones not seen
+    # yet. start=None only yields bars closed after the feed started; polls
+    # limits the number of polls (None polls forever)
+    def __init__(self, fetcher, symbols, interval="1m", poll_seconds=60.0, start=None,
+                 lookback=pd.Timedelta(days=1), polls=None):
+        self.fetcher = fetcher
+        self.symbols = parse_symbols(symbols)
+        self.interval = interval
+        self.poll_seconds = poll_seconds
+        self.start = start
+        self.lookback = lookback
+        self.polls = polls
+        self.tz = None
+        self.errors = {}
+
+    def __iter__(self):
+        start = pd.Timestamp.now(tz="UTC") if self.start is None else pd.Timestamp(self.start)
+        if start.tz is None:
+            start = start.tz_localize("UTC")
+        cursor = dict.fromkeys(self.symbols, start.value - 1)
+        poll = 0
+        while self.polls is None or poll < self.polls:
+            now = pd.Timestamp.now(tz="UTC")
+            since = max(start, now - self.lookback)
+            requests_ = [(symbol, symbol, since, now, self.interval) for symbol in self.symbols]
+            streams = []
+            for symbol, frame, error in self.fetcher.iter_requests(requests_):
+                if error is not None:
+                    self.errors[symbol] = error
+                    continue
+                # The last bar is still forming; it is yielded once it closes
+                frame = frame.iloc[:-1]
+                index = pd.DatetimeIndex(frame.index)
+                self.tz = index.tz or self.tz
+                frame = frame[index.asi8 > cursor[symbol]]
+                if len(frame):
+                    cursor[symbol] = int(pd.DatetimeIndex(frame.index).asi8[-1])
+                    streams.append(list(frame_bars(symbol, frame)))
+            yield from merge_bars(streams) if streams else ()
+            poll += 1
+            if self.polls is None or poll < self.polls:
+                time.sleep(self.poll_seconds)
+
+
+def _divide(a, b):
+    # NumPy's division: x / 0 is +-inf, 0 / 0 is NaN
+    if b == 0:
+        if a == 0 or a != a:
+            return math.nan
+        return math.copysign(math.inf, a) * math.copysign(1.0, b)
+    return a / b
+
+
+class _Extreme:
+    # Rolling maximum (or minimum) with a monotonic queue of (bar, value)
+    def __init__(self, window, highest=True):
+        self.window = window
+        self.sign = 1.0 if highest else -1.0
+        self.queue = deque()
+        # Bars seen and the last bar that was NaN, since pandas' rolling
+        # extremes are NaN while a NaN is in the window
+        self.count = 0
+        self.last_missing = -math.inf
+
+    def update(self, value):
+        value = float(value)
+        bar = self.count
+        self.count += 1
+        if value != value:
+            self.last_missing = bar
+        else:
+            key = self.sign * value
+            while self.queue and self.sign * self.queue[-1][1] <= key:
+                self.queue.pop()
+            self.queue.append((bar, value))
+        while self.queue and self.queue[0][0] <= bar - self.window:
+            self.queue.popleft()
+        if self.count < self.window or self.last_missing > bar - self.window:
+            return math.nan
+        return self.queue[0][1]
+
+
+class _Cross:
+    # a crosses above (or below) b on this bar
+    def __init__(self, above=True):
+        self.above = above
+        self.previous = (math.nan, math.nan)
+
+    def update(self, a, b):
+        previous_a, previous_b = self.previous
+        self.previous = (a, b)
+        if self.above:
+            return a > b and previous_a <= previous_b
+        return a < b and previous_a >= previous_b
+
+
+def _step(node, slot):
+    # Per-bar function of one node: step(values, bar) -> value, where
+    # values holds this bar's value of every node computed before it
+    op = node[0]
+    args = [slot[arg] if isinstance(arg, tuple) else arg for arg in node[1:]]
+    if op == "column":
+        field = _FIELDS[node[1]]
+        return lambda values, bar: bar[field]
+    if op == "sma":
+        indicator, i = SMA(args[1]), args[0]
+        return lambda values, bar: indicator.update(values[i])
+    if op == "std":
+        bands, i = BollingerBands(args[1], 0), args[0]
+
+        def std(values, bar):
+            bands.update(values[i])
+            return bands.std
+        return std
+    if op == "rsi":
+        if node[1][0] != "column":
+            raise ValueError("Only the RSI of a price column can be streamed")
+        indicator, i = WilderRSI(args[1]), args[0]
+        return lambda values, bar: indicator.update(values[i])
+    if op in ("highest", "lowest"):
+        extreme, i = _Extreme(args[1], op == "highest"), args[0]
+        return lambda values, bar: extreme.update(values[i])
+    if op == "shift":
+        history, i = deque(maxlen=args[1] + 1), args[0]
+
+        def shift(values, bar):
+            history.append(values[i])
+            return history[0] if len(history) == history.maxlen else math.nan
+        return shift
+    if op in ("cross_above", "cross_below"):
+        cross, i, j = _Cross(op == "cross_above"), args[0], args[1]
+        return lambda values, bar: cross.update(values[i], values[j])
+    unary = {"abs": abs, "neg": lambda a: -a, "not": lambda a: not a}
+    if op in unary:
+        function, i = unary[op], args[0]
+        return lambda values, bar: function(values[i])
+    binary = {"add": lambda a, b: a + b, "sub": lambda a, b: a - b, "mul": lambda a, b: a * b,
+              "div": _divide, "and": lambda a, b: bool(a) and bool(b),
+              "or": lambda a, b: bool(a) or bool(b), "lt": lambda a, b: a < b,
+              "le": lambda a, b: a <= b, "gt": lambda a, b: a > b, "ge": lambda a, b: a >= b}
+    if op in binary:
+        function, i, j = binary[op], args[0], args[1]
+        return lambda values, bar: function(values[i], values[j])
+    raise ValueError(f"Unknown node '{op}'")
+
+
+class StreamingSignals:
+    # Buy and Sell signals of a registered strategy, one bar at a time
+    def __init__(self, strategy_name, params=None):
+        strategy = STRATEGY_REGISTRY[strategy_name]
+        self.params = strategy.validate(params)
+        buy, sell = strategy.compile(self.params)
+        # Unique nodes, children before their parents, as in a SignalGraph
+        nodes = list(dict.fromkeys(node for expression in (buy, sell) for node in walk(expression)))
+        slot = {node: i for i, node in enumerate(nodes)}
+        self.values = [math.nan] * len(nodes)
+        self.steps = []
+        for node in nodes:
+            if node[0] == "const":
+                self.values[slot[node]] = node[1]
+            else:
+                self.steps.append((slot[node], _step(node, slot)))
+        self.buy = slot[buy]
+        self.sell = slot[sell]
+
+    def update(self, bar):
+        # (buy, sell) after this bar
+        values = self.values
+        for i, step in self.steps:
+            values[i] = step(values, bar)
+        return bool(values[self.buy]), bool(values[self.sell])
+
+
+Order = namedtuple("Order", ["symbol", "signal", "timestamp", "price", "shares", "amount",
+                             "earnings", "latency"])
+
+
+class PaperTradingResult:
+    def __init__(self, orders, positions, latency, bars, elapsed, market_seconds):
+        # Orders like BacktestResult.orders plus Shares and Latency (us)
+        self.orders = orders
+        # Positions still open after the last bar
+        self.positions = positions
+        # Nanoseconds from the arrival of every bar to its orders
+        self.latency = latency
+        self.bars = bars
+        self.elapsed = elapsed
+        self.market_seconds = market_seconds
+
+    @property
+    def earnings(self):
+        return float(self.orders['Earnings'].sum()) if len(self.orders) else 0.0
+
+    @property
+    def bars_per_second(self):
+        return self.bars / self.elapsed if self.elapsed > 0 else math.inf
+
+    @property
+    def speedup(self):
+        # Market time replayed per second of wall time
+        return self.market_seconds / self.elapsed if self.elapsed > 0 else math.inf
+
+    def latency_summary(self):
+        # Per-bar latency percentiles in microseconds
+        if not len(self.latency):
+            return {}
+        microseconds = self.latency / 1000
+        return {"mean": float(microseconds.mean()),
+                "p50": float(np.percentile(microseconds, 50)),
+                "p99": float(np.percentile(microseconds, 99)),
+                "max": float(microseconds.max())}
+
+
+class PaperTrader:
+    # Paper account trading every symbol with capital / len(symbols), like
+    # the backtest. Orders follow the in_position rules: a Buy opens a
+    # position when out of the market, a Sell closes it when in, and a bar
+    # with both signals flips it
+    def __init__(self, strategy_name, symbols, params=None, capital=10000.0):
+        self.strategy = strategy_name
+        self.symbols = parse_symbols(symbols)
+        self.capital = capital
+        self.investment = capital / len(self.symbols) if self.symbols else 0.0
+        self.signals = {symbol: StreamingSignals(strategy_name, params) for symbol in self.symbols}
+        # symbol -> (entry price, shares) while in the market
+        self.positions = {}
+        self.orders = []
+        self.latency = []
+        self.first = None
+        self.last = None
+
+    def warm_up(self, feed):
+        # Feed history through the indicators without trading it
+        for bar in feed:
+            self.signals[bar.symbol].update(bar)
+
+    def on_bar(self, bar):
+        # Orders caused by one bar (latency is filled in by run())
+        buy, sell = self.signals[bar.symbol].update(bar)
+        if not (buy or sell):
+            return []
+        position = self.positions.get(bar.symbol)
+        if position is None and buy:
+            return [self._open(bar)]
+        if position is not None and sell:
+            return [self._close(bar, position)]
+        return []
+
+    def _open(self, bar):
+        shares = self.investment // bar.close
+        self.positions[bar.symbol] = (bar.close, shares)
+        return [bar.symbol, "Buy", bar.timestamp, bar.close, shares, shares * bar.close, math.nan]
+
+    def _close(self, bar, position):
+        entry_price, shares = position
+        del self.positions[bar.symbol]
+        return [bar.symbol, "Sell", bar.timestamp, bar.close, shares, shares * bar.close,
+                shares * (bar.close - entry_price)]
+
+    def run(self, feed, on_order=None):
+        # Trade every bar of the feed; on_order(Order) is called as soon as
+        # an order is emitted
+        clock = time.perf_counter_ns
+        latency = self.latency
+        started = time.perf_counter()
+        for bar in feed:
+            arrived = clock()
+            orders = self.on_bar(bar)
+            elapsed = clock() - arrived
+            latency.append(elapsed)
+            if self.first is None:
+                self.first = bar.timestamp
+            self.last = bar.timestamp
+            for fields in orders:
+                order = Order(*fields, elapsed / 1000)
+                self.orders.append(order)
+                if on_order is not None:
+                    on_order(order)
+        return self.result(time.perf_counter() - started, getattr(feed, "tz", None))
+
+    def result(self, elapsed=0.0, tz=None):
+        orders = pd.DataFrame(self.orders, columns=Order._fields)
+        timestamps = pd.to_datetime(orders['timestamp'].to_numpy(dtype=np.int64))
+        if tz is not None:
+            timestamps = timestamps.tz_localize("UTC").tz_convert(tz)
+        orders = pd.DataFrame({
+            'Symbol': orders['symbol'], 'Signal': orders['signal'], 'Timestamp': timestamps,
+            'Price': orders['price'], 'Amount': orders['amount'], 'Earnings': orders['earnings'],
+            'Shares': orders['shares'], 'Latency (us)': orders['latency'],
+        }, columns=ORDER_COLUMNS + ['Shares', 'Latency (us)'])
+        positions = pd.DataFrame([{'Symbol': symbol, 'Entry Price': price, 'Shares': shares}
+                                  for symbol, (price, shares) in self.positions.items()],
+                                 columns=['Symbol', 'Entry Price', 'Shares'])
+        market_seconds = 0.0 if self.first is None else (self.last - self.first) / 1e9
+        return PaperTradingResult(orders, positions, np.asarray(self.latency, dtype=np.int64),
+                                  len(self.latency), elapsed, market_seconds)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Replay stored bars through a strategy as a paper-trading session.")
+    parser.add_argument("--symbols", required=True, help="Comma separated tickers.")
+    parser.add_argument("--strategy", default="Moving Average Crossover",
+                        choices=list(STRATEGY_REGISTRY))
+    parser.add_argument("--capital", type=float, default=10000.0)
+    parser.add_argument("--start", default=None)
+    parser.add_argument("--end", default=None)
+    parser.add_argument("--interval", default="1m", choices=INTERVALS)
+    parser.add_argument("--speed", type=float, default=None,
+                        help="Play the bars this many times faster than the market; "
+                             "as fast as possible by default.")
+    args = parser.parse_args(argv)
+
+    feed = ReplayFeed(PriceStore(offline=True), args.symbols, args.start, args.end,
+                      args.interval, args.speed)
+    trader = PaperTrader(args.strategy, feed.symbols, capital=args.capital)
+    result = trader.run(feed)
+    if not result.bars:
+        print("No stored bars for these symbols and dates", file=sys.stderr)
+        return 1
+    print(result.orders.to_string(index=False))
+    print(f"\n{result.bars:,} bars in {result.elapsed:.2f} s ({result.bars_per_second:,.0f} bars/s, "
+          f"{result.speedup:,.0f}x real time), {len(result.orders)} orders, "
+          f"earnings {result.earnings:,.2f}")
+    print("Latency per bar (us): " + ", ".join(
+        f"{name} {value:.1f}" for name, value in result.latency_summary().items()))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,204 @@
+import heapq
+
+import numpy as np
+import pandas as pd
+
+from backtest import backtest
+from trade_engine import positions_from_signals
+
+# Event-driven portfolio simulation. Instead of giving every symbol a fixed
+# slice of the capital, all symbols trade from one shared cash ledger:
+#   - entry and exit events of every symbol are merged into one timeline with
+#     heapq.merge over the per-symbol (already sorted) event lists
+#   - at equal timestamps exits are filled before entries, so freed cash can
+#     be reused; an entry without enough cash is skipped
+#   - fills pay slippage on the price and a commission on the traded value
+#   - the equity curve marks every held position to market on every bar of
+#     the merged timeline, not only at the fills
+
+SELL, BUY = 0, 1
+
+# How much cash an entry may use:
+#   equal_split        capital / number of symbols, the same as backtest()
+#   percent_of_equity  fraction of the current marked-to-market equity
+#   percent_of_cash    fraction of the cash left
+SIZING_RULES = ["equal_split", "percent_of_equity", "percent_of_cash"]
+
+FILL_FIELDS = {"symbol": np.int32, "signal": np.int8, "timestamp": np.int64,
+               "shares": np.float64, "price": np.float64, "amount": np.float64,
+               "commission": np.float64, "earnings": np.float64, "cash": np.float64}
+
+
+class PortfolioResult:
+    def __init__(self, capital, symbols, fills, equity, skipped):
+        self.capital = capital
+        self.symbols = symbols
+        # One row per fill, in the order they were executed
+        self.fills = fills
+        # Cash, Holdings and Equity on every bar of the merged timeline
+        self.equity = equity
+        # Entries that were not filled for lack of cash
+        self.skipped = skipped
+
+    @property
+    def final_equity(self):
+        return float(self.equity['Equity'].iloc[-1]) if len(self.equity) else self.capital
+
+    @property
+    def total_earnings(self):
+        return self.final_equity - self.capital
+
+    @property
+    def total_return(self):
+        # In percent of the starting capital
+        return self.total_earnings / self.capital * 100 if self.capital else 0.0
+
+
+def _timestamps(index):
+    # int64 UTC nanoseconds of a DatetimeIndex, plus its time zone
+    index = pd.DatetimeIndex(index)
+    if index.tz is None:
+        return index.asi8, None
+    return index.tz_convert("UTC").tz_localize(None).asi8, index.tz
+
+
+def symbol_events(code, timestamps, buy, sell):
+    # (timestamp, side, symbol code, bar) tuples of one symbol, in bar order,
+    # using the same position rules as the single-symbol backtest
+    position = positions_from_signals(buy, sell)
+    previous = np.concatenate(([False], position[:-1]))[:len(position)]
+    bars = np.flatnonzero(position != previous)
+    sides = np.where(position[bars], BUY, SELL)
+    return list(zip(timestamps[bars].tolist(), sides.tolist(), [code] * len(bars), bars.tolist()))
+
+
+def simulate_portfolio(signals, capital=10000.0, sizing="equal_split", fraction=None,
+                       commission=0.0, fixed_commission=0.0, slippage=0.0):
+    # signals: {symbol: frame with Close, Buy and Sell columns}, e.g.
+    # BacktestResult.signals. commission and slippage are fractions of the
+    # traded value and price, fixed_commission is charged per fill
+    if sizing not in SIZING_RULES:
+        raise ValueError(f"Unknown sizing rule '{sizing}'. Available rules: " + ", ".join(SIZING_RULES))
+    symbols = [symbol for symbol, frame in signals.items() if len(frame)]
+    if fraction is None:
+        fraction = 1.0 / len(symbols) if symbols else 0.0
+
+    tz = None
+    timestamps, closes, streams = [], [], []
+    for code, symbol in enumerate(symbols):
+        frame = signals[symbol]
+        ts, frame_tz = _timestamps(frame.index)
+        tz = tz or frame_tz
+        timestamps.append(ts)
+        closes.append(frame['Close'].to_numpy(dtype=float))
+        streams.append(symbol_events(code, ts, frame['Buy'].values, frame['Sell'].values))
+
+    capacity = sum(len(stream) for stream in streams)
+    fills = {name: np.empty(capacity, dtype=dtype) for name, dtype in FILL_FIELDS.items()}
+    n_fills = 0
+    skipped = 0
+
+    cash = float(capital)
+    shares = np.zeros(len(symbols))
+    entry_cost = np.zeros(len(symbols))
+    for timestamp, side, code, bar in heapq.merge(*streams):
+        close = closes[code][bar]
+        if side == SELL:
+            if shares[code] == 0:
+                # Its entry was skipped, there is nothing to sell
+                continue
+            quantity = shares[code]
+            price = close * (1 - slippage)
+            amount = quantity * price
+            fee = amount * commission + fixed_commission
+            cash += amount - fee
+            earnings = amount - fee - entry_cost[code]
+            shares[code] = 0
+        else:
+            if sizing == "equal_split":
+                budget = capital / len(symbols)
+            elif sizing == "percent_of_cash":
+                budget = cash * fraction
+            else:
+                held = np.flatnonzero(shares)
+                equity = cash + sum(shares[c] * closes[c][np.searchsorted(timestamps[c], timestamp, "right") - 1]
+                                    for c in held)
+                budget = equity * fraction
+            budget = min(budget, cash - fixed_commission)
+            price = close * (1 + slippage)
+            quantity = np.floor(budget / (price * (1 + commission))) if budget > 0 else 0.0
+            if quantity <= 0:
+                skipped += 1
+                continue
+            amount = quantity * price
+            fee = amount * commission + fixed_commission
+            cash -= amount + fee
+            earnings = np.nan
+            shares[code] = quantity
+            entry_cost[code] = amount + fee
+
+        row = {"symbol": code, "signal": side, "timestamp": timestamp, "shares": quantity,
+               "price": price, "amount": amount, "commission": fee, "earnings": earnings, "cash": cash}
+        for name, value in row.items():
+            fills[name][n_fills] = value
+        n_fills += 1
+
+    fills = {name: array[:n_fills] for name, array in fills.items()}
+    equity = equity_curve(timestamps, closes, fills, capital)
+    return PortfolioResult(capital, symbols, _fills_frame(fills, symbols, tz),
+                           _with_tz(equity, tz), skipped)
+
+
+def equity_curve(timestamps, closes, fills, capital):
+    # Mark-to-market Cash/Holdings/Equity on every bar of the merged timeline.
+    # Every lookup is a searchsorted merge-join of two sorted arrays
+    timeline = np.unique(np.concatenate(timestamps)) if timestamps else np.empty(0, dtype=np.int64)
+    holdings = np.zeros(len(timeline))
+    for code, (ts, close) in enumerate(zip(timestamps, closes)):
+        mine = fills["symbol"] == code
+        if not mine.any():
+            continue
+        # Shares held after each of this symbol's fills, stepped onto the timeline
+        held_after = np.where(fills["signal"][mine] == BUY, fills["shares"][mine], 0.0)
+        step = np.searchsorted(fills["timestamp"][mine], timeline, "right") - 1
+        held = np.where(step >= 0, held_after[np.maximum(step, 0)], 0.0)
+        # Last close at or before every timeline point
+        bar = np.searchsorted(ts, timeline, "right") - 1
+        price = close[np.maximum(bar, 0)]
+        holdings += np.where(held > 0, held * price, 0.0)
+
+    step = np.searchsorted(fills["timestamp"], timeline, "right") - 1
+    cash = np.where(step >= 0, fills["cash"][np.maximum(step, 0)], float(capital))
+    return pd.DataFrame({"Cash": cash, "Holdings": holdings, "Equity": cash + holdings},
+                        index=pd.DatetimeIndex(pd.to_datetime(timeline), name="Timestamp"))
+
+
+def _with_tz(frame, tz):
+    if tz is not None:
+        frame.index = frame.index.tz_localize("UTC").tz_convert(tz)
+    return frame
+
+
+def _fills_frame(fills, symbols, tz):
+    timestamps = pd.to_datetime(fills["timestamp"])
+    if tz is not None:
+        timestamps = timestamps.tz_localize("UTC").tz_convert(tz)
+    return pd.DataFrame({
+        "Symbol": pd.Categorical.from_codes(fills["symbol"], categories=symbols or ["_"]),
+        "Signal": pd.Categorical.from_codes(fills["signal"], categories=["Sell", "Buy"]),
+        "Timestamp": timestamps,
+        "Shares": fills["shares"],
+        "Price": fills["price"],
+        "Amount": fills["amount"],
+        "Commission": fills["commission"],
+        "Earnings": fills["earnings"],
+        "Cash": fills["cash"],
+    })
+
+
+def portfolio_backtest(data, strategy, params=None, capital=10000.0, cache=None, workers=1,
+                       **options):
+    # Strategy signals from backtest() (with its cache and worker pool), then
+    # the shared-ledger simulation. Returns (BacktestResult, PortfolioResult)
+    result = backtest(data, strategy, params, capital, cache=cache, workers=workers)
+    return result, simulate_portfolio(result.signals, capital, **options)
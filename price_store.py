@@ -0,0 +1,261 @@
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from profiling import span
+
+# Local, columnar cache of OHLCV bars so reruns don't hit Yahoo Finance again.
+# Layout: <root>/<interval>/<SYMBOL>.parquet holds the bars and a
+# <SYMBOL>.json sidecar records which date ranges have already been fetched
+# (weekends and holidays have no bars, so the bars alone can't tell us that).
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".price_cache")
+
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Adj Close", "Volume"]
+
+# Bars per Parquet row group, which is also the unit iter_chunks() reads, so
+# long intraday histories can be streamed without loading the whole file
+ROW_GROUP_SIZE = 100_000
+
+INTERVALS = ["1d", "1h", "30m", "15m", "5m", "2m", "1m"]
+
+# Longest date range Yahoo Finance serves in one request per intraday interval
+MAX_REQUEST_DAYS = {"1m": 7, "2m": 60, "5m": 60, "15m": 60, "30m": 60, "1h": 730}
+
+
+def parse_symbols(symbols):
+    # Accept "AAPL, NVDA,AMZN" as well as a list of tickers
+    if isinstance(symbols, str):
+        symbols = symbols.split(',')
+    parsed = []
+    for symbol in symbols:
+        symbol = symbol.strip().upper()
+        if symbol and symbol not in parsed:
+            parsed.append(symbol)
+    return parsed
+
+
+def _to_timestamp(value):
+    return pd.Timestamp(value).tz_localize(None).normalize()
+
+
+def _merge_ranges(ranges):
+    # Collapse overlapping/adjacent [start, end) ranges
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _missing_ranges(covered, start, end):
+    # Sub-ranges of [start, end) that are not covered yet
+    missing = []
+    cursor = start
+    for covered_start, covered_end in covered:
+        if covered_end <= cursor:
+            continue
+        if covered_start >= end:
+            break
+        if covered_start > cursor:
+            missing.append((cursor, min(covered_start, end)))
+        cursor = max(cursor, covered_end)
+        if cursor >= end:
+            break
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+def _request_windows(start, end, interval):
+    # Split [start, end) into ranges short enough for a single request
+    days = MAX_REQUEST_DAYS.get(interval)
+    if days is None:
+        return [(start, end)]
+    windows = []
+    while start < end:
+        windows.append((start, min(start + pd.Timedelta(days=days), end)))
+        start = windows[-1][1]
+    return windows
+
+
+def _slice(df, start, end):
+    if df.empty:
+        return df
+    index = df.index
+    if getattr(index, "tz", None) is not None:
+        index = index.tz_localize(None)
+    mask = (index >= start) & (index < end)
+    return df[mask]
+
+
+def download_prices(symbols, start, end, interval="1d"):
+    # One grouped request for all tickers, split back into a frame per symbol.
+    # Imported lazily so offline and headless runs never need yfinance
+    import yfinance as yf
+    data = yf.download(list(symbols), start=start, end=end, interval=interval,
+                       group_by="ticker", progress=False)
+    if not isinstance(data.columns, pd.MultiIndex):
+        frames = {symbols[0]: data}
+    else:
+        # The grouped frame has the union of all dates, so drop the other tickers' rows
+        downloaded = set(data.columns.get_level_values(0))
+        frames = {symbol: data[symbol].dropna(how="all")
+                  for symbol in symbols if symbol in downloaded}
+    # A failed ticker still gets columns, all NaN: leave it out so the range
+    # is not stored as covered and is downloaded again next time
+    return {symbol: frame for symbol, frame in frames.items()
+            if not frame.dropna(how="all").empty}
+
+
+class PriceStore:
+    # downloader(symbols, start, end, interval) -> {symbol: frame} is called
+    # once per missing range. A fetcher (fetcher.PriceFetcher) is used instead
+    # when given: every (symbol, range) is requested concurrently and each
+    # symbol is written to the cache as soon as all its ranges have arrived
+    def __init__(self, root=DEFAULT_CACHE_DIR, offline=False, downloader=download_prices,
+                 fetcher=None):
+        self.root = root
+        self.offline = offline
+        self.downloader = downloader
+        self.fetcher = fetcher
+
+    def _paths(self, symbol, interval):
+        directory = os.path.join(self.root, interval)
+        name = symbol.replace(os.sep, "_")
+        return (os.path.join(directory, name + ".parquet"),
+                os.path.join(directory, name + ".json"))
+
+    def _read_coverage(self, symbol, interval):
+        _, meta_path = self._paths(symbol, interval)
+        if not os.path.exists(meta_path):
+            return []
+        with open(meta_path, "r") as f:
+            ranges = json.load(f)["covered"]
+        return [[pd.Timestamp(s), pd.Timestamp(e)] for s, e in ranges]
+
+    def _write(self, symbol, interval, bars, covered):
+        bars_path, meta_path = self._paths(symbol, interval)
+        os.makedirs(os.path.dirname(bars_path), exist_ok=True)
+        # Write to temporary files first so a crash never leaves a torn cache
+        bars.to_parquet(bars_path + ".tmp", engine="pyarrow", row_group_size=ROW_GROUP_SIZE)
+        os.replace(bars_path + ".tmp", bars_path)
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump({"covered": [[s.isoformat(), e.isoformat()] for s, e in covered]}, f)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    def read(self, symbol, start=None, end=None, interval="1d"):
+        # Read whatever is on disk, never touching the network
+        bars_path, _ = self._paths(symbol, interval)
+        if not os.path.exists(bars_path):
+            return pd.DataFrame(columns=PRICE_COLUMNS, index=pd.DatetimeIndex([], name="Date"))
+        bars = pd.read_parquet(bars_path, engine="pyarrow")
+        if start is None and end is None:
+            return bars
+        start = _to_timestamp(start) if start is not None else pd.Timestamp.min
+        end = _to_timestamp(end) if end is not None else pd.Timestamp.max
+        return _slice(bars, start, end)
+
+    def iter_chunks(self, symbol, start=None, end=None, interval="1d", chunk_size=ROW_GROUP_SIZE):
+        # Yield the stored bars in date order, chunk_size rows at a time
+        import pyarrow.parquet as pq
+        bars_path, _ = self._paths(symbol, interval)
+        if not os.path.exists(bars_path):
+            return
+        start = _to_timestamp(start) if start is not None else pd.Timestamp.min
+        end = _to_timestamp(end) if end is not None else pd.Timestamp.max
+        for batch in pq.ParquetFile(bars_path).iter_batches(batch_size=chunk_size):
+            chunk = batch.to_pandas()
+            if "Date" in chunk.columns or "Datetime" in chunk.columns:
+                chunk = chunk.set_index("Date" if "Date" in chunk.columns else "Datetime")
+            chunk = _slice(chunk, start, end)
+            if not chunk.empty:
+                yield chunk
+
+    def missing(self, symbol, start, end, interval="1d"):
+        covered = self._read_coverage(symbol, interval)
+        return _missing_ranges(covered, _to_timestamp(start), _to_timestamp(end))
+
+    def update(self, symbol, start, end, interval="1d"):
+        self.update_many([symbol], start, end, interval)
+
+    def update_many(self, symbols, start, end, interval="1d", progress=None):
+        # Download only the date ranges we have not stored yet. Symbols missing
+        # the same range share a single batched download. progress(symbol,
+        # error) is called as each symbol is stored (error is None on success)
+        by_gap = {}
+        for symbol in symbols:
+            for gap in self.missing(symbol, start, end, interval):
+                for window in _request_windows(gap[0], gap[1], interval):
+                    by_gap.setdefault(window, []).append(symbol)
+        if self.fetcher is not None:
+            return self._stream(by_gap, interval, progress)
+        fetched = {}
+        for gap, gap_symbols in by_gap.items():
+            with span("download", symbols=len(gap_symbols), interval=interval):
+                bars = self.downloader(gap_symbols, gap[0], gap[1], interval)
+            for symbol in gap_symbols:
+                fetched.setdefault(symbol, []).append((gap, bars.get(symbol)))
+        with span("cache write", symbols=len(fetched)):
+            for symbol, pairs in fetched.items():
+                self.store(symbol, pairs, interval)
+                if progress is not None:
+                    progress(symbol, None if all(b is not None for _, b in pairs) else "download failed")
+
+    def _stream(self, by_gap, interval, progress):
+        # Concurrent per-symbol requests, stored in completion order
+        jobs = [((symbol, gap), symbol, gap[0], gap[1], interval)
+                for gap, gap_symbols in by_gap.items() for symbol in gap_symbols]
+        remaining = {}
+        for (symbol, _), *_ in jobs:
+            remaining[symbol] = remaining.get(symbol, 0) + 1
+        fetched = {}
+        errors = {}
+        with span("download", symbols=len(remaining), requests=len(jobs), interval=interval):
+            for (symbol, gap), bars, error in self.fetcher.iter_requests(jobs):
+                fetched.setdefault(symbol, []).append((gap, bars))
+                if error is not None:
+                    errors[symbol] = error
+                remaining[symbol] -= 1
+                if remaining[symbol]:
+                    continue
+                with span("cache write", symbol=symbol):
+                    self.store(symbol, fetched.pop(symbol), interval)
+                if progress is not None:
+                    progress(symbol, errors.get(symbol))
+
+    def store(self, symbol, fetched, interval="1d"):
+        # Merge freshly downloaded (range, bars) pairs into the cache
+        bars = self.read(symbol, interval=interval)
+        covered = self._read_coverage(symbol, interval)
+        # Today's bar is still forming, so never mark it as covered
+        today = _to_timestamp(datetime.now())
+        frames = [bars] if not bars.empty else []
+        for (gap_start, gap_end), new_bars in fetched:
+            if new_bars is not None and not new_bars.empty:
+                frames.append(new_bars[[c for c in PRICE_COLUMNS if c in new_bars.columns]])
+            # A failed download (None) is retried on the next lookup
+            if new_bars is not None and gap_start < today:
+                covered.append([gap_start, min(gap_end, today)])
+        if frames:
+            bars = pd.concat(frames)
+            bars = bars[~bars.index.duplicated(keep="last")].sort_index()
+        self._write(symbol, interval, bars, _merge_ranges(covered))
+
+    def get(self, symbol, start, end, interval="1d"):
+        if not self.offline:
+            self.update(symbol, start, end, interval)
+        return self.read(symbol, start, end, interval)
+
+    def get_many(self, symbols, start, end, interval="1d", progress=None):
+        # One cache lookup for every ticker; empty frames for unknown symbols
+        symbols = parse_symbols(symbols)
+        if not self.offline:
+            self.update_many(symbols, start, end, interval, progress)
+        with span("cache read", symbols=len(symbols)):
+            return {symbol: self.read(symbol, start, end, interval) for symbol in symbols}
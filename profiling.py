@@ -0,0 +1,196 @@
+import contextvars
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+import pandas as pd
+
+# Timing spans for the backtest pipeline. Code marks its stages with
+#   with span("download", symbols=3): ...
+# which costs nothing unless a Profiler is active:
+#   with Profiler(cprofile=True, memory=True) as profiler:
+#       result = backtest(...)
+#   profiler.spans_frame(), profiler.save("profile")
+# Spans are recorded by the thread that activated the profiler; work running
+# in process pools shows up as the span around the pool. The recording can be
+# exported as JSON or as a Chrome trace (chrome://tracing, Perfetto).
+# tracemalloc is process-wide: memory profilers share one reference-counted
+# trace, stopped by the last of them, and a profiler running alongside others
+# sees their allocations and peak resets too.
+
+_active = contextvars.ContextVar("profiler", default=None)
+
+# Memory profilers currently tracing, and whether they started tracemalloc
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_tracing_owned = False
+
+
+def _start_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        if _tracing_users == 0:
+            # Tracing started by someone else is left to them
+            _tracing_owned = not tracemalloc.is_tracing()
+            if _tracing_owned:
+                tracemalloc.start()
+        _tracing_users += 1
+
+
+def _stop_tracing():
+    global _tracing_users, _tracing_owned
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_owned:
+            tracemalloc.stop()
+            _tracing_owned = False
+
+
+def span(name, **args):
+    # Timing span in the active profiler, or a no-op
+    profiler = _active.get()
+    return profiler.span(name, **args) if profiler is not None else nullcontext()
+
+
+class Profiler:
+    def __init__(self, cprofile=False, memory=False):
+        self.cprofile = cprofile
+        self.memory = memory
+        self.spans = []
+        self.profile = None
+        self.started = None
+        self.duration = None
+        self.peak_bytes = None
+        self._stack = []
+        # Stands in for the enclosing span of top-level spans
+        self._root = {"_peak": 0}
+        self._token = None
+        self._tracing = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def start(self):
+        self._token = _active.set(self)
+        if self.memory:
+            _start_tracing()
+            self._tracing = True
+            tracemalloc.reset_peak()
+            self._root = {"_peak": 0, "_start_bytes": tracemalloc.get_traced_memory()[0]}
+        if self.cprofile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.started = time.perf_counter()
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.started
+        if self.profile is not None:
+            self.profile.disable()
+        if self.memory:
+            peak = max(self._root["_peak"], tracemalloc.get_traced_memory()[1])
+            self.peak_bytes = peak - self._root["_start_bytes"]
+        if self._tracing:
+            _stop_tracing()
+            self._tracing = False
+        if self._token is not None:
+            _active.reset(self._token)
+            self._token = None
+
+    @contextmanager
+    def span(self, name, **args):
+        record = {"name": name, "depth": len(self._stack),
+                  "parent": self._stack[-1]["name"] if self._stack else None,
+                  "thread": threading.get_ident(), "args": args}
+        if self.memory:
+            # tracemalloc has a single peak counter: fold the peak so far into
+            # the enclosing span before resetting it for this one
+            current, peak = tracemalloc.get_traced_memory()
+            parent = self._stack[-1] if self._stack else self._root
+            parent["_peak"] = max(parent["_peak"], peak)
+            tracemalloc.reset_peak()
+            record["_start_bytes"] = current
+            record["_peak"] = current
+        self._stack.append(record)
+        record["start"] = time.perf_counter() - self.started
+        try:
+            yield record
+        finally:
+            record["duration"] = time.perf_counter() - self.started - record["start"]
+            self._stack.pop()
+            if self.memory:
+                peak = max(record.pop("_peak"), tracemalloc.get_traced_memory()[1])
+                record["peak_bytes"] = peak - record.pop("_start_bytes")
+                parent = self._stack[-1] if self._stack else self._root
+                parent["_peak"] = max(parent["_peak"], peak)
+            self.spans.append(record)
+
+    def spans_frame(self):
+        # One row per span, in start order
+        spans = sorted(self.spans, key=lambda s: s["start"])
+        frame = pd.DataFrame({
+            "Stage": ["  " * s["depth"] + s["name"] for s in spans],
+            "Start (ms)": [s["start"] * 1000 for s in spans],
+            "Duration (ms)": [s["duration"] * 1000 for s in spans],
+            "Depth": [s["depth"] for s in spans],
+        })
+        if self.memory:
+            frame["Peak MB"] = [s["peak_bytes"] / 1024 ** 2 for s in spans]
+        return frame
+
+    def totals(self):
+        # Total time, call count and share of the run per span name
+        frame = pd.DataFrame({"Stage": [s["name"] for s in self.spans],
+                              "Seconds": [s["duration"] for s in self.spans]})
+        totals = frame.groupby("Stage").agg(Seconds=("Seconds", "sum"), Calls=("Seconds", "size"))
+        totals["Share"] = totals["Seconds"] / self.duration if self.duration else 0.0
+        return totals.sort_values("Seconds", ascending=False).reset_index()
+
+    def function_stats(self, limit=30, sort="cumulative"):
+        # Top functions of the cProfile capture
+        columns = ["Function", "Calls", "Total (s)", "Cumulative (s)"]
+        if self.profile is None:
+            return pd.DataFrame(columns=columns)
+        rows = [{"Function": f"{os.path.basename(filename)}:{line}({function})",
+                 "Calls": calls, "Total (s)": total, "Cumulative (s)": cumulative}
+                for (filename, line, function), (_, calls, total, cumulative, _)
+                in pstats.Stats(self.profile).stats.items()]
+        key = "Cumulative (s)" if sort == "cumulative" else "Total (s)"
+        return pd.DataFrame(rows, columns=columns).sort_values(key, ascending=False).head(limit) \
+            .reset_index(drop=True)
+
+    def to_json(self):
+        record = {"duration": self.duration, "peak_bytes": self.peak_bytes,
+                  "spans": sorted(self.spans, key=lambda s: s["start"])}
+        if self.profile is not None:
+            record["functions"] = self.function_stats(limit=100).to_dict(orient="records")
+        return record
+
+    def to_chrome_trace(self):
+        # Trace Event Format: complete ("X") events with microsecond times
+        pid = os.getpid()
+        events = [{"name": s["name"], "cat": "backtest", "ph": "X",
+                   "ts": s["start"] * 1e6, "dur": s["duration"] * 1e6,
+                   "pid": pid, "tid": s["thread"],
+                   "args": dict(s["args"], **({"peak_bytes": s["peak_bytes"]} if "peak_bytes" in s else {}))}
+                  for s in self.spans]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def save(self, directory):
+        # profile.json, trace.json and, with cProfile, profile.prof (pstats)
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "profile.json"), "w") as f:
+            json.dump(self.to_json(), f, indent=2, default=str)
+        with open(os.path.join(directory, "trace.json"), "w") as f:
+            json.dump(self.to_chrome_trace(), f, default=str)
+        if self.profile is not None:
+            self.profile.dump_stats(os.path.join(directory, "profile.prof"))
@@ -0,0 +1,95 @@
+import hashlib
+import sys
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Bounded, thread-safe LRU cache for per-symbol strategy results, shared by
+# every Streamlit session in the server process. Entries are evicted by count
+# and by approximate size, so a long-lived server never grows without bound.
+
+
+def fingerprint(frame):
+    # Content hash of a price frame, so cached results are dropped as soon as
+    # the underlying bars change
+    hashed = pd.util.hash_pandas_object(frame, index=True).values
+    return hashlib.sha1(hashed.tobytes()).hexdigest()
+
+
+def sizeof(value):
+    # Approximate memory footprint of a cached value
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(index=True, deep=True)
+        return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sum(sizeof(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(sizeof(v) for v in value)
+    return sys.getsizeof(value)
+
+
+def result_key(symbol, frame, strategy, params):
+    # (symbol, date range, strategy, parameters, data fingerprint)
+    start = frame.index[0] if len(frame) else None
+    end = frame.index[-1] if len(frame) else None
+    return (symbol, str(start), str(end), strategy,
+            tuple(sorted((name, repr(value)) for name, value in params.items())),
+            fingerprint(frame))
+
+
+class LRUCache:
+    def __init__(self, max_entries=512, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+            return default
+
+    def put(self, key, value, size=None):
+        size = sizeof(value) if size is None else size
+        with self.lock:
+            if key in self.entries:
+                self.bytes -= self.entries.pop(key)[1]
+            # Values bigger than the whole budget are not worth keeping
+            if size > self.max_bytes:
+                return
+            self.entries[key] = (value, size)
+            self.bytes += size
+            while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / lookups if lookups else 0.0,
+                    "entries": len(self.entries),
+                    "bytes": self.bytes,
+                    "evictions": self.evictions}
@@ -0,0 +1,300 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+import pandas as pd
+
+from backtest import BacktestResult
+
+# Local store of backtest results, so runs survive page reruns and can be
+# queried and compared without backtesting again. No server, only files:
+#   root/runs/<run>/   the full result tables of a run (BacktestResult.save)
+#   root/index/*.parquet
+#                      one row per (run, ticker) with the run's config and
+#                      the ticker's earnings, returns and signal counts
+# A run's id is a hash of its config (strategy, parameters, capital, tickers,
+# dates and interval), so saving the same config again replaces it. Every
+# save appends a small index file; once there are many they are compacted
+# into one file sorted by strategy and ticker. The index is read once and
+# kept in memory until the files change, so queries over thousands of runs
+# are pandas group-bys on one frame.
+
+DEFAULT_RESULTS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), ".results_store")
+
+INDEX_COLUMNS = ["Run", "Created", "Strategy", "Params", "Capital", "Start", "End", "Interval",
+                 "Detail", "Symbol", "Earnings", "Investment", "Returns", "Buy", "Sell"]
+
+# Index files appended before they are compacted into one
+COMPACT_AFTER = 64
+
+# A compaction lock older than this was left by a crashed process
+STALE_LOCK_SECONDS = 300
+
+
+def run_config(strategy, params, capital, symbols, start=None, end=None, interval="1d"):
+    return {"strategy": strategy, "params": dict(params), "capital": float(capital),
+            "symbols": list(symbols), "start": None if start is None else str(start),
+            "end": None if end is None else str(end), "interval": interval}
+
+
+def run_id(config):
+    return hashlib.sha1(json.dumps(config, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _params_json(params):
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+class ResultsStore:
+    def __init__(self, root=DEFAULT_RESULTS_DIR):
+        self.root = root
+        self.index_dir = os.path.join(root, "index")
+        self.runs_dir = os.path.join(root, "runs")
+        self.lock = threading.Lock()
+        # (file signature, index frame) of the last read
+        self._index = None
+
+    def save(self, result, start=None, end=None, interval="1d"):
+        # Store a BacktestResult with all its tables; returns its run id
+        config = run_config(result.strategy, result.params, result.capital, result.symbols,
+                            start, end, interval)
+        run = run_id(config)
+        result.save(os.path.join(self.runs_dir, run))
+        rows = result.summary.merge(result.counts, on="Symbol", how="left")
+        self._append(self._index_rows(run, config, rows, detail=True))
+        return run
+
+    def save_sweep(self, results, strategy, investment, symbols, start=None, end=None,
+                   interval="1d"):
+        # Store every parameter combination of a sweep (sweep.run_sweep's
+        # per-ticker results) as a run of its own; only the index rows are
+        # kept, as a sweep records no orders. Returns the run ids
+        param_names = [column for column in results.columns
+                       if column not in ("Symbol", "Earnings", "Trades", "Returns")]
+        capital = investment * len(symbols)
+        combos = results[param_names].drop_duplicates().reset_index(drop=True)
+        runs, params_json = [], []
+        for values in combos.itertuples(index=False, name=None):
+            params = {name: value.item() if hasattr(value, "item") else value
+                      for name, value in zip(param_names, values)}
+            runs.append(run_id(run_config(strategy, params, capital, symbols, start, end, interval)))
+            params_json.append(_params_json(params))
+        if not runs:
+            return []
+        combos["Run"], combos["Params"] = runs, params_json
+        rows = results.merge(combos, on=param_names, how="left") if param_names else \
+            results.assign(Run=runs[0], Params=params_json[0])
+        config = run_config(strategy, {}, capital, symbols, start, end, interval)
+        index = self._index_rows(None, config, pd.DataFrame({
+            "Symbol": rows["Symbol"], "Earnings": rows["Earnings"], "Investment": float(investment),
+            "Returns": rows["Returns"], "Buy": float("nan"), "Sell": rows["Trades"]}), detail=False)
+        index["Run"], index["Params"] = rows["Run"].to_numpy(), rows["Params"].to_numpy()
+        self._append(index)
+        return runs
+
+    def _index_rows(self, run, config, rows, detail):
+        rows = rows.reset_index(drop=True)
+        return pd.DataFrame({
+            "Run": run,
+            "Created": pd.Timestamp.now(tz="UTC"),
+            "Strategy": config["strategy"],
+            "Params": _params_json(config["params"]),
+            "Capital": config["capital"],
+            "Start": config["start"],
+            "End": config["end"],
+            "Interval": config["interval"],
+            "Detail": detail,
+            "Symbol": rows["Symbol"].astype(str),
+            "Earnings": rows["Earnings"].astype(float),
+            "Investment": rows["Investment"].astype(float),
+            "Returns": rows["Returns"].astype(float),
+            "Buy": rows["Buy"].astype(float),
+            "Sell": rows["Sell"].astype(float),
+        }, columns=INDEX_COLUMNS)
+
+    def _files(self):
+        if not os.path.isdir(self.index_dir):
+            return []
+        return sorted(os.path.join(self.index_dir, name) for name in os.listdir(self.index_dir)
+                      if name.endswith(".parquet"))
+
+    def _append(self, rows):
+        os.makedirs(self.index_dir, exist_ok=True)
+        path = os.path.join(self.index_dir, f"part-{time.time_ns()}-{uuid.uuid4().hex[:8]}.parquet")
+        rows.to_parquet(path + ".tmp", index=False)
+        os.replace(path + ".tmp", path)
+        if sum(os.path.basename(f).startswith("part-") for f in self._files()) > COMPACT_AFTER:
+            self.compact()
+
+    def compact(self):
+        # Merge every index file into one, sorted by strategy and ticker. One
+        # compaction at a time, across threads (the lock) and processes (a
+        # lock file); a second one finding it taken leaves the files as they are
+        with self.lock:
+            lock_path = os.path.join(self.index_dir, "compact.lock")
+            if not self._lock_file(lock_path):
+                return
+            try:
+                files = self._files()
+                if len(files) < 2:
+                    return
+                index = self._read(files).sort_values(["Strategy", "Symbol", "Created"],
+                                                      kind="mergesort")
+                path = os.path.join(self.index_dir, f"index-{time.time_ns()}.parquet")
+                index.to_parquet(path + ".tmp", index=False)
+                os.replace(path + ".tmp", path)
+                for f in files:
+                    try:
+                        os.remove(f)
+                    except FileNotFoundError:
+                        pass
+            finally:
+                os.remove(lock_path)
+
+    def _lock_file(self, path):
+        os.makedirs(self.index_dir, exist_ok=True)
+        try:
+            if time.time() - os.path.getmtime(path) > STALE_LOCK_SECONDS:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        return True
+
+    def _read(self, files):
+        frames = []
+        for f in files:
+            try:
+                frames.append(pd.read_parquet(f))
+            except FileNotFoundError:
+                continue
+        if not frames:
+            return pd.DataFrame(columns=INDEX_COLUMNS)
+        index = pd.concat(frames, ignore_index=True).sort_values("Created", kind="mergesort")
+        # A run saved again replaces its earlier rows; the same rows read from
+        # two files (a compacted file and a part it replaced) are kept once
+        latest = index.groupby("Run")["Created"].transform("max")
+        index = index[index["Created"] == latest]
+        return index.drop_duplicates(["Run", "Symbol"], keep="last").reset_index(drop=True)
+
+    def index(self):
+        # Every (run, ticker) row, re-read only when the index files changed
+        files = self._files()
+        signature = tuple((f, os.path.getmtime(f)) for f in files if os.path.exists(f))
+        with self.lock:
+            if self._index is None or self._index[0] != signature:
+                self._index = (signature, self._read(files))
+            return self._index[1]
+
+    def runs(self, strategy=None, symbol=None):
+        # One row per run, newest first, with its total earnings and return
+        index = self.index()
+        if strategy is not None:
+            index = index[index["Strategy"] == strategy]
+        if symbol is not None:
+            index = index[index["Run"].isin(index.loc[index["Symbol"] == symbol, "Run"])]
+        runs = (index.groupby("Run", sort=False)
+                .agg(Created=("Created", "max"), Strategy=("Strategy", "first"),
+                     Params=("Params", "first"), Capital=("Capital", "first"),
+                     Start=("Start", "first"), End=("End", "first"),
+                     Interval=("Interval", "first"), Detail=("Detail", "first"),
+                     Symbols=("Symbol", "count"), Earnings=("Earnings", "sum"))
+                .reset_index())
+        runs["Returns"] = runs["Earnings"] / runs["Capital"] * 100
+        return runs.sort_values("Created", ascending=False, kind="mergesort").reset_index(drop=True)
+
+    def best_params(self, strategy, metric="Returns", interval=None):
+        # Best run of a strategy for every ticker, with its parameters as columns
+        index = self.index()
+        index = index[index["Strategy"] == strategy]
+        if interval is not None:
+            index = index[index["Interval"] == interval]
+        if index.empty:
+            return pd.DataFrame(columns=["Symbol", metric, "Run"])
+        best = index.loc[index.groupby("Symbol")[metric].idxmax()].reset_index(drop=True)
+        params = pd.DataFrame([json.loads(text) for text in best["Params"]], index=best.index)
+        columns = ["Symbol"] + list(params.columns) + ["Returns", "Earnings", "Sell", "Start",
+                                                       "End", "Interval", "Run"]
+        best = pd.concat([best.drop(columns="Params"), params], axis=1)
+        return best[list(dict.fromkeys(columns))].rename(columns={"Sell": "Trades"})
+
+    def compare(self, run_a, run_b):
+        # Two runs ticker by ticker, with the difference of their results
+        index = self.index()
+        a = index[index["Run"] == run_a].set_index("Symbol")
+        b = index[index["Run"] == run_b].set_index("Symbol")
+        for run, rows in ((run_a, a), (run_b, b)):
+            if rows.empty:
+                raise KeyError(f"No stored run '{run}'")
+        columns = ["Earnings", "Returns", "Buy", "Sell"]
+        table = a[columns].join(b[columns], how="outer", lsuffix=" (A)", rsuffix=" (B)")
+        table["Earnings Difference"] = table["Earnings (B)"] - table["Earnings (A)"]
+        table["Returns Difference"] = table["Returns (B)"] - table["Returns (A)"]
+        return table.reset_index()
+
+    def config(self, run):
+        rows = self.index()
+        rows = rows[rows["Run"] == run]
+        if rows.empty:
+            raise KeyError(f"No stored run '{run}'")
+        row = rows.iloc[0]
+        return {"run": run, "strategy": row["Strategy"], "params": json.loads(row["Params"]),
+                "capital": row["Capital"], "symbols": list(rows["Symbol"]), "start": row["Start"],
+                "end": row["End"], "interval": row["Interval"]}
+
+    def load(self, run):
+        # The stored BacktestResult of a run (without its signal frames)
+        directory = os.path.join(self.runs_dir, run)
+        if not os.path.exists(os.path.join(directory, "result.json")):
+            raise KeyError(f"Only the summary of run '{run}' is stored")
+        with open(os.path.join(directory, "result.json"), "r") as f:
+            saved = json.load(f)
+        result = BacktestResult(saved["strategy"], saved["params"], saved["capital"],
+                                saved["symbols"])
+        result.errors = saved["errors"]
+        for name in ("summary", "counts", "orders", "treasury"):
+            setattr(result, name, pd.read_parquet(os.path.join(directory, f"{name}.parquet")))
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the stored backtest results.")
+    parser.add_argument("--root", default=DEFAULT_RESULTS_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    runs = commands.add_parser("runs", help="List the stored runs, newest first.")
+    runs.add_argument("--strategy")
+    runs.add_argument("--symbol")
+    runs.add_argument("--limit", type=int, default=50)
+    best = commands.add_parser("best", help="Best parameters of a strategy for every ticker.")
+    best.add_argument("strategy")
+    best.add_argument("--metric", default="Returns")
+    best.add_argument("--interval")
+    compare = commands.add_parser("compare", help="Compare two runs ticker by ticker.")
+    compare.add_argument("run_a")
+    compare.add_argument("run_b")
+    commands.add_parser("compact", help="Merge the index files into one.")
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.root)
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        if args.command == "runs":
+            print(store.runs(args.strategy, args.symbol).head(args.limit).to_string(index=False))
+        elif args.command == "best":
+            print(store.best_params(args.strategy, args.metric, args.interval).to_string(index=False))
+        elif args.command == "compare":
+            print(store.compare(args.run_a, args.run_b).to_string(index=False))
+        else:
+            store.compact()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,169 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from analytics import drawdown, equity_curve, period_returns, periods_per_year, sharpe_ratio, symbol_arrays
+
+# Monte Carlo robustness of a backtest: how much of the result is luck?
+# The run is turned into arrays once, then resampled thousands of times:
+#   block_bootstrap  the portfolio's per-bar P&L, resampled in blocks of
+#                    consecutive bars (circular block bootstrap), which keeps
+#                    the short-term autocorrelation of the returns
+#   trade_bootstrap  the closed trades, drawn with replacement
+#   trade_shuffle    the closed trades in a random order; the total is the
+#                    same, only the path (drawdown, Sharpe) changes
+#   entry_delay      every entry filled 0..max_delay bars late, at that bar's
+#                    close, with the exit unchanged
+# Every batch of resamples is one index matrix (resamples x steps), so a
+# whole batch is gathered, cumulated and scored with array operations, and
+# batches run on a process pool. Each batch gets its own seed from one
+# SeedSequence, so a run is reproducible for a given seed whatever the
+# number of workers.
+
+METHODS = ["block_bootstrap", "trade_bootstrap", "trade_shuffle", "entry_delay"]
+
+METRICS = ["Return (%)", "Max Drawdown (%)", "Sharpe"]
+
+BATCH_SIZE = 1000
+
+
+def path_metrics(pnl, capital, periods_per_year):
+    # pnl: resamples x steps money P&L -> total return and max drawdown in
+    # percent and annualized Sharpe ratio of every path
+    pnl = np.atleast_2d(np.asarray(pnl, dtype=float))
+    equity = equity_curve(pnl, capital, axis=1)
+    total = equity[:, -1] / capital - 1 if pnl.shape[1] else np.zeros(len(pnl))
+    return {"Return (%)": total * 100,
+            "Max Drawdown (%)": drawdown(equity, capital, axis=1).max(axis=1, initial=0) * 100,
+            "Sharpe": sharpe_ratio(period_returns(pnl, capital, axis=1), periods_per_year, axis=1)}
+
+
+def robustness_inputs(result):
+    # Arrays of a daily BacktestResult: the portfolio's per-bar P&L (closed
+    # trades marked to market, so it sums to total_earnings) and every closed
+    # trade, ordered by exit. Prices of all symbols are concatenated so trades
+    # of different symbols can be gathered in one go
+    investment = result.capital / len(result.symbols) if result.symbols else 0.0
+    bar_pnl = []
+    closes = []
+    entries, exits, exit_times, earnings = [], [], [], []
+    offset = 0
+    for symbol, trades in result.trades.items():
+        frame = result.signals[symbol]
+        close = frame['Close'].to_numpy(dtype=float)
+        n_closed = trades["sell_count"]
+        entry = trades["entry_index"][:n_closed]
+        exit_ = trades["exit_index"][:n_closed]
+        pnl, _ = symbol_arrays(close, trades)
+        bar_pnl.append(pd.Series(pnl, index=frame.index))
+        closes.append(close)
+        entries.append(entry + offset)
+        exits.append(exit_ + offset)
+        exit_times.append(frame.index[exit_].asi8 if n_closed else np.zeros(0, dtype=np.int64))
+        earnings.append(trades["earnings"][:n_closed])
+        offset += len(close)
+    if not bar_pnl:
+        raise ValueError("The backtest has no trades to resample")
+    portfolio = pd.concat(bar_pnl).groupby(level=0).sum().sort_index()
+    order = np.argsort(np.concatenate(exit_times), kind="stable")
+    bars_per_year = periods_per_year(portfolio.index)
+    years = len(portfolio) / bars_per_year
+    return {
+        "bar_pnl": portfolio.to_numpy(),
+        "bars_per_year": bars_per_year,
+        "close": np.concatenate(closes),
+        "entry": np.concatenate(entries)[order],
+        "exit": np.concatenate(exits)[order],
+        "earnings": np.concatenate(earnings)[order],
+        "trades_per_year": len(order) / years,
+        "investment": investment,
+    }
+
+
+def resample_pnl(method, inputs, n, rng, block_length=20, max_delay=5):
+    # n resampled P&L paths (n x steps) and the steps per year
+    if method == "block_bootstrap":
+        pnl = inputs["bar_pnl"]
+        length = len(pnl)
+        block_length = max(1, min(int(block_length), length))
+        n_blocks = -(-length // block_length)
+        starts = rng.integers(0, length, (n, n_blocks))
+        index = (starts[:, :, None] + np.arange(block_length)) % length
+        return pnl[index.reshape(n, -1)[:, :length]], inputs["bars_per_year"]
+    earnings = inputs["earnings"]
+    if method == "trade_bootstrap":
+        return earnings[rng.integers(0, len(earnings), (n, len(earnings)))], inputs["trades_per_year"]
+    if method == "trade_shuffle":
+        return rng.permuted(np.broadcast_to(earnings, (n, len(earnings))), axis=1), inputs["trades_per_year"]
+    if method == "entry_delay":
+        close, exit_ = inputs["close"], inputs["exit"]
+        entry = inputs["entry"] + rng.integers(0, int(max_delay) + 1, (n, len(earnings)))
+        # A trade whose delayed entry reaches its exit is never opened
+        opened = entry < exit_
+        entry_price = close[np.minimum(entry, exit_)]
+        shares = np.floor_divide(inputs["investment"], entry_price)
+        return np.where(opened, shares * (close[exit_] - entry_price), 0.0), inputs["trades_per_year"]
+    raise ValueError(f"Unknown method '{method}', expected one of {', '.join(METHODS)}")
+
+
+def _resample_batch(task):
+    # Worker: metrics of one batch of resamples
+    method, inputs, capital, n, seed, options = task
+    rng = np.random.default_rng(seed)
+    pnl, periods_per_year = resample_pnl(method, inputs, n, rng, **options)
+    return path_metrics(pnl, capital, periods_per_year)
+
+
+class RobustnessResult:
+    def __init__(self, method, actual, samples):
+        self.method = method
+        # Metrics of the backtest itself
+        self.actual = actual
+        # One row of metrics per resample
+        self.samples = samples
+
+    @property
+    def probability_of_loss(self):
+        return float((self.samples["Return (%)"] < 0).mean())
+
+    def summary(self):
+        # Actual value, mean and percentiles of every metric
+        quantiles = self.samples.quantile([0.05, 0.25, 0.5, 0.75, 0.95])
+        table = pd.DataFrame({"Actual": pd.Series(self.actual), "Mean": self.samples.mean()})
+        for q, label in zip(quantiles.index, ["5%", "25%", "Median", "75%", "95%"]):
+            table[label] = quantiles.loc[q]
+        return table.loc[METRICS].rename_axis("Metric").reset_index()
+
+
+def robustness(result, method="block_bootstrap", n_resamples=10000, block_length=20, max_delay=5,
+               seed=0, workers=None):
+    # Resample a daily BacktestResult n_resamples times
+    if method not in METHODS:
+        raise ValueError(f"Unknown method '{method}', expected one of {', '.join(METHODS)}")
+    inputs = robustness_inputs(result)
+    options = {"block_length": block_length, "max_delay": max_delay}
+    # The bootstrap resamples bars, the other methods resample trades
+    if method == "block_bootstrap":
+        actual_pnl, periods_per_year = inputs["bar_pnl"], inputs["bars_per_year"]
+    else:
+        actual_pnl, periods_per_year = inputs["earnings"], inputs["trades_per_year"]
+    actual = {name: float(values[0])
+              for name, values in path_metrics(actual_pnl, result.capital, periods_per_year).items()}
+
+    sizes = [BATCH_SIZE] * (n_resamples // BATCH_SIZE)
+    if n_resamples % BATCH_SIZE:
+        sizes.append(n_resamples % BATCH_SIZE)
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = [(method, inputs, result.capital, size, batch_seed, options)
+             for size, batch_seed in zip(sizes, seeds)]
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            batches = list(executor.map(_resample_batch, tasks))
+    else:
+        batches = [_resample_batch(task) for task in tasks]
+    samples = pd.DataFrame({name: np.concatenate([batch[name] for batch in batches])
+                            for name in METRICS})
+    return RobustnessResult(method, actual, samples)
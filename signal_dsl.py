@@ -0,0 +1,285 @@
+import ast
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from ta.momentum import RSIIndicator
+
+# A small expression language for Buy/Sell rules, e.g.
+#   cross_above(sma(close, short_window), sma(close, long_window))
+#   rsi(close, 14) < 30 and close > sma(close, 200)
+# Expressions are parsed with the ast module (only the constructs below are
+# accepted, nothing is ever eval'd) into nested tuples such as
+#   ("sma", ("column", "close"), 10)
+# Equal subexpressions are equal tuples, so they are computed once per ticker:
+# every value is memoized in the ticker's IndicatorCache under its tuple, and a
+# SignalGraph compiles several strategies into one set of unique nodes.
+
+COLUMNS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+# Function name -> argument kinds; a window must be a positive whole number
+FUNCTIONS = {
+    "sma": ("series", "window"),
+    "std": ("series", "window"),
+    "rsi": ("series", "window"),
+    "highest": ("series", "window"),
+    "lowest": ("series", "window"),
+    "shift": ("series", "window"),
+    "abs": ("series",),
+    "cross_above": ("series", "series"),
+    "cross_below": ("series", "series"),
+}
+
+BINARY_OPERATORS = {ast.Add: "add", ast.Sub: "sub", ast.Mult: "mul", ast.Div: "div",
+                    ast.BitAnd: "and", ast.BitOr: "or"}
+COMPARISONS = {ast.Lt: "lt", ast.LtE: "le", ast.Gt: "gt", ast.GtE: "ge"}
+
+
+class SignalSyntaxError(ValueError):
+    pass
+
+
+class IndicatorCache:
+    # Per-ticker memo of indicator series and expression values. With
+    # features (a feature_store.FeatureView), indicators are read from and
+    # added to the process-wide feature store
+    def __init__(self, close, columns=None, features=None):
+        self.close = pd.Series(np.asarray(close, dtype=float))
+        # Other price columns (Open, High, ...) used by expressions
+        self.columns = {} if columns is None else columns
+        self.features = features
+        self.values = {}
+
+    def _get(self, key, compute):
+        if key not in self.values:
+            self.values[key] = compute() if self.features is None else self.features.get(key, compute)
+        return self.values[key]
+
+    def sma(self, window):
+        return self._get(("sma", window),
+                         lambda: self.close.rolling(window=window).mean().to_numpy())
+
+    def std(self, window):
+        # Population standard deviation, as used by ta's BollingerBands
+        return self._get(("std", window),
+                         lambda: self.close.rolling(window=window).std(ddof=0).to_numpy())
+
+    def rsi(self, period):
+        return self._get(("rsi", period),
+                         lambda: RSIIndicator(self.close, period).rsi().to_numpy())
+
+    def column(self, name):
+        if name == "close":
+            return self.close.to_numpy()
+        if COLUMNS[name] not in self.columns:
+            raise KeyError(f"Price column '{COLUMNS[name]}' is not available")
+        return np.asarray(self.columns[COLUMNS[name]], dtype=float)
+
+
+def parse(expression, params=None):
+    # Expression string -> node tuple. Names other than the price columns are
+    # looked up in params and become constants
+    params = dict(params or {})
+    return _compile(expression, tuple(sorted(params.items())))
+
+
+@lru_cache(maxsize=4096)
+def _compile(expression, params):
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise SignalSyntaxError(f"Invalid signal expression '{expression}': {e.msg}") from None
+    return _node(tree.body, dict(params), expression)
+
+
+def _node(tree, params, expression):
+    def fail(message):
+        raise SignalSyntaxError(f"{message} in '{expression}'")
+
+    if isinstance(tree, ast.Constant) and isinstance(tree.value, (int, float)) \
+            and not isinstance(tree.value, bool):
+        return ("const", float(tree.value))
+    if isinstance(tree, ast.Name):
+        if tree.id in COLUMNS:
+            return ("column", tree.id)
+        if tree.id in params:
+            return ("const", float(params[tree.id]))
+        fail(f"Unknown name '{tree.id}'")
+    if isinstance(tree, ast.UnaryOp):
+        operand = _node(tree.operand, params, expression)
+        if isinstance(tree.op, ast.USub):
+            return ("neg", operand)
+        if isinstance(tree.op, (ast.Not, ast.Invert)):
+            return ("not", operand)
+        if isinstance(tree.op, ast.UAdd):
+            return operand
+    if isinstance(tree, ast.BinOp) and type(tree.op) in BINARY_OPERATORS:
+        return (BINARY_OPERATORS[type(tree.op)],
+                _node(tree.left, params, expression), _node(tree.right, params, expression))
+    if isinstance(tree, ast.BoolOp):
+        operator = "and" if isinstance(tree.op, ast.And) else "or"
+        nodes = [_node(value, params, expression) for value in tree.values]
+        node = nodes[0]
+        for other in nodes[1:]:
+            node = (operator, node, other)
+        return node
+    if isinstance(tree, ast.Compare):
+        # a < b < c means a < b and b < c
+        operands = [_node(tree.left, params, expression)] + \
+                   [_node(value, params, expression) for value in tree.comparators]
+        node = None
+        for operator, left, right in zip(tree.ops, operands, operands[1:]):
+            if type(operator) not in COMPARISONS:
+                fail("Only <, <=, > and >= comparisons are supported")
+            comparison = (COMPARISONS[type(operator)], left, right)
+            node = comparison if node is None else ("and", node, comparison)
+        return node
+    if isinstance(tree, ast.Call) and isinstance(tree.func, ast.Name) and not tree.keywords:
+        name = tree.func.id
+        if name not in FUNCTIONS:
+            fail(f"Unknown function '{name}'")
+        kinds = FUNCTIONS[name]
+        if len(tree.args) != len(kinds):
+            fail(f"{name}() takes {len(kinds)} arguments")
+        args = []
+        for kind, arg in zip(kinds, tree.args):
+            node = _node(arg, params, expression)
+            if kind == "window":
+                if node[0] != "const" or node[1] < 1 or node[1] != int(node[1]):
+                    fail(f"The window of {name}() must be a positive whole number")
+                node = int(node[1])
+            args.append(node)
+        return (name,) + tuple(args)
+    fail(f"Unsupported expression '{ast.dump(tree)}'")
+
+
+def _shift(values, periods=1):
+    shifted = np.empty_like(values, dtype=float)
+    shifted[:periods] = np.nan
+    shifted[periods:] = values[:len(values) - periods]
+    return shifted
+
+
+def children(node):
+    # Sub-nodes of a node, leaving out window numbers
+    return [arg for arg in node[1:] if isinstance(arg, tuple)]
+
+
+def evaluate(node, cache):
+    # Value of a node for one ticker, memoized in the cache
+    if node in cache.values:
+        return cache.values[node]
+    op = node[0]
+    args = [evaluate(arg, cache) if isinstance(arg, tuple) else arg for arg in node[1:]]
+    on_close = len(node) > 1 and node[1] == ("column", "close")
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if op == "const":
+            value = node[1]
+        elif op == "column":
+            value = cache.column(node[1])
+        # Indicators of the closing price share the cache's own entries
+        elif op in ("sma", "std", "rsi") and on_close:
+            value = getattr(cache, op)(node[2])
+        elif op == "sma":
+            value = pd.Series(args[0]).rolling(window=args[1]).mean().to_numpy()
+        elif op == "std":
+            value = pd.Series(args[0]).rolling(window=args[1]).std(ddof=0).to_numpy()
+        elif op == "rsi":
+            value = RSIIndicator(pd.Series(args[0]), args[1]).rsi().to_numpy()
+        elif op == "highest":
+            value = pd.Series(args[0]).rolling(window=args[1]).max().to_numpy()
+        elif op == "lowest":
+            value = pd.Series(args[0]).rolling(window=args[1]).min().to_numpy()
+        elif op == "shift":
+            value = _shift(np.asarray(args[0], dtype=float), args[1])
+        elif op == "abs":
+            value = np.abs(args[0])
+        elif op == "cross_above":
+            a, b = args
+            value = (a > b) & (_shift(a) <= _shift(b))
+        elif op == "cross_below":
+            a, b = args
+            value = (a < b) & (_shift(a) >= _shift(b))
+        elif op == "neg":
+            value = -args[0]
+        elif op == "not":
+            value = ~np.asarray(args[0], dtype=bool)
+        elif op == "add":
+            value = args[0] + args[1]
+        elif op == "sub":
+            value = args[0] - args[1]
+        elif op == "mul":
+            value = args[0] * args[1]
+        elif op == "div":
+            value = args[0] / args[1]
+        elif op == "and":
+            value = np.asarray(args[0], dtype=bool) & np.asarray(args[1], dtype=bool)
+        elif op == "or":
+            value = np.asarray(args[0], dtype=bool) | np.asarray(args[1], dtype=bool)
+        elif op == "lt":
+            value = args[0] < args[1]
+        elif op == "le":
+            value = args[0] <= args[1]
+        elif op == "gt":
+            value = args[0] > args[1]
+        elif op == "ge":
+            value = args[0] >= args[1]
+        else:
+            raise SignalSyntaxError(f"Unknown node '{op}'")
+    cache.values[node] = value
+    return value
+
+
+def evaluate_signal(node, cache):
+    # Boolean array with one value per bar
+    value = evaluate(node, cache)
+    return np.broadcast_to(np.asarray(value, dtype=bool), (len(cache.close),)).copy()
+
+
+def lookback(node):
+    # Bars before the current one an expression needs, ignoring the RSI's
+    # exponential memory (its state has to be carried separately)
+    if not isinstance(node, tuple) or node[0] in ("const", "column"):
+        return 0
+    inner = max((lookback(child) for child in children(node)), default=0)
+    if node[0] in ("sma", "std", "highest", "lowest"):
+        return inner + node[2] - 1
+    if node[0] == "shift":
+        return inner + node[2]
+    if node[0] in ("cross_above", "cross_below"):
+        return inner + 1
+    return inner
+
+
+def walk(node):
+    # Every node of an expression, children before their parents
+    for child in children(node):
+        yield from walk(child)
+    yield node
+
+
+class SignalGraph:
+    # Several (buy, sell) expression pairs compiled into one set of unique
+    # nodes, so strategies run together share their common subexpressions
+    def __init__(self):
+        self.nodes = {}
+        self.outputs = []
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, buy, sell, params=None):
+        # Add a pair of expressions (strings or parsed nodes); returns its position
+        pair = tuple(parse(e, params) if isinstance(e, str) else e for e in (buy, sell))
+        for node in pair:
+            for part in walk(node):
+                self.nodes.setdefault(part, None)
+        self.outputs.append(pair)
+        return len(self.outputs) - 1
+
+    def evaluate(self, cache):
+        # [(buy, sell)] of every added pair, computing each node once
+        for node in self.nodes:
+            evaluate(node, cache)
+        return [(evaluate_signal(buy, cache), evaluate_signal(sell, cache))
+                for buy, sell in self.outputs]
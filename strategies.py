@@ -1,8 +1,12 @@
+from collections import OrderedDict
+
 import pandas as pd
 import numpy as np
 from ta.momentum import RSIIndicator
 from ta.volatility import BollingerBands
 
+from signal_dsl import IndicatorCache, evaluate_signal, lookback, parse
+
 def moving_average_strategy(df, short_window=10, long_window=30):
     # Calculate the moving averages
     df['Short_MA'] = df['Close'].rolling(window=short_window).mean()
@@ -30,3 +34,139 @@ def bollinger_bands_strategy(df, window=20, num_of_std=2):
     # Generate buy and sell signals
     df['Buy'] = (df['Close'] < df['Lower_BB'])
     df['Sell'] = (df['Close'] > df['Upper_BB'])
+
+
+INVESTMENT_STRATEGIES = OrderedDict([
+    ("Moving Average Crossover", moving_average_strategy),
+    ("Momentum", momentum_strategy),
+    ("Bollinger Bands", bollinger_bands_strategy),
+])
+
+
+class Parameter:
+    # Schema of one strategy parameter, used to validate values and to build
+    # the sidebar inputs. sweep is the default (start, stop, step) range
+    def __init__(self, kind, default, minimum=None, step=None, label=None, help=None, sweep=None):
+        self.kind = kind
+        self.default = kind(default)
+        self.minimum = None if minimum is None else kind(minimum)
+        self.step = kind(step if step is not None else 1)
+        self.label = label
+        self.help = help
+        self.sweep = sweep or (self.default, self.default, self.step)
+
+    def validate(self, name, value):
+        value = self.kind(value)
+        if self.minimum is not None and value < self.minimum:
+            raise ValueError(f"Parameter '{name}' must be at least {self.minimum}")
+        return value
+
+
+class Strategy:
+    # A strategy declared as Buy and Sell expressions of the signal language
+    # (see signal_dsl.py) plus the schema of its parameters. constraint(params)
+    # optionally tells which combinations of valid values make sense together;
+    # sweeps skip the others
+    def __init__(self, name, buy, sell, parameters, description="", constraint=None):
+        self.name = name
+        self.buy = buy
+        self.sell = sell
+        self.parameters = OrderedDict(parameters)
+        self.description = description
+        self.constraint = constraint
+        # Fail on registration rather than in the middle of a backtest
+        self.compile()
+
+    def defaults(self):
+        return {name: parameter.default for name, parameter in self.parameters.items()}
+
+    def validate(self, params=None):
+        # Defaults filled in, values converted and checked against the schema
+        params = dict(self.defaults(), **(params or {}))
+        unknown = set(params) - set(self.parameters)
+        if unknown:
+            raise ValueError(f"Unknown parameters for '{self.name}': " + ", ".join(sorted(unknown)))
+        return {name: self.parameters[name].validate(name, value) for name, value in params.items()}
+
+    def valid(self, params=None):
+        # Whether a combination of parameter values passes the constraint
+        return self.constraint is None or bool(self.constraint(self.validate(params)))
+
+    def compile(self, params=None):
+        # (buy node, sell node) for one set of parameter values
+        params = self.validate(params)
+        return parse(self.buy, params), parse(self.sell, params)
+
+    def lookback(self, params=None):
+        return max(lookback(node) for node in self.compile(params))
+
+    def signals(self, cache, **params):
+        # Buy and sell arrays for one ticker's IndicatorCache
+        buy, sell = self.compile(params)
+        return evaluate_signal(buy, cache), evaluate_signal(sell, cache)
+
+    def apply(self, df, features=None, **params):
+        # Same calling convention as the functions above: adds Buy and Sell
+        # columns to the frame. features: see IndicatorCache
+        cache = IndicatorCache(df['Close'].values, df, features)
+        df['Buy'], df['Sell'] = self.signals(cache, **params)
+
+
+STRATEGY_REGISTRY = OrderedDict()
+
+
+def short_below_long(params):
+    # A crossover of a moving average with a shorter one never fires sensibly
+    return params["short_window"] < params["long_window"]
+
+
+def register_strategy(strategy, function=None):
+    # Make a strategy available to the app, the command line and the sweeps.
+    # function optionally replaces strategy.apply in backtests
+    STRATEGY_REGISTRY[strategy.name] = strategy
+    INVESTMENT_STRATEGIES[strategy.name] = function or strategy.apply
+    return strategy
+
+
+register_strategy(Strategy(
+    "Moving Average Crossover",
+    buy="cross_above(sma(close, short_window), sma(close, long_window))",
+    sell="cross_below(sma(close, short_window), sma(close, long_window))",
+    parameters={
+        "short_window": Parameter(int, 10, minimum=1, label="Short moving average window:",
+                                  help="The number of bars to calculate the short moving average.",
+                                  sweep=(10, 50, 5)),
+        "long_window": Parameter(int, 30, minimum=1, label="Long moving average window:",
+                                 help="The number of bars to calculate the long moving average.",
+                                 sweep=(50, 200, 10)),
+    }, constraint=short_below_long), moving_average_strategy)
+
+register_strategy(Strategy(
+    "Momentum",
+    buy="rsi(close, rsi_period) < rsi_min",
+    sell="rsi(close, rsi_period) > rsi_max",
+    parameters={
+        "rsi_period": Parameter(int, 14, minimum=1, label="Momentum window:",
+                                help="The number of bars to calculate the RSI.",
+                                sweep=(14, 14, 1)),
+        "rsi_min": Parameter(float, 30, minimum=0, step=0.1, label="Minimum RSI value:",
+                             help="The RSI is a measure of the change in price over a period of time. A normal minimum value for a stock is 30 or less. For ETFs and index, use a value of 45 or 35.",
+                             sweep=(20.0, 40.0, 5.0)),
+        "rsi_max": Parameter(float, 70, minimum=0, step=0.1, label="Maximum RSI value:",
+                             help="The RSI is a measure of the change in price over a period of time. A normal maximum value for a stock is 70 or more. For ETFs and index, use a value of 55 or 60.",
+                             sweep=(60.0, 80.0, 5.0)),
+    }), momentum_strategy)
+
+register_strategy(Strategy(
+    "Bollinger Bands",
+    buy="close < sma(close, window) - num_of_std * std(close, window)",
+    sell="close > sma(close, window) + num_of_std * std(close, window)",
+    parameters={
+        "window": Parameter(int, 20, minimum=1, label="Bollinger Bands window:",
+                            help="The number of bars to calculate the Bollinger Bands.",
+                            sweep=(10, 40, 5)),
+        "num_of_std": Parameter(float, 2, minimum=0.1, step=0.1,
+                                label="Bollinger Bands n standard deviations:",
+                                help="The number of standard deviations for the Bollinger Bands.",
+                                sweep=(1.0, 3.0, 0.5)),
+    }), bollinger_bands_strategy)
@@ -0,0 +1,98 @@
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from signal_dsl import IndicatorCache, SignalGraph
+from strategies import STRATEGY_REGISTRY
+from trade_engine import simulate_trades
+
+# Grid search over strategy parameters. Every combination is evaluated on
+# every ticker, but all combinations of a chunk are compiled into one signal
+# graph and evaluated against the ticker's IndicatorCache, so a rolling window
+# or RSI period is computed once no matter how many combinations use it.
+
+
+def parameter_grid(param_ranges):
+    # {"window": [10, 20], "num_of_std": [1.5, 2]} -> list of parameter dicts
+    names = list(param_ranges)
+    return [dict(zip(names, values))
+            for values in itertools.product(*(param_ranges[name] for name in names))]
+
+
+def value_range(start, stop, step):
+    # Inclusive numeric range that keeps ints as ints
+    if step <= 0 or stop < start:
+        return [start]
+    count = int(np.floor((stop - start) / step + 1e-9)) + 1
+    values = [start + i * step for i in range(count)]
+    if all(isinstance(v, (int, np.integer)) for v in (start, stop, step)):
+        return [int(v) for v in values]
+    return [round(float(v), 10) for v in values]
+
+
+def _evaluate(task):
+    # Worker: evaluate a chunk of combinations on one ticker
+    symbol, close, strategy_name, combos, investment, features = task
+    strategy = STRATEGY_REGISTRY[strategy_name]
+    graph = SignalGraph()
+    for params in combos:
+        graph.add(*strategy.compile(params))
+    view = None if features is None else features.view(symbol, close)
+    signals = graph.evaluate(IndicatorCache(close, features=view))
+    rows = []
+    for params, (buy, sell) in zip(combos, signals):
+        trades = simulate_trades(close, buy, sell, investment)
+        rows.append(dict(params,
+                         Symbol=symbol,
+                         Earnings=trades["total_earnings"],
+                         Trades=trades["sell_count"]))
+    return rows
+
+
+def _tasks(closes, strategy_name, combos, investment, workers, features=None):
+    # Split combinations so every core has work even for a handful of tickers.
+    # Chunks keep neighbouring combinations together so they share windows
+    chunks = max(1, (4 * workers) // max(1, len(closes)))
+    chunk_size = max(1, -(-len(combos) // chunks))
+    for symbol, close in closes.items():
+        for i in range(0, len(combos), chunk_size):
+            yield symbol, close, strategy_name, combos[i:i + chunk_size], investment, features
+
+
+def run_sweep(closes, strategy_name, param_ranges, investment, workers=None, features=None):
+    # closes: {symbol: array-like of closing prices}; features: optional
+    # feature_store.FeatureStore shared by the chunks of every ticker
+    # Returns (per-ticker results, combinations ranked by mean return)
+    strategy = STRATEGY_REGISTRY[strategy_name]
+    combos = [params for params in parameter_grid(param_ranges) if strategy.valid(params)]
+    param_names = list(param_ranges)
+    closes = {symbol: np.asarray(close, dtype=float)
+              for symbol, close in closes.items() if len(close)}
+    workers = workers or os.cpu_count() or 1
+    tasks = list(_tasks(closes, strategy_name, combos, investment, workers, features))
+
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunks = list(executor.map(_evaluate, tasks))
+    else:
+        chunks = [_evaluate(task) for task in tasks]
+
+    results = pd.DataFrame([row for chunk in chunks for row in chunk],
+                           columns=["Symbol"] + param_names + ["Earnings", "Trades"])
+    results["Returns"] = results["Earnings"] / investment * 100
+
+    ranking = (results.groupby(param_names)
+               .agg(Returns=("Returns", "mean"),
+                    Earnings=("Earnings", "sum"),
+                    Trades=("Trades", "sum"))
+               .sort_values("Returns", ascending=False)
+               .reset_index())
+    return results, ranking
+
+
+def returns_heatmap(ranking, x, y):
+    # Mean return pivot for two parameters, averaging over any others
+    return ranking.pivot_table(index=y, columns=x, values="Returns", aggfunc="mean")
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from market_data import Universe
+
+# Synthetic OHLCV bars for benchmarks and offline testing, generated with a
+# geometric Brownian motion so no network access is needed.
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def bar_timestamps(start, years, freq="1d"):
+    # Business days for daily bars, 09:30-16:00 sessions for intraday bars
+    days = pd.bdate_range(start, periods=int(round(years * TRADING_DAYS_PER_YEAR)), name="Date")
+    if freq in ("1d", "1D", "D"):
+        return days
+    step = pd.Timedelta(freq.replace("m", "min") if freq.endswith("m") else freq)
+    session = pd.timedelta_range("9h30min", "15h59min", freq=step)
+    stamps = (days.values[:, None] + session.values[None, :]).ravel()
+    return pd.DatetimeIndex(stamps, name="Datetime")
+
+
+def synthetic_ohlcv(n_tickers=10, years=5, freq="1d", start="2015-01-01",
+                    drift=0.07, volatility=0.25, seed=0):
+    # {symbol: OHLCV frame} following GBM with annual drift and volatility
+    rng = np.random.default_rng(seed)
+    index = bar_timestamps(start, years, freq)
+    n_bars = len(index)
+    dt = years / max(n_bars, 1)
+    frames = {}
+    for i in range(n_tickers):
+        shocks = rng.normal((drift - volatility ** 2 / 2) * dt,
+                            volatility * np.sqrt(dt), n_bars)
+        close = rng.uniform(20, 500) * np.exp(np.cumsum(shocks))
+        open_ = np.concatenate(([close[0]], close[:-1]))
+        # Intrabar range proportional to the bar's volatility
+        spread = np.abs(rng.normal(0, volatility * np.sqrt(dt), n_bars)) * close
+        frames[f"SYN{i:03d}"] = pd.DataFrame({
+            "Open": open_,
+            "High": np.maximum(open_, close) + spread,
+            "Low": np.minimum(open_, close) - spread,
+            "Close": close,
+            "Adj Close": close,
+            "Volume": rng.integers(10_000, 1_000_000, n_bars).astype(float),
+        }, index=index)
+    return Universe(frames)
@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+from ta.momentum import RSIIndicator
+from ta.volatility import BollingerBands as TaBollingerBands
+
+from incremental import SMA, BollingerBands, WilderRSI, load_checkpoint, save_checkpoint
+
+# The incremental indicators must give the full-history values the
+# strategies compute with pandas and ta, bar by bar and across a checkpoint
+
+
+def prices(n=600, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.Series(100 * np.exp(np.cumsum(rng.normal(0, 0.02, n))))
+
+
+def stream(indicator, values):
+    return np.array([indicator.update(value) for value in values], dtype=float)
+
+
+def assert_close(actual, expected):
+    np.testing.assert_allclose(actual, np.asarray(expected, dtype=float), rtol=1e-9, atol=1e-9,
+                               equal_nan=True)
+
+
+@pytest.mark.parametrize("window", [1, 5, 30])
+def test_sma_matches_pandas(window):
+    close = prices()
+    assert_close(stream(SMA(window), close), close.rolling(window).mean())
+
+
+def test_sma_with_missing_values_matches_pandas():
+    close = prices()
+    close[[10, 11, 200]] = np.nan
+    assert_close(stream(SMA(20), close), close.rolling(20).mean())
+
+
+@pytest.mark.parametrize("window,num_of_std", [(20, 2), (7, 1.5)])
+def test_bollinger_bands_match_ta(window, num_of_std):
+    close = prices()
+    bands = stream(BollingerBands(window, num_of_std), close)
+    expected = TaBollingerBands(close, window, num_of_std)
+    assert_close(bands[:, 0], expected.bollinger_mavg())
+    assert_close(bands[:, 1], expected.bollinger_hband())
+    assert_close(bands[:, 2], expected.bollinger_lband())
+
+
+@pytest.mark.parametrize("period", [2, 14, 30])
+def test_rsi_matches_ta(period):
+    close = prices()
+    assert_close(stream(WilderRSI(period), close), RSIIndicator(close, period).rsi())
+
+
+def test_checkpoint_continues_the_same_series(tmp_path):
+    close = prices()
+    indicators = {"sma": SMA(20), "bollinger": BollingerBands(20, 2), "rsi": WilderRSI(14)}
+    for value in close[:333]:
+        for indicator in indicators.values():
+            indicator.update(value)
+    path = str(tmp_path / "checkpoint.json")
+    save_checkpoint(indicators, path)
+    restored = load_checkpoint(path)
+    rest = close[333:]
+    assert_close(stream(restored["sma"], rest), close.rolling(20).mean()[333:])
+    assert_close(stream(restored["bollinger"], rest)[:, 1],
+                 TaBollingerBands(close, 20, 2).bollinger_hband()[333:])
+    assert_close(stream(restored["rsi"], rest), RSIIndicator(close, 14).rsi()[333:])
@@ -0,0 +1,44 @@
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+
+from price_store import PriceStore, download_prices
+
+# A grouped yfinance download keeps the columns of a ticker that failed,
+# filled with NaN; that must not be cached as a range without bars
+
+
+def grouped_download(symbols, dates, failed):
+    columns = pd.MultiIndex.from_product([symbols, ["Open", "High", "Low", "Close", "Adj Close",
+                                                    "Volume"]])
+    data = pd.DataFrame(np.arange(len(dates) * len(columns), dtype=float).reshape(len(dates), -1),
+                        index=pd.DatetimeIndex(dates, name="Date"), columns=columns)
+    data[failed] = np.nan
+    return data
+
+
+def fake_yfinance(monkeypatch, failed):
+    def download(symbols, start, end, **kwargs):
+        return grouped_download(symbols, pd.bdate_range(start, end, inclusive="left"), failed)
+    monkeypatch.setitem(sys.modules, "yfinance", types.SimpleNamespace(download=download))
+
+
+def test_download_prices_leaves_out_failed_tickers(monkeypatch):
+    fake_yfinance(monkeypatch, "FAIL")
+    frames = download_prices(["AAPL", "FAIL"], "2023-01-02", "2023-01-10")
+    assert list(frames) == ["AAPL"]
+    assert len(frames["AAPL"]) == 6
+
+
+def test_failed_download_is_retried(monkeypatch, tmp_path):
+    fake_yfinance(monkeypatch, "FAIL")
+    store = PriceStore(str(tmp_path))
+    errors = {}
+    store.update_many(["AAPL", "FAIL"], "2023-01-02", "2023-01-10",
+                      progress=lambda symbol, error: errors.update({symbol: error}))
+    assert errors == {"AAPL": None, "FAIL": "download failed"}
+    assert store.missing("AAPL", "2023-01-02", "2023-01-10") == []
+    assert store.missing("FAIL", "2023-01-02", "2023-01-10") != []
+    assert len(store.read("AAPL", "2023-01-02", "2023-01-10")) == 6
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from trade_engine import simulate_trades
+
+# simulate_trades replaced the per-bar in_position loop of the app; both
+# must produce the same trades for any mix of signals
+
+
+def reference_trades(close, buy, sell, investment):
+    # The loop the app ran over iterrows() before the vectorized engine
+    in_position = False
+    trades = []
+    for price, is_buy, is_sell in zip(close, buy, sell):
+        if is_buy and not in_position:
+            in_position = True
+            buy_price = price
+            shares = investment // buy_price
+            trades.append([buy_price, shares, None])
+        elif is_sell and in_position:
+            in_position = False
+            trades[-1][2] = price
+    return trades
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_matches_reference_loop(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(0, 60))
+    close = rng.uniform(1, 200, n)
+    density = rng.uniform(0.05, 0.9)
+    buy = rng.random(n) < density
+    sell = rng.random(n) < density
+    investment = float(rng.uniform(100, 10000))
+
+    expected = reference_trades(close, buy, sell, investment)
+    outcome = simulate_trades(close, buy, sell, investment)
+    closed = [trade for trade in expected if trade[2] is not None]
+    assert outcome["buy_count"] == len(expected)
+    assert outcome["sell_count"] == len(closed)
+    np.testing.assert_array_equal(outcome["entry_price"], [trade[0] for trade in expected])
+    np.testing.assert_array_equal(outcome["shares"], [trade[1] for trade in expected])
+    np.testing.assert_array_equal(outcome["exit_price"][:len(closed)], [trade[2] for trade in closed])
+    assert outcome["total_earnings"] == pytest.approx(
+        sum(shares * (exit - entry) for entry, shares, exit in closed))
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_chunks_match_one_pass(seed):
+    # Carrying the open trade across chunks gives the same trades
+    rng = np.random.default_rng(seed)
+    n = 120
+    close = rng.uniform(1, 200, n)
+    buy = rng.random(n) < 0.3
+    sell = rng.random(n) < 0.3
+    whole = simulate_trades(close, buy, sell, 1000.0)
+    open_trade = None
+    earnings = 0.0
+    sells = 0
+    for start in range(0, n, 17):
+        part = simulate_trades(close[start:start + 17], buy[start:start + 17],
+                               sell[start:start + 17], 1000.0, open_trade=open_trade)
+        earnings += part["total_earnings"]
+        sells += part["sell_count"]
+        open_trade = part["open_trade"]
+    assert sells == whole["sell_count"]
+    assert earnings == pytest.approx(whole["total_earnings"])
+    assert open_trade == whole["open_trade"]
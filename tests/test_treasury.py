@@ -0,0 +1,44 @@
+import pandas as pd
+
+from backtest import backtest
+from charting import treasury_figure
+from chunked import backtest_chunked
+from price_store import PriceStore
+from synthetic_data import synthetic_ohlcv
+
+# Intraday bars from yfinance and the chart API fetcher are tz-aware, while
+# the backtest start comes from a date picker and is naive
+
+
+def intraday_bars(tz="America/New_York"):
+    frames = dict(synthetic_ohlcv(n_tickers=2, years=0.1, freq="5m", seed=1).items())
+    for frame in frames.values():
+        frame.index = frame.index.tz_localize(tz)
+    return frames
+
+
+def check_treasury(result, tz):
+    timestamps = result.treasury["Timestamp"]
+    assert len(result.orders) > 0
+    assert str(timestamps.dtype.tz) == tz
+    assert timestamps.iloc[0] == pd.Timestamp("2015-01-01", tz=tz)
+    # The chart parses the column without mixing timezones
+    treasury_figure(result.treasury)
+
+
+def test_backtest_treasury_tz_aware():
+    result = backtest(intraday_bars(), "Moving Average Crossover", {"short_window": 5, "long_window": 20},
+                      start="2015-01-01")
+    check_treasury(result, "America/New_York")
+
+
+def test_backtest_chunked_treasury_tz_aware(tmp_path):
+    store = PriceStore(str(tmp_path), offline=True)
+    frames = intraday_bars()
+    for symbol, frame in frames.items():
+        store.store(symbol, [((frame.index[0].tz_localize(None), frame.index[-1].tz_localize(None)),
+                              frame)], interval="5m")
+    result = backtest_chunked(store, list(frames), "Moving Average Crossover",
+                              {"short_window": 5, "long_window": 20}, start="2015-01-01",
+                              interval="5m")
+    check_treasury(result, "America/New_York")
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from backtest import backtest
+from synthetic_data import synthetic_ohlcv
+from walk_forward import fold_bounds, walk_forward
+
+# A fold is scored like a standalone backtest of its test window: the
+# signals come from the full history (indicators are warmed up), the trades
+# start out of the market at the window's first bar
+
+
+def replay(signals, investment):
+    # The in_position loop over a signal frame; closed trades only
+    in_position = False
+    earnings = 0.0
+    trades = 0
+    for close, buy, sell in zip(signals['Close'], signals['Buy'], signals['Sell']):
+        if buy and not in_position:
+            in_position = True
+            buy_price = close
+            shares = investment // buy_price
+        elif sell and in_position:
+            in_position = False
+            earnings += shares * (close - buy_price)
+            trades += 1
+    return earnings, trades
+
+
+# Level-based strategies signal again while in the market, so a position
+# carried in from before a window would block their entries
+STRATEGIES = [("Moving Average Crossover", {"short_window": 5, "long_window": 20}),
+              ("Momentum", {"rsi_period": 14, "rsi_min": 40, "rsi_max": 60}),
+              ("Bollinger Bands", {"window": 20, "num_of_std": 1.0})]
+
+
+@pytest.mark.parametrize("strategy,params", STRATEGIES)
+@pytest.mark.parametrize("anchored", [False, True])
+def test_fold_matches_standalone_backtest(strategy, params, anchored):
+    data = synthetic_ohlcv(n_tickers=1, years=4, seed=3)
+    symbol = data.symbols[0]
+    investment = 10000.0
+    folds = walk_forward(data, strategy, {name: [value] for name, value in params.items()},
+                         investment, n_folds=4, train_folds=2, anchored=anchored, workers=1)
+    signals = backtest(data, strategy, params, investment).signals[symbol]
+    bounds = fold_bounds(len(signals), 4, 2, anchored)
+    for fold, (train_start, test_start, test_end) in enumerate(bounds):
+        earnings, trades = replay(signals.iloc[test_start:test_end], investment)
+        assert folds["Test Trades"][fold] == trades
+        assert np.isclose(folds["Test Returns"][fold], earnings / investment * 100)
+        earnings, _ = replay(signals.iloc[train_start:test_start], investment)
+        assert np.isclose(folds["Train Returns"][fold], earnings / investment * 100)
@@ -0,0 +1,87 @@
+import numpy as np
+
+# Vectorized replacement for the in_position state machine that used to walk
+# every bar with iterrows(). The rules are the same:
+#   - a Buy signal opens a position when we are out of the market
+#   - a Sell signal closes it when we are in the market
+#   - a bar with both signals always flips the position
+# so the position after each bar only depends on the last bar that had exactly
+# one signal and on how many "both" bars came after it.
+
+
+def positions_from_signals(buy, sell, in_position=False):
+    # Boolean array: are we holding the symbol after each bar? in_position is
+    # the state before the first bar, for histories processed in chunks
+    buy = np.asarray(buy, dtype=bool)
+    sell = np.asarray(sell, dtype=bool)
+    n = len(buy)
+    if n == 0:
+        return np.zeros(0, dtype=bool)
+
+    both = buy & sell
+    single = buy ^ sell
+
+    # Index of the last single-signal bar at or before each bar (-1 if none)
+    last_single = np.maximum.accumulate(np.where(single, np.arange(n), -1))
+    has_single = last_single >= 0
+    anchor = np.where(has_single, last_single, 0)
+
+    # A lone Buy leaves us in the market, a lone Sell leaves us out
+    base = np.where(has_single, buy[anchor], in_position)
+
+    # Every "both" bar since that anchor flips the position
+    both_count = np.cumsum(both)
+    flips = both_count - np.where(has_single, both_count[anchor], 0)
+    return base ^ (flips % 2 == 1)
+
+
+def simulate_trades(close, buy, sell, investment, open_trade=None):
+    # Run the trade simulation for one symbol in one pass over its bars.
+    # Returns per-trade arrays; an open trade at the end has exit_index -1,
+    # NaN exit price and does not count towards total_earnings.
+    # open_trade=(entry_price, shares) continues a position opened before the
+    # first bar; it shows up as a first trade with entry_index -1
+    close = np.asarray(close, dtype=float)
+    carried = open_trade is not None
+    position = positions_from_signals(buy, sell, in_position=carried)
+    previous = np.concatenate(([carried], position[:-1]))[:len(position)]
+
+    entry_index = np.flatnonzero(position & ~previous)
+    closed_index = np.flatnonzero(~position & previous)
+
+    entry_price = close[entry_index]
+    # Whole number of shares the per-symbol investment can buy
+    shares = np.floor_divide(investment, entry_price)
+    if carried:
+        entry_index = np.concatenate(([-1], entry_index))
+        entry_price = np.concatenate(([open_trade[0]], entry_price))
+        shares = np.concatenate(([open_trade[1]], shares))
+    n_trades = len(entry_index)
+    n_closed = len(closed_index)
+    entry_amount = shares * entry_price
+
+    exit_index = np.full(n_trades, -1, dtype=np.int64)
+    exit_index[:n_closed] = closed_index
+    exit_price = np.full(n_trades, np.nan)
+    exit_price[:n_closed] = close[closed_index]
+    exit_amount = shares * exit_price
+    earnings = exit_amount - entry_amount
+
+    return {
+        "position": position,
+        "entry_index": entry_index,
+        "exit_index": exit_index,
+        "entry_price": entry_price,
+        "exit_price": exit_price,
+        "shares": shares,
+        "entry_amount": entry_amount,
+        "exit_amount": exit_amount,
+        "earnings": earnings,
+        "buy_count": n_trades - int(carried),
+        "sell_count": n_closed,
+        "total_earnings": float(earnings[:n_closed].sum()),
+        # (entry_price, shares) of the position still open after the last bar
+        "open_trade": ((float(entry_price[-1]), float(shares[-1]))
+                       if n_trades > n_closed else None),
+    }
+
@@ -0,0 +1,117 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from signal_dsl import IndicatorCache
+from strategies import STRATEGY_REGISTRY
+from sweep import parameter_grid
+from trade_engine import simulate_trades
+
+# Walk-forward evaluation: history is cut into consecutive test windows, the
+# parameters are optimized on the bars right before each test window and then
+# scored on the test window only (out of sample).
+#
+# Indicators are causal, so the indicators and signals of every ticker and
+# parameter combination are computed once over the full history, and are
+# already warmed up at the start of every fold. The trades are simulated on
+# each window's bars alone, starting out of the market, so a position opened
+# before a window never blocks entries inside it; as in a backtest, only the
+# trades closed inside the window count.
+
+
+def fold_bounds(n_bars, n_folds, train_folds=3, anchored=False):
+    # (train start, test start, test end) bar positions of every fold. Each
+    # test window is n_bars / (n_folds + train_folds) bars long and the train
+    # window is the train_folds test windows before it, or everything before
+    # it when anchored. The last test window runs to the end of the history
+    test_size = n_bars // (n_folds + train_folds)
+    if test_size < 1:
+        raise ValueError(f"{n_bars} bars are not enough for {n_folds} folds")
+    bounds = []
+    for fold in range(n_folds):
+        test_start = (train_folds + fold) * test_size
+        test_end = n_bars if fold == n_folds - 1 else test_start + test_size
+        train_start = 0 if anchored else test_start - train_folds * test_size
+        bounds.append((train_start, test_start, test_end))
+    return bounds
+
+
+def window_scores(close, strategy_name, combos, investment, windows, features=None):
+    # Earnings and closed trades (window x combination) of one ticker for
+    # every [start, end) bar window. features: see IndicatorCache
+    cache = IndicatorCache(close, features=features)
+    strategy = STRATEGY_REGISTRY[strategy_name]
+    earnings = np.zeros((len(windows), len(combos)))
+    trades = np.zeros((len(windows), len(combos)), dtype=int)
+    for i, params in enumerate(combos):
+        buy, sell = strategy.signals(cache, **params)
+        for w, (start, end) in enumerate(windows):
+            outcome = simulate_trades(close[start:end], buy[start:end], sell[start:end], investment)
+            earnings[w, i] = outcome["total_earnings"]
+            trades[w, i] = outcome["sell_count"]
+    return earnings, trades
+
+
+def _score_symbol(task):
+    # Worker: one ticker's full-history run, scored on every fold window
+    return window_scores(*task)
+
+
+def walk_forward(data, strategy_name, param_ranges, investment, n_folds=10, train_folds=3,
+                 anchored=False, workers=None, features=None):
+    # data: Universe or {symbol: OHLCV DataFrame}; investment is per ticker.
+    # Folds are cut on the union of all tickers' dates and tickers are run on
+    # a process pool. Returns one row per fold with the chosen parameters and
+    # their in- and out-of-sample mean returns over the tickers
+    strategy = STRATEGY_REGISTRY[strategy_name]
+    combos = [params for params in parameter_grid(param_ranges) if strategy.valid(params)]
+    if not combos:
+        raise ValueError("No parameter combinations to evaluate")
+    frames = {symbol: frame for symbol, frame in data.items() if len(frame)}
+    dates = pd.DatetimeIndex(sorted(set().union(*(frame.index for frame in frames.values()))))
+    bounds = fold_bounds(len(dates), n_folds, train_folds, anchored)
+
+    # Train windows first, then test windows, as shared-timeline dates
+    starts = dates[[b[0] for b in bounds] + [b[1] for b in bounds]]
+    ends = dates[[b[1] - 1 for b in bounds] + [b[2] - 1 for b in bounds]]
+
+    tasks = []
+    has_bars = np.zeros((2 * n_folds, len(frames)), dtype=bool)
+    for column, (symbol, frame) in enumerate(frames.items()):
+        # The same windows as bar positions in this ticker's own index
+        windows = np.column_stack((np.searchsorted(frame.index, starts),
+                                   np.searchsorted(frame.index, ends, "right")))
+        has_bars[:, column] = windows[:, 1] > windows[:, 0]
+        close = frame['Close'].to_numpy(dtype=float)
+        view = None if features is None else features.view(symbol, close)
+        tasks.append((close, strategy_name, combos, investment, windows, view))
+
+    workers = workers or os.cpu_count() or 1
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+            scores = list(executor.map(_score_symbol, tasks))
+    else:
+        scores = [_score_symbol(task) for task in tasks]
+
+    # Mean return (%) over the tickers that have bars in each window
+    earnings = sum(score[0] for score in scores)
+    trades = sum(score[1] for score in scores)
+    returns = earnings / investment * 100 / np.maximum(has_bars.sum(axis=1), 1)[:, None]
+    train_returns, test_returns = returns[:n_folds], returns[n_folds:]
+    best = np.argmax(train_returns, axis=1)
+
+    param_names = list(param_ranges)
+    rows = []
+    for fold, (train_start, test_start, test_end) in enumerate(bounds):
+        rows.append(dict({"Fold": fold + 1,
+                          "Train Start": dates[train_start],
+                          "Test Start": dates[test_start],
+                          "Test End": dates[test_end - 1]},
+                         **combos[best[fold]],
+                         **{"Train Returns": train_returns[fold, best[fold]],
+                            "Test Returns": test_returns[fold, best[fold]],
+                            "Test Trades": int(trades[n_folds + fold, best[fold]])}))
+    return pd.DataFrame(rows, columns=["Fold", "Train Start", "Test Start", "Test End"] + param_names
+                        + ["Train Returns", "Test Returns", "Test Trades"])